@@ -0,0 +1,228 @@
+# coding:utf8
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+
+# 批量分析的输出目录, 每个包一个工作目录
+batch_dir = './batch-analysis'
+
+
+def memTotalGB() -> float:
+    '''
+    物理内存大小, 单位GB
+    '''
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1])/(1<<20)
+    return 0.0
+
+def loadManifest(path:str) -> list:
+    '''
+    读入要分析的包列表
+        .json文件: [{"package": 包路径, "name": 名字, "soot_memory": GB, "solver_memory": GB}, ...], 后三项可省略
+        其他文件: 每行一个包路径, 忽略空行与#开头的行
+    '''
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    else:
+        entries = []
+        for line in open(path, 'r').read().split('\n'):
+            line = line.strip()
+            if len(line)==0 or line.startswith('#'):
+                continue
+            entries.append({'package': line})
+
+    # 名字用作工作目录名, 重名时加上序号
+    names = set()
+    for entry in entries:
+        name = entry.get('name', os.path.splitext(os.path.basename(entry['package']))[0])
+        base = name
+        idx = 1
+        while name in names:
+            idx+= 1
+            name = '%s-%d'%(base, idx)
+        names.add(name)
+        entry['name'] = name
+    return entries
+
+
+class Job:
+    '''
+    一个包的分析, 分为生成facts与求解两个阶段, 两个阶段分别申请CPU与内存
+    '''
+    def __init__(self, entry:dict, out_dir:str, soot_memory:float, solver_memory:float):
+        self.name = entry['name']
+        self.package = entry['package']
+        self.workspace = os.path.join(out_dir, self.name)
+        self.memory = {     # 阶段 => 需要的内存, GB
+            'facts': entry.get('soot_memory', soot_memory),
+            'solve': entry.get('solver_memory', solver_memory),
+        }
+        self.phase = 'facts'    # 下一个要执行的阶段, 'done'表示结束
+        self.status = 'pending'
+        self.times = {}         # 阶段 => 耗时
+        self.cores = {}         # 阶段 => 分配的核数
+        self.flows = None       # 去重后的污点流数量
+
+    def command(self, cores:int, extra:list) -> list:
+        '''
+        当前阶段的命令, 两个阶段都使用增量分析, 求解阶段复用生成阶段的facts
+        '''
+        cmd = [sys.executable, 'main.py', self.package, '--workspace', self.workspace, '--incremental', '-T', str(cores)]+extra
+        # 阶段申请的内存作为子进程的内存上限, 超出时减少线程数重试, 不影响其他包
+        cmd+= ['--memory-limit', str(self.memory[self.phase])]
+        if self.phase=='facts':
+            cmd.append('--facts-only')
+        else:
+            cmd+= ['--solver-threads', str(cores), '-J', os.path.join(self.workspace, 'flows.json')]
+        return cmd
+
+
+class Scheduler:
+    '''
+    在CPU与内存预算内并发执行所有包的各个阶段
+        求解阶段优先, 尽快完成已经生成facts的包; 生成facts的阶段最多使用soot_cores个核, 求解阶段最多使用solver_cores个核
+    '''
+    def __init__(self, jobs:list, cores:int, memory:float, soot_cores:int, solver_cores:int, extra:list):
+        self.jobs = jobs
+        self.cores = cores
+        self.memory = memory
+        self.max_cores = {'facts': soot_cores, 'solve': solver_cores}
+        self.extra = extra
+        self.running = {}   # Popen => (Job, 阶段, 核数, 开始时间, 日志文件)
+
+    def used(self):
+        cores = sum([c for (_, _, c, _, _) in self.running.values()])
+        memory = sum([job.memory[phase] for (job, phase, _, _, _) in self.running.values()])
+        return cores, memory
+
+    def ready(self) -> list:
+        busy = set([job for (job, _, _, _, _) in self.running.values()])
+        jobs = [job for job in self.jobs if job.phase!='done' and job not in busy]
+        return sorted(jobs, key=lambda job: 0 if job.phase=='solve' else 1)
+
+    def launch(self, job:Job, cores:int):
+        os.makedirs(job.workspace, exist_ok=True)
+        log = open(os.path.join(job.workspace, '%s.log'%(job.phase)), 'w')
+        p = subprocess.Popen(job.command(cores, self.extra), stdout=log, stderr=subprocess.STDOUT)
+        job.status = 'running'
+        job.cores[job.phase] = cores
+        self.running[p] = (job, job.phase, cores, time.time(), log)
+        print("[%s] start %s of %s with %d cores, %.1fGB"%(datetime.now(), job.phase, job.name, cores, job.memory[job.phase]))
+
+    def schedule(self):
+        '''
+        按顺序启动能放进剩余预算的阶段
+            单个阶段需要的内存超过总预算时, 只在没有其他阶段运行时启动, 以免永远无法执行
+        '''
+        for job in self.ready():
+            used_cores, used_memory = self.used()
+            free = self.cores-used_cores
+            if free<=0:
+                break
+            need = job.memory[job.phase]
+            # 按优先级顺序启动, 放不下时等待, 避免求解阶段被不断启动的生成阶段饿死
+            if used_memory+need>self.memory and len(self.running)>0:
+                break
+            self.launch(job, min(free, self.max_cores[job.phase]))
+
+    def finish(self, p):
+        job, phase, cores, start, log = self.running.pop(p)
+        log.close()
+        job.times[phase] = time.time()-start
+        if p.returncode!=0:
+            job.status = '%s failed (%d)'%(phase, p.returncode)
+            job.phase = 'done'
+        elif phase=='facts':
+            job.phase = 'solve'
+        else:
+            job.phase = 'done'
+            job.status = 'ok'
+            with open(os.path.join(job.workspace, 'flows.json'), 'r') as f:
+                job.flows = len(json.load(f))
+        print("[%s] fin %s of %s: %s (%.1fs)"%(datetime.now(), phase, job.name, 'ok' if p.returncode==0 else 'failed', job.times[phase]))
+
+    def run(self):
+        while True:
+            self.schedule()
+            if len(self.running)==0:
+                break
+            # 等待任意一个阶段结束
+            pid, status = os.wait()
+            for p in list(self.running.keys()):
+                if p.pid==pid:
+                    p.returncode = os.waitstatus_to_exitcode(status)
+                    self.finish(p)
+
+
+def writeSummary(jobs:list, out_dir:str) -> str:
+    '''
+    把每个包的分析结果写入summary.json, 并打印汇总表
+    '''
+    summary = []
+    for job in jobs:
+        summary.append({
+            'name': job.name,
+            'package': job.package,
+            'status': job.status,
+            'flows': job.flows,
+            'facts_seconds': job.times.get('facts'),
+            'solve_seconds': job.times.get('solve'),
+            'cores': job.cores,
+            'workspace': job.workspace,
+        })
+    path = os.path.join(out_dir, 'summary.json')
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=1)
+
+    print("%-32s %-20s %8s %10s %10s"%('package', 'status', 'flows', 'facts(s)', 'solve(s)'))
+    for item in summary:
+        def fmt(t):
+            return '-' if t==None else '%.1f'%(t)
+        print("%-32s %-20s %8s %10s %10s"%(item['name'], item['status'], '-' if item['flows']==None else item['flows'], fmt(item['facts_seconds']), fmt(item['solve_seconds'])))
+    return path
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='analyze many packages concurrently within a CPU and memory budget', # 描述
+    )
+    # 要分析的包列表
+    parser.add_argument('manifest', type=str, help='package list, one path per line or a .json list')
+    # 输出目录
+    parser.add_argument('-o', '--output', type=str, help='directory of the per-package workspaces', default=batch_dir)
+    # 资源预算
+    parser.add_argument('--cores', type=int, help='total num of cores for all jobs', default=os.cpu_count())
+    parser.add_argument('--memory', type=float, help='total memory in GB for all jobs', default=memTotalGB())
+    # 每个阶段的资源
+    parser.add_argument('--soot-cores', type=int, help='max cores of one fact generation', default=4)
+    parser.add_argument('--solver-cores', type=int, help='max cores of one solver run', default=8)
+    parser.add_argument('--soot-memory', type=float, help='estimated memory in GB of one fact generation', default=8)
+    parser.add_argument('--solver-memory', type=float, help='estimated memory in GB of one solver run', default=32)
+    # 使用预先生成的平台facts包
+    parser.add_argument('-P', '--platform-bundle', action='store_true', help='reuse pre-generated facts of the mocked platform jars')
+    # 解析参数
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [Job(entry, args.output, args.soot_memory, args.solver_memory) for entry in loadManifest(args.manifest)]
+
+    extra = []
+    if args.platform_bundle:
+        # 所有包共用一个平台facts包, 在开始前生成, 避免并发生成
+        subprocess.check_call([sys.executable, 'platformBundle.py', '-T', str(args.cores)])
+        extra.append('--platform-bundle')
+
+    Scheduler(jobs, args.cores, args.memory, args.soot_cores, args.solver_cores, extra).run()
+    print("summary written to %s"%(writeSummary(jobs, args.output)))
+
+if __name__=='__main__':
+    main()
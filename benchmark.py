@@ -0,0 +1,269 @@
+# coding:utf8
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import subprocess
+import contextlib
+
+from resultStore import leaking_csv, iterTsv, importResults
+from main import valid_sink_defination, config_fact_generate, distinct_flows, soot_generator_jar, solver_bin
+
+# 基准测试的工作目录
+bench_dir = './last-analysis/benchmark'
+# 默认的基准结果文件
+baseline_path = os.path.join(bench_dir, 'baseline.json')
+
+# 真实流水线的测试包: 名字 => 包路径
+pipeline_cases = {
+    'servlet_test': './test_cases/servlet_test/target/JavaWebLearn-1.0-SNAPSHOT.war',
+    'jeecg': './test_cases/jeecg-system-start-3.5.3.jar',
+}
+
+# 生成传播边时使用的原因, 指向字段与数组索引的边使用store_reasons
+edge_reasons = ['Assign', 'Instance field load', 'CallEdge: return value', 'CallEdge: param', 'Taint object transfer: String.value[]=>String']
+store_reasons = ['Instance field store', 'Array index store']
+
+
+def genResults(res_dir:str, sources:int, edges:int, seed:int):
+    '''
+    生成求解结果: 每个污点对象一个随机的流向图, 前一部分边构成从起点出发的生成树, 保证所有点可达
+    '''
+    rnd = random.Random(seed)
+    os.makedirs(res_dir, exist_ok=True)
+    per_source = max(2, edges//sources)
+    with open(os.path.join(res_dir, 'TaintObjectPropagateEdge.csv'), 'w') as E, \
+         open(os.path.join(res_dir, 'LeakingTaintedInformation.csv'), 'w') as L:
+        for s in range(sources):
+            src = '<com.bench.C%d: void doPost(javax.servlet.http.HttpServletRequest)>/@parameter0'%(s)
+            ctx0 = rnd.randint(0, 7)
+            nodes = [(ctx0, src)]
+            # 十分之一的点是 堆对象|字段, 其余是变量
+            for i in range(max(1, per_source//3)):
+                method = '<com.bench.M%d: void m%d()>'%(rnd.randint(0, 999), s)
+                if i%10==9:
+                    nodes.append((rnd.randint(0, 63), '%s/new com.bench.Box/%d|<com.bench.Box: java.lang.Object f>'%(method, i)))
+                else:
+                    nodes.append((rnd.randint(0, 63), '%s/$v%d'%(method, i)))
+            def pickReason(to):
+                return rnd.choice(store_reasons) if '|' in to[1] else rnd.choice(edge_reasons)
+            rows = [(nodes[0], nodes[1], 'Call source method')]
+            for i in range(2, len(nodes)):
+                rows.append((nodes[rnd.randint(1, i-1)], nodes[i], pickReason(nodes[i])))
+            while len(rows)<per_source:
+                to = rnd.choice(nodes[1:])
+                rows.append((rnd.choice(nodes[1:]), to, pickReason(to)))
+            for ((fromCtx, _from), (toCtx, _to), reason) in rows:
+                E.write('%s\t%d\t%s\t%d\t%s\t%s\n'%(src, fromCtx, _from, toCtx, _to, reason))
+            variables = [node for node in nodes[1:] if '|' not in node[1]]
+            for k in range(rnd.randint(1, 8)):
+                (ctx, var) = rnd.choice(variables)
+                L.write('servlet_input\tcmdi\t<com.bench.Sink: void run()>/java.lang.Runtime.exec/%d\t%d\t%s\t%s\n'%(k, ctx, var, src))
+
+def genSinkRules(path:str, rows:int, seed:int):
+    '''
+    生成格式正确的LeakingSinkMethodArg规则文件
+    '''
+    rnd = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(rows):
+            params = ','.join(['java.lang.String']*rnd.randint(1, 4))
+            f.write('sink%d\t%d\t<com.bench.Sink%d: void m%d(%s)>\n'%(i%16, rnd.randint(0, params.count(',')), i, i, params))
+
+def genArchive(path:str, files:int, nested:int, seed:int):
+    '''
+    生成spring boot格式的jar包, 包含files个.properties与SPI配置文件, 平均分布在外层与nested个嵌套jar包中
+    '''
+    rnd = random.Random(seed)
+    def entries(prefix, count, tag):
+        res = []
+        for i in range(count):
+            if i%2==0:
+                body = ''.join(['bench.%s.key%d=value%d\n'%(tag, k, rnd.randint(0, 1<<20)) for k in range(rnd.randint(5, 40))])
+                res.append(('%sconfig/%s-%d.properties'%(prefix, tag, i), body))
+            else:
+                body = ''.join(['com.bench.%s.Impl%d\n'%(tag, k) for k in range(rnd.randint(1, 5))])
+                res.append(('%sMETA-INF/services/com.bench.%s.Service%d'%(prefix, tag, i), body))
+        return res
+
+    per_archive = files//(nested+1)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for (name, body) in entries('BOOT-INF/classes/', per_archive, 'app'):
+            z.writestr(name, body)
+        for n in range(nested):
+            buf = io.BytesIO()
+            with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as dep:
+                for (name, body) in entries('', per_archive, 'dep%d'%(n)):
+                    dep.writestr(name, body)
+            z.writestr('BOOT-INF/lib/dep%d.jar'%(n), buf.getvalue())
+
+
+def measure(func, repeat:int) -> float:
+    '''
+    执行repeat次, 返回最短的墙钟时间, 执行时的输出被丢弃
+    '''
+    best = None
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            t = time.perf_counter()-start
+        best = t if best==None else min(best, t)
+    return best
+
+def runScript(cwd:str, args:list):
+    subprocess.check_call([sys.executable]+args, cwd=cwd, stdout=subprocess.DEVNULL)
+
+def toolchainPresent(repo:str) -> bool:
+    '''
+    java, soot fact生成器与求解器都可用时才运行真实的流水线
+    '''
+    return shutil.which('java')!=None and os.path.exists(os.path.join(repo, soot_generator_jar)) and os.access(solver_bin, os.X_OK)
+
+def isArchive(path:str) -> bool:
+    # 未拉取的git lfs文件只是一个文本指针
+    return os.path.exists(path) and zipfile.is_zipfile(path)
+
+
+def syntheticBenchmarks(workload:dict, repeat:int) -> dict:
+    '''
+    在合成数据上测量各个辅助脚本, 返回 测试名 => 秒
+    '''
+    repo = os.path.dirname(os.path.abspath(__file__))
+    work = os.path.abspath(os.path.join(bench_dir, 'workspace'))
+    shutil.rmtree(work, ignore_errors=True)
+    res_dir = os.path.join(work, 'last-analysis', 'result')
+    genResults(res_dir, workload['sources'], workload['edges'], workload['seed'])
+    rules = os.path.join(work, 'LeakingSinkMethodArg.tsv')
+    genSinkRules(rules, workload['rules'], workload['seed'])
+    archive = os.path.join(work, 'app.jar')
+    genArchive(archive, workload['config_files'], workload['nested_jars'], workload['seed'])
+    facts = os.path.join(work, 'facts')
+    os.makedirs(facts)
+
+    showTaintFlow = [os.path.join(repo, 'showTaintFlow.py'), '-J', os.path.join(work, 'flows.json')]
+    res = {}
+    # 没有结果库时, 从csv中读取
+    res['showTaintFlow.csv'] = measure(lambda: runScript(work, showTaintFlow), repeat)
+    res['resultStore.import'] = measure(lambda: importResults(res_dir), repeat)
+    # 有结果库时, 只加载需要的流向图
+    res['showTaintFlow.store'] = measure(lambda: runScript(work, showTaintFlow), repeat)
+    res['result.dedup'] = measure(lambda: sum([1 for flow in distinct_flows(iterTsv(os.path.join(res_dir, leaking_csv), 6))]), repeat)
+    res['config_generator'] = measure(lambda: config_fact_generate(archive, facts, 1), repeat)
+    res['sink_rules.validate'] = measure(lambda: valid_sink_defination(rules), repeat)
+    return res
+
+def pipelineBenchmarks() -> dict:
+    '''
+    工具链可用时, 在测试包上运行完整的分析流程
+        main.py在仓库目录中运行, 它的输出写入各测试包工作目录中的benchmark.log, 不混入基准报告
+    '''
+    repo = os.path.dirname(os.path.abspath(__file__))
+    res = {}
+    if not toolchainPresent(repo):
+        print("java, %s or %s not available, skip pipeline benchmarks"%(soot_generator_jar, solver_bin))
+        return res
+    for (name, path) in pipeline_cases.items():
+        path = os.path.normpath(os.path.join(repo, path))
+        if not isArchive(path):
+            print("%s is not a valid archive (git lfs not pulled?), skip"%(path))
+            continue
+        # 每个测试包使用自己的工作目录, 不覆盖用户的./last-analysis
+        workspace = os.path.abspath(os.path.join(bench_dir, 'pipeline', name))
+        shutil.rmtree(workspace, ignore_errors=True)
+        os.makedirs(workspace)
+        start = time.perf_counter()
+        with open(os.path.join(workspace, 'benchmark.log'), 'w') as log:
+            subprocess.check_call([sys.executable, 'main.py', path, '--workspace', workspace], cwd=repo, stdout=log, stderr=subprocess.STDOUT)
+        res['pipeline.%s'%(name)] = time.perf_counter()-start
+    return res
+
+def compare(results:dict, baseline:dict, threshold:float, min_delta:float) -> list:
+    '''
+    与基准结果比较并打印, 返回比基准慢threshold以上的测试名
+        min_delta: 慢的时间小于该秒数时视为测量误差
+    '''
+    regressions = []
+    print("%-24s %10s %10s %8s"%('benchmark', 'baseline', 'current', 'ratio'))
+    for (name, t) in results.items():
+        old = baseline.get(name)
+        if old==None:
+            print("%-24s %10s %9.3fs %8s"%(name, '-', t, 'new'))
+            continue
+        ratio = t/old if old>0 else 1.0
+        mark = ''
+        if ratio>1+threshold and t-old>min_delta:
+            mark = '  REGRESSION'
+            regressions.append(name)
+        print("%-24s %9.3fs %9.3fs %7.2fx%s"%(name, old, t, ratio, mark))
+    return regressions
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='benchmark the helper scripts and compare with a saved baseline', # 描述
+    )
+    # 合成数据的规模
+    parser.add_argument('--sources', type=int, help='num of taint sources in the synthetic results', default=200)
+    parser.add_argument('--edges', type=int, help='num of propagation edges in the synthetic results', default=200000)
+    parser.add_argument('--rules', type=int, help='num of rows in the synthetic sink rule file', default=20000)
+    parser.add_argument('--config-files', type=int, help='num of .properties/SPI files in the synthetic archive', default=2000)
+    parser.add_argument('--nested-jars', type=int, help='num of nested jars in the synthetic archive', default=20)
+    parser.add_argument('--seed', type=int, help='random seed of the synthetic data', default=1)
+    # 每个测试重复的次数, 取最短时间
+    parser.add_argument('-r', '--repeat', type=int, help='repeat each benchmark and keep the best time', default=3)
+    # 基准结果
+    parser.add_argument('-b', '--baseline', type=str, help='baseline file', default=baseline_path)
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    # 判定为性能回退的阈值
+    parser.add_argument('-t', '--threshold', type=float, help='report a regression when slower than baseline by this ratio', default=0.2)
+    parser.add_argument('--min-delta', type=float, help='ignore slowdowns shorter than this many seconds', default=0.01)
+    # 跳过真实的分析流程
+    parser.add_argument('--no-pipeline', action='store_true', help='skip the end-to-end runs on test_cases')
+    # 解析参数
+    args = parser.parse_args()
+
+    workload = {
+        'sources': args.sources,
+        'edges': args.edges,
+        'rules': args.rules,
+        'config_files': args.config_files,
+        'nested_jars': args.nested_jars,
+        'seed': args.seed,
+    }
+    results = syntheticBenchmarks(workload, args.repeat)
+    if not args.no_pipeline:
+        results.update(pipelineBenchmarks())
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline['workload']!=workload:
+            print("baseline %s was recorded with a different workload %s"%(args.baseline, baseline['workload']))
+            compare(results, {}, args.threshold, args.min_delta)
+        else:
+            regressions = compare(results, baseline['results'], args.threshold, args.min_delta)
+    else:
+        compare(results, {}, args.threshold, args.min_delta)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'workload': workload, 'python': platform.python_version(), 'results': results}, f, indent=1)
+        print("baseline saved to %s"%(args.baseline))
+
+    if len(regressions)>0:
+        print("%d benchmarks regressed by more than %d%%: %s"%(len(regressions), args.threshold*100, ', '.join(regressions)))
+        exit(1)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,205 @@
+# coding:utf8
+import io
+import os
+import json
+import shutil
+import zipfile
+import argparse
+
+from factSlicer import loadHierarchy, buildCallGraph, findEntries, closeMethods, reachable, reverseGraph, writeSlice, iterFacts
+
+# 范围分析的报告文件
+report_name = 'scope-report.json'
+
+# 压缩包中类文件所在的目录前缀
+classPrefixes = ('BOOT-INF/classes/', 'WEB-INF/classes/')
+# 嵌套的jar包后缀
+nestedArchiveSuffixes = ('.jar', '.war')
+
+
+def className(path:str) -> str:
+    '''
+    把类文件路径, 源文件路径或类名转换为类名
+        com/x/Foo.class, BOOT-INF/classes/com/x/Foo.class, src/main/java/com/x/Foo.java => com.x.Foo
+    '''
+    path = path.strip().replace('\\', '/')
+    if path.endswith('.java'):
+        # 源文件只取源码根目录之后的部分
+        idx = path.rfind('/java/')
+        if idx>=0:
+            path = path[idx+len('/java/'):]
+        path = path[0:-len('.java')]
+    elif path.endswith('.class'):
+        for prefix in classPrefixes:
+            if path.startswith(prefix):
+                path = path[len(prefix):]
+        path = path[0:-len('.class')]
+    return path.replace('/', '.')
+
+def loadChangedClasses(spec:str) -> list:
+    '''
+    读入变化的类, spec为文件时每行一个类名或路径(忽略空行与#开头的行), 否则为逗号分隔的列表
+        git diff --name-only的输出可以直接使用
+    '''
+    if os.path.isfile(spec):
+        items = open(spec, 'r').read().split('\n')
+    else:
+        items = spec.split(',')
+    res = []
+    for item in items:
+        item = item.strip()
+        if len(item)==0 or item.startswith('#'):
+            continue
+        res.append(className(item))
+    return sorted(set(res))
+
+
+def classIndex(zfile:zipfile.ZipFile) -> tuple:
+    '''
+    压缩包中央目录中的类文件与嵌套jar包, 只读取CRC与大小, 不解压
+        返回 ({类名: (CRC, 大小)}, {嵌套jar包条目名: (CRC, 大小)})
+    '''
+    classes = {}
+    nested = {}
+    for info in zfile.infolist():
+        if info.is_dir():
+            continue
+        if info.filename.endswith('.class'):
+            classes[className(info.filename)] = (info.CRC, info.file_size)
+        elif info.filename.endswith(nestedArchiveSuffixes):
+            nested[info.filename] = (info.CRC, info.file_size)
+    return classes, nested
+
+def collectClasses(zfile:zipfile.ZipFile, skip:dict, res:dict):
+    '''
+    把zfile及其嵌套jar包中的类加入res: {类名: set((CRC, 大小))}
+        skip: 两个版本中完全相同的嵌套jar包, 它们的类在两边一样, 不需要打开
+    '''
+    classes, nested = classIndex(zfile)
+    for (name, stamp) in classes.items():
+        res.setdefault(name, set()).add(stamp)
+    for (name, stamp) in nested.items():
+        if skip.get(name)==stamp:
+            continue
+        try:
+            inner = zipfile.ZipFile(io.BytesIO(zfile.read(name)))
+        except zipfile.BadZipFile as e:
+            print("skip %s: %s"%(name, e))
+            continue
+        collectClasses(inner, {}, res)
+
+def diffArchives(old_path:str, new_path:str) -> list:
+    '''
+    按类比较两个版本的压缩包, 返回新增, 删除或内容变化的类
+        按类名而不是jar包名比较, 依赖升级导致的jar包改名只计入真正变化的类
+    '''
+    with zipfile.ZipFile(old_path, 'r') as old, zipfile.ZipFile(new_path, 'r') as new:
+        _, oldNested = classIndex(old)
+        _, newNested = classIndex(new)
+        same = dict([(name, stamp) for (name, stamp) in oldNested.items() if newNested.get(name)==stamp])
+        oldClasses = {}
+        newClasses = {}
+        collectClasses(old, same, oldClasses)
+        collectClasses(new, same, newClasses)
+    return sorted([name for name in set(oldClasses.keys())|set(newClasses.keys()) if oldClasses.get(name)!=newClasses.get(name)])
+
+
+def matchClasses(hierarchy, changed:list) -> set:
+    '''
+    fact_db中声明的类里与changed匹配的类, 内部类随外部类一起变化
+    '''
+    names = set(changed)
+    res = set()
+    for cls in hierarchy.declared.keys():
+        outer = cls.split('$')[0]
+        if cls in names or outer in names:
+            res.add(cls)
+    return res
+
+def scopeFactDb(fact_db:str, out_dir:str, changed:list, entryRegex=None) -> dict:
+    '''
+    只保留能调用到变化的类的入口方法及其前向闭包, 写入out_dir, 这些入口方法同时写入RootCodeElement与KeepMethod
+        调用图用CHA近似; 变化的类中的方法及其反向可达的入口方法都受影响
+        没有受影响的入口方法时只写入报告, 调用者不应求解
+        返回范围分析的报告
+    '''
+    hierarchy = loadHierarchy(fact_db)
+    _, graph = buildCallGraph(fact_db, hierarchy)
+    entries = findEntries(fact_db, hierarchy, entryRegex)
+    classes = matchClasses(hierarchy, changed)
+    targets = set()
+    for cls in classes:
+        targets.update(hierarchy.declared.get(cls, {}).values())
+    affected = entries & reachable(targets, reverseGraph(graph))
+    report = {
+        'changed': changed,
+        'matched_classes': sorted(classes),
+        'changed_methods': len(targets),
+        'entries': len(entries),
+        'affected_entries': sorted(affected),
+        'kept_methods': 0,
+    }
+    if len(affected)==0:
+        # 没有受影响的入口方法, 不写入空的切片, 以免求解后得到看起来像"没有污点流"的结果
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.makedirs(out_dir)
+        with open(os.path.join(out_dir, report_name), 'w') as f:
+            json.dump(report, f, indent=1)
+        print("scope: %d changed classes match %d classes, no entry method affected"%(len(changed), len(classes)))
+        return report
+
+    kept = closeMethods(affected, graph, hierarchy)
+    writeSlice(fact_db, out_dir, kept)
+
+    # 受影响的入口方法作为求解的根, 先删除硬链接, 以免修改fact_db中的文件
+    for fn in ['RootCodeElement.facts', 'KeepMethod.facts']:
+        p = os.path.join(out_dir, fn)
+        rows = set()
+        if os.path.exists(p):
+            rows.update(['\t'.join(row) for row in iterFacts(p)])
+            os.remove(p)
+        rows.update(affected)
+        with open(p, 'w') as f:
+            for row in sorted(rows):
+                f.write(row+'\n')
+
+    report['kept_methods'] = len(kept)
+    with open(os.path.join(out_dir, report_name), 'w') as f:
+        json.dump(report, f, indent=1)
+    print("scope: %d changed classes match %d classes, %d/%d entry methods affected, keep %d methods"%(
+        len(changed), len(classes), len(affected), len(entries), len(kept)))
+    return report
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='find the entry methods affected by changed classes and write a scoped fact directory', # 描述
+    )
+    # 变化的类
+    parser.add_argument('-c', '--changed', type=str, help='changed classes, a comma separated list or a file with one class/path per line')
+    # 比较两个版本的压缩包
+    parser.add_argument('--diff', type=str, nargs=2, metavar=('OLD', 'NEW'), help='diff two archive versions at class level')
+    # fact目录与输出目录
+    parser.add_argument('-F', '--fact-db', type=str, help='fact directory of the new version')
+    parser.add_argument('-o', '--output', type=str, help='directory for the scoped facts')
+    # 额外的入口方法
+    parser.add_argument('-e', '--entry', type=str, help='regex of extra entry method signatures')
+    # 解析参数
+    args = parser.parse_args()
+
+    changed = []
+    if args.changed!=None:
+        changed+= loadChangedClasses(args.changed)
+    if args.diff!=None:
+        changed+= diffArchives(args.diff[0], args.diff[1])
+    changed = sorted(set(changed))
+    if args.fact_db==None or args.output==None:
+        # 只输出变化的类
+        for cls in changed:
+            print(cls)
+        return
+    scopeFactDb(args.fact_db, args.output, changed, args.entry)
+
+if __name__=='__main__':
+    main()
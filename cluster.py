@@ -0,0 +1,706 @@
+# coding:utf8
+import os
+import sys
+import json
+import gzip
+import time
+import socket
+import shutil
+import tarfile
+import hmac
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+from datetime import datetime
+
+from batch import memTotalGB, loadManifest
+from main import solve_facts, distinct_flows, FlowWriter, workspace_paths
+from resultStore import leaking_csv, store_name, iterTsv
+from reachIndex import index_name
+
+# 分布式分析的输出目录, 每个包一个目录, 产物库默认在其中的store目录
+cluster_dir = './cluster-analysis'
+# 协调者的默认监听地址与端口, 只监听本机时可以不设置令牌
+default_host = '127.0.0.1'
+default_port = 7070
+local_hosts = ('127.0.0.1', 'localhost', '::1')
+# 共享令牌的环境变量, 令牌不出现在命令行中
+token_env = 'JDOOP_CLUSTER_TOKEN'
+
+# 工作者执行任务时发送心跳的间隔, 超过heartbeat_timeout没有收到任何消息时认为工作者已经失效
+heartbeat_interval = 5
+heartbeat_timeout = 30
+# 一个任务因工作者失效最多执行的次数
+max_attempts = 3
+# 传输产物时每次读写的大小
+chunk_size = 1<<20
+
+# 本文件所在的目录, 工作者在其中执行main.py
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def sendMessage(f, msg:dict, payload:str=None):
+    '''
+    发送一行json消息, payload为文件路径时紧接着发送文件的内容, 长度在消息的size字段中
+    '''
+    if payload!=None:
+        msg['size'] = os.path.getsize(payload)
+    f.write((json.dumps(msg)+'\n').encode('utf8'))
+    if payload!=None:
+        with open(payload, 'rb') as i:
+            shutil.copyfileobj(i, f, chunk_size)
+    f.flush()
+
+def recvMessage(f):
+    '''
+    读入一行json消息, 连接关闭时返回None
+    '''
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf8'))
+
+def checkToken(msg:dict, token:str) -> bool:
+    '''
+    消息中的令牌是否与协调者的令牌一致, 协调者没有令牌时接受所有消息
+    '''
+    if token==None:
+        return True
+    return hmac.compare_digest(str(msg.get('token', '')).encode('utf8'), token.encode('utf8'))
+
+def recvPayload(f, size:int, path:str) -> str:
+    '''
+    把消息之后的size个字节写入path, 返回内容的sha256
+    '''
+    h = hashlib.sha256()
+    with open(path, 'wb') as o:
+        while size>0:
+            chunk = f.read(min(size, chunk_size))
+            if not chunk:
+                raise ConnectionError('connection closed while receiving %d bytes'%(size))
+            h.update(chunk)
+            o.write(chunk)
+            size-= len(chunk)
+    return h.hexdigest()
+
+
+class HashWriter:
+    '''
+    写入文件的同时计算sha256
+    '''
+    def __init__(self, f):
+        self.f = f
+        self.h = hashlib.sha256()
+
+    def write(self, data):
+        self.h.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+class ArtifactStore:
+    '''
+    按内容寻址的产物库, 产物以sha256命名保存在root/objects中, 多台机器挂载同一个目录时可以直接共享
+        文件按原样保存; 目录打包为确定性的tar.gz (按名字排序, 时间与属主清零), 内容相同的目录摘要相同
+    '''
+    def __init__(self, root:str):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+
+    def path(self, digest:str) -> str:
+        return os.path.join(self.root, 'objects', digest[0:2], digest)
+
+    def has(self, digest:str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def tempPath(self) -> str:
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        os.close(fd)
+        return tmp
+
+    def add(self, tmp:str, digest:str) -> str:
+        '''
+        把临时文件移入产物库, 已经存在相同的产物时丢弃临时文件
+        '''
+        dst = self.path(digest)
+        if os.path.exists(dst):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(tmp, dst)
+        return digest
+
+    def putFile(self, path:str) -> str:
+        tmp = self.tempPath()
+        with open(path, 'rb') as i, open(tmp, 'wb') as o:
+            w = HashWriter(o)
+            shutil.copyfileobj(i, w, chunk_size)
+        return self.add(tmp, w.h.hexdigest())
+
+    def putDir(self, path:str, exclude=()) -> str:
+        '''
+        打包目录, exclude中的文件名不打包
+        '''
+        def reset(info):
+            info.mtime = 0
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            return info
+
+        tmp = self.tempPath()
+        with open(tmp, 'wb') as o:
+            w = HashWriter(o)
+            with gzip.GzipFile(fileobj=w, mode='wb', compresslevel=1, mtime=0) as gz:
+                with tarfile.open(fileobj=gz, mode='w|') as tar:
+                    for (root, dirs, files) in os.walk(path):
+                        dirs.sort()
+                        for fn in sorted(files):
+                            if fn in exclude:
+                                continue
+                            p = os.path.join(root, fn)
+                            tar.add(p, os.path.relpath(p, path), recursive=False, filter=reset)
+        return self.add(tmp, w.h.hexdigest())
+
+    def getFile(self, digest:str, dest:str):
+        shutil.copyfile(self.path(digest), dest)
+
+    def getDir(self, digest:str, dest:str):
+        '''
+        把打包的目录解压到dest, dest中原有的内容被删除
+        '''
+        shutil.rmtree(dest, ignore_errors=True)
+        os.makedirs(dest)
+        with tarfile.open(self.path(digest), 'r:gz') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(dest, filter='data')
+            else:
+                tar.extractall(dest)
+
+class RemoteStore(ArtifactStore):
+    '''
+    没有共享目录时, 通过协调者的产物库传输产物, 本地目录只作为缓存
+    '''
+    def __init__(self, root:str, address:tuple, token:str=None):
+        ArtifactStore.__init__(self, root)
+        self.address = address
+        self.token = token
+
+    def request(self, msg:dict, payload:str=None):
+        conn = socket.create_connection(self.address)
+        try:
+            f = conn.makefile('rwb')
+            msg['token'] = self.token
+            sendMessage(f, msg, payload)
+            reply = recvMessage(f)
+            if reply!=None and reply['type']=='error':
+                raise ConnectionError('coordinator refused %s: %s'%(msg['type'], reply['error']))
+            if reply!=None and reply['type']=='blob':
+                tmp = self.tempPath()
+                if recvPayload(f, reply['size'], tmp)!=reply['digest']:
+                    os.remove(tmp)
+                    raise ConnectionError('artifact %s is corrupted'%(reply['digest']))
+                self.add(tmp, reply['digest'])
+            return reply
+        finally:
+            conn.close()
+
+    def fetch(self, digest:str):
+        if self.has(digest):
+            return
+        reply = self.request({'type': 'fetch', 'digest': digest})
+        if reply==None or reply['type']!='blob':
+            raise FileNotFoundError('artifact %s is not in the store'%(digest))
+
+    def publish(self, digest:str) -> str:
+        reply = self.request({'type': 'put', 'digest': digest}, self.path(digest))
+        if reply==None or reply['type']!='stored':
+            raise ConnectionError('failed to upload artifact %s: %s'%(digest, reply))
+        return digest
+
+    def putFile(self, path:str) -> str:
+        return self.publish(ArtifactStore.putFile(self, path))
+
+    def putDir(self, path:str, exclude=()) -> str:
+        return self.publish(ArtifactStore.putDir(self, path, exclude))
+
+    def getFile(self, digest:str, dest:str):
+        self.fetch(digest)
+        ArtifactStore.getFile(self, digest, dest)
+
+    def getDir(self, digest:str, dest:str):
+        self.fetch(digest)
+        ArtifactStore.getDir(self, digest, dest)
+
+
+class Task:
+    '''
+    分配给一个工作者的任务
+        kind: analyze 完整分析一个包; facts 只生成facts; solve 求解facts任务生成的fact目录
+    '''
+    def __init__(self, tid:int, entry:dict, kind:str, memory:float, after=None):
+        self.id = tid
+        self.name = entry['name']
+        self.package = entry['package']
+        self.kind = kind
+        self.memory = memory    # 估计的内存, GB
+        self.after = after      # 必须先完成的任务
+        self.inputs = {}        # 输入产物名 => 摘要
+        self.outputs = {}       # 输出产物名 => 摘要
+        self.status = 'pending'
+        self.worker = None
+        self.attempts = 0
+        self.seconds = None
+        self.flows = None
+
+class WorkerInfo:
+    def __init__(self, name:str, cores:int, memory:float):
+        self.name = name
+        self.cores = cores
+        self.memory = memory
+        self.task = None
+        self.alive = True
+
+class Coordinator:
+    '''
+    把包的分析任务分配给通过TCP连接的工作者, 工作者一次执行一个任务, 通过产物库交换包, fact目录与结果目录
+        工作者的连接断开或超时时, 它正在执行的任务重新排队; 工作者报告的失败不重试
+    '''
+    def __init__(self, entries:list, out_dir:str, store:ArtifactStore, split_stages:bool, extra:list, soot_memory:float, solver_memory:float, token:str=None):
+        self.out_dir = out_dir
+        self.store = store
+        self.token = token      # 共享令牌, 每个连接的第一条消息必须带有它
+        self.extra = extra
+        self.cond = threading.Condition()
+        self.workers = []
+        self.closing = False
+        self.tasks = []
+        for entry in entries:
+            facts_memory = entry.get('soot_memory', soot_memory)
+            solve_memory = entry.get('solver_memory', solver_memory)
+            if split_stages:
+                # 生成facts与求解可以在不同的机器上执行
+                facts = Task(len(self.tasks), entry, 'facts', facts_memory)
+                self.tasks.append(facts)
+                self.tasks.append(Task(len(self.tasks), entry, 'solve', solve_memory, facts))
+            else:
+                self.tasks.append(Task(len(self.tasks), entry, 'analyze', max(facts_memory, solve_memory)))
+        # 包只上传一次
+        digests = {}
+        for task in self.tasks:
+            if task.kind!='solve':
+                if task.package not in digests:
+                    digests[task.package] = store.putFile(task.package)
+                task.inputs['package'] = digests[task.package]
+
+    def assign(self, worker:WorkerInfo) -> dict:
+        '''
+        为空闲的工作者选择任务, 求解任务优先; 任务的内存超过该工作者时, 只在没有内存足够的工作者时分配给它
+        '''
+        with self.cond:
+            if self.closing or self.finished():
+                return {'type': 'bye'}
+            largest = max([w.memory for w in self.workers if w.alive])
+            ready = [task for task in self.tasks if task.status=='pending' and (task.after==None or task.after.status=='done')]
+            for task in sorted(ready, key=lambda task: 0 if task.kind=='solve' else 1):
+                if task.memory>worker.memory and worker.memory<largest:
+                    continue
+                task.status = 'running'
+                task.worker = worker.name
+                task.attempts+= 1
+                worker.task = task
+                print("[%s] %s of %s => %s (attempt %d)"%(datetime.now(), task.kind, task.name, worker.name, task.attempts))
+                return {'type': 'job', 'task': task.id, 'kind': task.kind, 'name': task.name,
+                        'suffix': os.path.splitext(task.package)[1], 'inputs': task.inputs, 'extra': self.extra}
+            return {'type': 'wait', 'seconds': heartbeat_interval}
+
+    def collect(self, task:Task):
+        '''
+        把结果目录取回到out_dir/包名/result, 并按main.py的格式写出flows.json
+        '''
+        _, res_db, _ = workspace_paths(os.path.join(self.out_dir, task.name))
+        self.store.getDir(task.outputs['result'], res_db)
+        writer = FlowWriter(os.path.join(self.out_dir, task.name, 'flows.json'))
+        p = os.path.join(res_db, leaking_csv)
+        if os.path.exists(p):
+            for (fromLable, toLabel, sinkInvo, sinkParam, source) in distinct_flows(iterTsv(p, 6)):
+                writer.write({
+                    'source_label': fromLable,
+                    'sink_label': toLabel,
+                    'sink_invo': sinkInvo,
+                    'sink_param': sinkParam,
+                    'source': source
+                })
+        writer.close()
+        task.flows = writer.count
+
+    def complete(self, worker:WorkerInfo, msg:dict):
+        with self.cond:
+            task = worker.task
+            worker.task = None
+            if task==None or task.id!=msg['task']:
+                return
+            task.outputs = msg['outputs']
+            task.seconds = msg['seconds']
+        if task.kind=='facts':
+            for t in self.tasks:
+                if t.after==task:
+                    t.inputs['fact_db'] = task.outputs['fact_db']
+        else:
+            try:
+                self.collect(task)
+            except (OSError, ValueError) as e:
+                self.fail(task, 'collect failed: %s'%(e))
+                return
+        with self.cond:
+            task.status = 'done'
+            print("[%s] fin %s of %s on %s (%.1fs)"%(datetime.now(), task.kind, task.name, worker.name, task.seconds))
+            self.cond.notify_all()
+
+    def fail(self, task:Task, error:str):
+        with self.cond:
+            task.status = 'failed: %s'%(error)
+            # 依赖它的任务也无法执行
+            for t in self.tasks:
+                if t.after==task:
+                    t.status = 'failed: %s failed'%(task.kind)
+            print("[%s] %s of %s failed: %s"%(datetime.now(), task.kind, task.name, error))
+            self.cond.notify_all()
+
+    def finished(self) -> bool:
+        return all([task.status=='done' or task.status.startswith('failed') for task in self.tasks])
+
+    def lost(self, worker:WorkerInfo):
+        '''
+        工作者失效, 它正在执行的任务重新排队
+        '''
+        with self.cond:
+            worker.alive = False
+            task = worker.task
+            worker.task = None
+            if task!=None and task.status=='running':
+                if task.attempts>=max_attempts:
+                    task.status = 'failed: lost %d workers'%(task.attempts)
+                    print("[%s] %s of %s failed: lost %d workers"%(datetime.now(), task.kind, task.name, task.attempts))
+                else:
+                    task.status = 'pending'
+                    print("[%s] worker %s lost, requeue %s of %s"%(datetime.now(), worker.name, task.kind, task.name))
+            self.cond.notify_all()
+
+    def serveWorker(self, conn, rfile, wfile, hello:dict):
+        '''
+        一个工作者连接的消息循环
+        '''
+        worker = WorkerInfo(hello['worker'], hello['cores'], hello['memory'])
+        with self.cond:
+            self.workers.append(worker)
+        print("[%s] worker %s joined: %d cores, %.1fGB"%(datetime.now(), worker.name, worker.cores, worker.memory))
+        conn.settimeout(heartbeat_timeout)
+        try:
+            while True:
+                msg = recvMessage(rfile)
+                if msg==None:
+                    break
+                if msg['type']=='next':
+                    reply = self.assign(worker)
+                    sendMessage(wfile, reply)
+                    if reply['type']=='bye':
+                        break
+                elif msg['type']=='done':
+                    self.complete(worker, msg)
+                elif msg['type']=='failed':
+                    with self.cond:
+                        task = worker.task
+                        worker.task = None
+                    if task!=None and task.id==msg['task']:
+                        self.fail(task, msg['error'])
+        except (OSError, ValueError) as e:
+            print("[%s] worker %s: %s"%(datetime.now(), worker.name, e))
+        finally:
+            self.lost(worker)
+
+    def serveArtifact(self, rfile, wfile, msg:dict):
+        '''
+        产物的上传与下载
+        '''
+        if msg['type']=='fetch':
+            if self.store.has(msg['digest']):
+                sendMessage(wfile, {'type': 'blob', 'digest': msg['digest']}, self.store.path(msg['digest']))
+            else:
+                sendMessage(wfile, {'type': 'missing', 'digest': msg['digest']})
+        elif msg['type']=='put':
+            tmp = self.store.tempPath()
+            if recvPayload(rfile, msg['size'], tmp)!=msg['digest']:
+                os.remove(tmp)
+                sendMessage(wfile, {'type': 'error', 'error': 'digest mismatch'})
+            else:
+                self.store.add(tmp, msg['digest'])
+                sendMessage(wfile, {'type': 'stored', 'digest': msg['digest']})
+
+    def serve(self, host:str, port:int):
+        '''
+        在后台线程中启动TCP服务, 实际监听的端口记录在self.port中
+        '''
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                msg = recvMessage(self.rfile)
+                if msg==None:
+                    return
+                if not checkToken(msg, coordinator.token):
+                    print("[%s] reject %s from %s: bad token"%(datetime.now(), msg.get('type'), self.client_address[0]))
+                    sendMessage(self.wfile, {'type': 'error', 'error': 'bad token'})
+                    return
+                if msg['type']=='hello':
+                    coordinator.serveWorker(self.request, self.rfile, self.wfile, msg)
+                else:
+                    coordinator.serveArtifact(self.rfile, self.wfile, msg)
+
+        server = CoordinatorServer((host, port), Handler)
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print("coordinator listening on %s:%d, %d tasks"%(host, self.port, len(self.tasks)))
+        return server
+
+    def wait(self, server, local_workers:list=()):
+        '''
+        等待所有任务结束, 再关闭服务
+        '''
+        with self.cond:
+            while not self.finished():
+                self.cond.wait(heartbeat_interval)
+            self.closing = True
+        # 空闲的工作者在下一次请求任务时收到bye
+        for p in local_workers:
+            try:
+                p.wait(heartbeat_interval*2)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        server.shutdown()
+        server.server_close()
+
+    def writeSummary(self) -> str:
+        '''
+        每个包的状态, 污点流数量, 各任务的耗时与执行者写入summary.json
+        '''
+        summary = {}
+        for task in self.tasks:
+            item = summary.setdefault(task.name, {'name': task.name, 'package': task.package, 'status': 'ok', 'flows': None, 'tasks': {}})
+            item['tasks'][task.kind] = {'status': task.status, 'worker': task.worker, 'attempts': task.attempts, 'seconds': task.seconds}
+            if task.status!='done':
+                item['status'] = '%s %s'%(task.kind, task.status)
+            if task.flows!=None:
+                item['flows'] = task.flows
+        path = os.path.join(self.out_dir, 'summary.json')
+        with open(path, 'w') as f:
+            json.dump(list(summary.values()), f, indent=1)
+        print("%-32s %-40s %8s"%('package', 'status', 'flows'))
+        for item in summary.values():
+            print("%-32s %-40s %8s"%(item['name'], item['status'], '-' if item['flows']==None else item['flows']))
+        return path
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    '''
+    协调者的TCP服务, 重启时可以立即重用端口, 连接线程不阻止进程退出
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Worker:
+    '''
+    连接协调者, 循环请求并执行任务, 执行任务时定期发送心跳
+    '''
+    def __init__(self, address:tuple, workdir:str, cores:int, memory:float, store:ArtifactStore, name:str, token:str=None):
+        self.address = address
+        self.token = token
+        self.workdir = workdir
+        self.cores = cores
+        self.memory = memory
+        self.store = store
+        self.name = name
+        self.lock = threading.Lock()    # 心跳线程与主线程共用一个连接
+
+    def send(self, msg:dict):
+        with self.lock:
+            sendMessage(self.f, msg)
+
+    def run(self):
+        conn = socket.create_connection(self.address)
+        self.f = conn.makefile('rwb')
+        self.send({'type': 'hello', 'worker': self.name, 'cores': self.cores, 'memory': self.memory, 'token': self.token})
+        try:
+            while True:
+                self.send({'type': 'next'})
+                msg = recvMessage(self.f)
+                if msg==None or msg['type']=='bye':
+                    break
+                if msg['type']=='error':
+                    raise ConnectionError('coordinator refused the worker: %s'%(msg['error']))
+                if msg['type']=='wait':
+                    time.sleep(msg['seconds'])
+                    continue
+                self.execute(msg)
+        finally:
+            conn.close()
+
+    def execute(self, job:dict):
+        '''
+        执行一个任务, 执行期间发送心跳, 结束后报告输出产物的摘要或失败原因
+        '''
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(heartbeat_interval):
+                self.send({'type': 'heartbeat', 'task': job['task']})
+
+        t = threading.Thread(target=heartbeat, daemon=True)
+        t.start()
+        start = time.time()
+        try:
+            outputs = self.perform(job)
+            msg = {'type': 'done', 'task': job['task'], 'outputs': outputs, 'seconds': time.time()-start}
+        except (OSError, subprocess.CalledProcessError) as e:
+            msg = {'type': 'failed', 'task': job['task'], 'error': str(e)}
+        finished.set()
+        t.join()
+        print("[%s] %s of %s: %s"%(datetime.now(), job['kind'], job['name'], msg['type']))
+        self.send(msg)
+
+    def perform(self, job:dict) -> dict:
+        workspace = os.path.join(self.workdir, job['name'])
+        fact_db, res_db, _ = workspace_paths(workspace)
+        os.makedirs(workspace, exist_ok=True)
+        if job['kind']=='solve':
+            self.store.getDir(job['inputs']['fact_db'], fact_db)
+            shutil.rmtree(res_db, ignore_errors=True)
+            # 与本地分析的求解阶段一致, 传给main.py的--slice也在这里生效
+            solve_facts(fact_db, res_db, self.cores, '--slice' in job['extra'], limit_gb=self.memory)
+            return {'result': self.store.putDir(res_db, [store_name, index_name])}
+
+        package = os.path.join(workspace, 'package'+job['suffix'])
+        self.store.getFile(job['inputs']['package'], package)
+        cmd = [sys.executable, 'main.py', os.path.abspath(package), '--workspace', os.path.abspath(workspace), '-T', str(self.cores), '--memory-limit', str(self.memory)]+job['extra']
+        if job['kind']=='facts':
+            cmd.append('--facts-only')
+        with open(os.path.join(workspace, '%s.log'%(job['kind'])), 'w') as log:
+            subprocess.check_call(cmd, cwd=repo_dir, stdout=log, stderr=subprocess.STDOUT)
+        if job['kind']=='facts':
+            return {'fact_db': self.store.putDir(fact_db)}
+        return {'result': self.store.putDir(res_db, [store_name, index_name])}
+
+
+def parseAddress(address:str) -> tuple:
+    host, _, port = address.rpartition(':')
+    return (host if len(host)>0 else 'localhost', int(port))
+
+def coordinatorMain(args):
+    # 协调者分发包并让工作者执行分析, 监听其他地址时必须设置共享令牌
+    if args.host not in local_hosts and args.token==None:
+        print("listening on %s needs a shared token, pass --token or set %s"%(args.host, token_env))
+        exit(1)
+    out_dir = args.output
+    os.makedirs(out_dir, exist_ok=True)
+    store = ArtifactStore(args.store if args.store!=None else os.path.join(out_dir, 'store'))
+    extra = []
+    if args.slice:
+        extra.append('--slice')
+    if args.resolve_sink_rules:
+        extra.append('--resolve-sink-rules')
+    coordinator = Coordinator(loadManifest(args.manifest), out_dir, store, args.split_stages, extra, args.soot_memory, args.solver_memory, args.token)
+    server = coordinator.serve(args.host, args.port)
+
+    # 在本机启动工作者, 用于测试或单机多进程
+    local_workers = []
+    for i in range(args.local):
+        cmd = [sys.executable, os.path.join(repo_dir, 'cluster.py'), 'worker', 'localhost:%d'%(coordinator.port),
+               '--workdir', os.path.join(out_dir, 'workers', str(i)), '--name', 'local-%d'%(i), '--cores', str(max(1, args.cores//args.local))]
+        if args.store!=None:
+            cmd+= ['--store', args.store]
+        env = dict(os.environ)
+        if args.token!=None:
+            env[token_env] = args.token
+        local_workers.append(subprocess.Popen(cmd, env=env))
+    coordinator.wait(server, local_workers)
+    print("summary written to %s"%(coordinator.writeSummary()))
+
+def workerMain(args):
+    address = parseAddress(args.coordinator)
+    if args.store!=None:
+        store = ArtifactStore(args.store)
+    else:
+        store = RemoteStore(os.path.join(args.workdir, 'store'), address, args.token)
+    name = args.name if args.name!=None else '%s-%d'%(socket.gethostname(), os.getpid())
+    try:
+        Worker(address, args.workdir, args.cores, args.memory, store, name, args.token).run()
+    except ConnectionError as e:
+        print("worker %s: %s"%(name, e))
+        exit(1)
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='analyze packages on several machines with a coordinator and TCP workers', # 描述
+    )
+    sub = parser.add_subparsers(dest='role', required=True)
+
+    # 协调者
+    p = sub.add_parser('coordinator', help='split the package queue across workers and collect the results')
+    # 要分析的包列表
+    p.add_argument('manifest', type=str, help='package list, one path per line or a .json list')
+    # 输出目录
+    p.add_argument('-o', '--output', type=str, help='directory of the per-package results', default=cluster_dir)
+    # 监听地址
+    p.add_argument('--host', type=str, help='listen address, default %s; other addresses need --token'%(default_host), default=default_host)
+    p.add_argument('--port', type=int, help='listen port, 0 for any free port', default=default_port)
+    # 共享令牌
+    p.add_argument('--token', type=str, help='shared token that workers must send, default $%s'%(token_env), default=os.environ.get(token_env))
+    # 产物库
+    p.add_argument('--store', type=str, help='shared artifact store directory, default OUTPUT/store served over TCP')
+    # 分阶段分配
+    p.add_argument('--split-stages', action='store_true', help='schedule fact generation and solving of a package as separate tasks')
+    # 每个阶段估计的内存
+    p.add_argument('--soot-memory', type=float, help='estimated memory in GB of one fact generation', default=8)
+    p.add_argument('--solver-memory', type=float, help='estimated memory in GB of one solver run', default=32)
+    # 传给main.py的选项
+    p.add_argument('-S', '--slice', action='store_true', help='pass --slice to main.py')
+    p.add_argument('-R', '--resolve-sink-rules', action='store_true', help='pass --resolve-sink-rules to main.py')
+    # 本机工作者
+    p.add_argument('--local', type=int, help='start N workers on this machine', default=0)
+    p.add_argument('--cores', type=int, help='total cores of the local workers', default=os.cpu_count())
+
+    # 工作者
+    p = sub.add_parser('worker', help='run tasks of a coordinator')
+    # 协调者地址
+    p.add_argument('coordinator', type=str, help='coordinator address, HOST:PORT')
+    # 工作目录
+    p.add_argument('--workdir', type=str, help='workspace directory of the tasks', default='./cluster-worker')
+    # 共享令牌
+    p.add_argument('--token', type=str, help='shared token of the coordinator, default $%s'%(token_env), default=os.environ.get(token_env))
+    # 产物库
+    p.add_argument('--store', type=str, help='shared artifact store directory, default fetch artifacts from the coordinator')
+    # 资源
+    p.add_argument('--cores', type=int, help='num of cores for one task', default=os.cpu_count())
+    p.add_argument('--memory', type=float, help='memory limit in GB for one task', default=memTotalGB())
+    # 名字
+    p.add_argument('--name', type=str, help='worker name, default HOST-PID')
+    # 解析参数
+    args = parser.parse_args()
+
+    if args.role=='coordinator':
+        if not os.path.exists(args.manifest):
+            print("%s not exists"%(args.manifest))
+            exit(1)
+        coordinatorMain(args)
+    else:
+        workerMain(args)
+
+if __name__=='__main__':
+    main()
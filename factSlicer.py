@@ -0,0 +1,390 @@
+# coding:utf8
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+
+from resultStore import countLines
+
+# Doop中的方法签名 <类名: 返回类型 方法名(参数类型)>, 方法名可能是<init>, <clinit>
+sigPattern = re.compile(r'<([^\s<>:]+): ([^\s()]+) ([^\s()]+)\(([^()]*)\)>')
+
+# servlet相关的入口类型, 它们的子类型的所有方法都作为入口
+servletTypes = [
+    'javax.servlet.Servlet', 'jakarta.servlet.Servlet',
+    'javax.servlet.Filter', 'jakarta.servlet.Filter',
+    'javax.servlet.ServletContextListener', 'jakarta.servlet.ServletContextListener',
+]
+# 带有这些前缀的注解的类与方法作为入口: Spring bean, controller, mapping方法等
+entryAnnotationPrefixes = ('org.springframework.', 'javax.ws.rs.', 'jakarta.ws.rs.', 'javax.servlet.annotation.', 'jakarta.servlet.annotation.')
+
+# 不切片的关系: 污点定义, 配置文件facts与用户指定的根, 它们引用的方法不代表属于该方法
+unslicedRelations = set(['LeakingSinkMethodArg', 'LeakingSinkMethodNameArg', 'LeakingSinkMethodNameVarArg', 'TaintSpec',
+    'SPI-Config', 'properties-Config', 'MainClass', 'KeepClass', 'KeepMethod', 'RootCodeElement', 'KeepClassMembers', 'KeepClassesWithMembers'])
+
+# 切片报告的文件名, 保存在切片后的fact目录中
+report_name = 'slice-report.json'
+
+
+def iterFacts(path):
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if len(line)>0:
+                yield line.split('\t')
+
+def methodPrefix(value:str):
+    '''
+    value是方法签名, 或者以方法签名加'/'开头的变量, 调用点, 堆对象等时, 返回该方法签名, 否则返回None
+    '''
+    if not value.startswith('<'):
+        return None
+    i = value.find(')>')
+    if i<0:
+        return None
+    sig = value[0:i+2]
+    if len(sig)!=len(value) and value[i+2]!='/':
+        return None
+    m = sigPattern.match(sig)
+    if m==None or m.end()!=len(sig):
+        return None
+    return sig
+
+def rowOwner(row:list):
+    '''
+    一行facts所属的方法: 第一个属于某个方法的列, 例如指令, 调用点, 变量, 方法签名本身
+    '''
+    for value in row:
+        sig = methodPrefix(value)
+        if sig!=None:
+            return sig
+    return None
+
+def splitSig(sig:str):
+    '''
+    方法签名拆分为(类名, 子签名), 子签名为"返回类型 方法名(参数类型)"
+    '''
+    i = sig.index(': ')
+    return sig[1:i], sig[i+2:-1]
+
+
+class ClassHierarchy:
+    '''
+    从DirectSuperclass, DirectSuperinterface与方法声明构造的类层次, 用于CHA
+    '''
+    def __init__(self):
+        self.supers = {}    # 类 => [直接父类型]
+        self.subs = {}      # 类 => [直接子类型]
+        self.declared = {}  # 类 => {子签名: 方法签名}
+        self.dispatchCache = {}
+
+    def addSuper(self, cls:str, sup:str):
+        self.supers.setdefault(cls, []).append(sup)
+        self.subs.setdefault(sup, []).append(cls)
+
+    def declare(self, sig:str):
+        cls, sub = splitSig(sig)
+        self.declared.setdefault(cls, {})[sub] = sig
+
+    def closure(self, cls:str, edges:dict) -> list:
+        res = [cls]
+        visited = set(res)
+        idx = 0
+        while idx<len(res):
+            for c in edges.get(res[idx], []):
+                if c not in visited:
+                    visited.add(c)
+                    res.append(c)
+            idx+= 1
+        return res
+
+    def subtypes(self, cls:str) -> list:
+        return self.closure(cls, self.subs)
+
+    def dispatch(self, sig:str) -> list:
+        '''
+        调用sig时可能执行的方法: 在声明类及其父类型中找到的实现, 以及所有子类型中的重写, 都没有时就是sig本身
+        '''
+        res = self.dispatchCache.get(sig)
+        if res!=None:
+            return res
+        cls, sub = splitSig(sig)
+        targets = set()
+        for c in self.closure(cls, self.supers):
+            target = self.declared.get(c, {}).get(sub)
+            if target!=None:
+                targets.add(target)
+                break
+        for c in self.subtypes(cls):
+            target = self.declared.get(c, {}).get(sub)
+            if target!=None:
+                targets.add(target)
+        if len(targets)==0:
+            targets.add(sig)
+        res = self.dispatchCache[sig] = sorted(targets)
+        return res
+
+
+def loadHierarchy(fact_db:str) -> ClassHierarchy:
+    hierarchy = ClassHierarchy()
+    for fn in ['DirectSuperclass.facts', 'DirectSuperinterface.facts']:
+        p = os.path.join(fact_db, fn)
+        if os.path.exists(p):
+            for row in iterFacts(p):
+                hierarchy.addSuper(row[0], row[1])
+    p = os.path.join(fact_db, 'Method.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            if methodPrefix(row[0])==row[0]:
+                hierarchy.declare(row[0])
+    return hierarchy
+
+def buildCallGraph(fact_db:str, hierarchy:ClassHierarchy) -> dict:
+    '''
+    扫描所有facts, 一行中出现的其他方法签名都视为该行所属方法对它的引用(调用, 方法句柄等), 再按CHA展开
+        返回 (方法 => 直接引用的方法签名, 方法 => 可能调用的方法集合)
+    '''
+    refs = {}   # 方法 => 引用的方法签名
+    for fn in sorted(os.listdir(fact_db)):
+        if not fn.endswith('.facts') or fn[0:-len('.facts')] in unslicedRelations:
+            continue
+        for row in iterFacts(os.path.join(fact_db, fn)):
+            owner = rowOwner(row)
+            if owner==None:
+                continue
+            for value in row:
+                if ')>' not in value:
+                    continue
+                for m in sigPattern.finditer(value):
+                    sig = m.group(0)
+                    if sig!=owner:
+                        refs.setdefault(owner, set()).add(sig)
+    graph = {}
+    for (owner, sigs) in refs.items():
+        callees = set()
+        for sig in sigs:
+            callees.update(hierarchy.dispatch(sig))
+        graph[owner] = callees
+    return refs, graph
+
+def findEntries(fact_db:str, hierarchy:ClassHierarchy, entryRegex=None) -> set:
+    '''
+    入口方法: servlet与过滤器的方法, 带有Spring等框架注解的类与方法, SPI实现类, main方法与用户指定的根方法
+    '''
+    entryClasses = set()
+    entries = set()
+    for t in servletTypes:
+        entryClasses.update(hierarchy.subtypes(t)[1:])
+
+    p = os.path.join(fact_db, 'Type-Annotation.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            if row[1].startswith(entryAnnotationPrefixes):
+                entryClasses.add(row[0])
+    p = os.path.join(fact_db, 'Method-Annotation.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            if row[1].startswith(entryAnnotationPrefixes):
+                entries.add(row[0])
+    # SPI实现类由ServiceLoader反射创建
+    p = os.path.join(fact_db, 'SPI-Config.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            entryClasses.add(row[1])
+    p = os.path.join(fact_db, 'MainClass.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            main = hierarchy.declared.get(row[0], {}).get('void main(java.lang.String[])')
+            if main!=None:
+                entries.add(main)
+    for fn in ['KeepMethod.facts', 'RootCodeElement.facts']:
+        p = os.path.join(fact_db, fn)
+        if os.path.exists(p):
+            for row in iterFacts(p):
+                if methodPrefix(row[0])==row[0]:
+                    entries.add(row[0])
+                else:
+                    entryClasses.add(row[0])
+
+    for cls in entryClasses:
+        entries.update(hierarchy.declared.get(cls, {}).values())
+    if entryRegex!=None:
+        pattern = re.compile(entryRegex)
+        for methods in hierarchy.declared.values():
+            entries.update([sig for sig in methods.values() if pattern.search(sig)])
+    return entries
+
+def findSinkCallers(fact_db:str, refs:dict) -> set:
+    '''
+    调用点的签名是sink方法的方法, 按调用点的签名而不是CHA展开后的方法匹配, sink方法来自fact_db中的LeakingSinkMethodArg, LeakingSinkMethodNameArg与LeakingSinkMethodNameVarArg
+        按类名定义的规则只匹配签名的声明类本身, 与求解器及sinkRules.resolve一致
+    '''
+    sinkSigs = set()
+    p = os.path.join(fact_db, 'LeakingSinkMethodArg.facts')
+    if os.path.exists(p):
+        for row in iterFacts(p):
+            sinkSigs.add(row[2])
+    # 按类名与方法名正则定义的sink
+    nameRules = {}  # 类 => [方法名正则]
+    for fn in ['LeakingSinkMethodNameArg.facts', 'LeakingSinkMethodNameVarArg.facts']:
+        p = os.path.join(fact_db, fn)
+        if os.path.exists(p):
+            for row in iterFacts(p):
+                nameRules.setdefault(row[1], []).append(re.compile(row[2]))
+
+    def isSink(sig):
+        if sig in sinkSigs:
+            return True
+        cls, sub = splitSig(sig)
+        name = sub[sub.index(' ')+1:sub.index('(')]
+        return any([pattern.fullmatch(name)!=None for pattern in nameRules.get(cls, [])])
+
+    return set([m for (m, sigs) in refs.items() if any([isSink(sig) for sig in sigs])])
+
+def reachable(seeds, graph:dict) -> set:
+    res = set(seeds)
+    todo = list(res)
+    while len(todo)>0:
+        for callee in graph.get(todo.pop(), ()):
+            if callee not in res:
+                res.add(callee)
+                todo.append(callee)
+    return res
+
+def reverseGraph(graph:dict) -> dict:
+    res = {}
+    for (caller, callees) in graph.items():
+        for callee in callees:
+            res.setdefault(callee, set()).add(caller)
+    return res
+
+def keptMethods(entries:set, sinkCallers:set, graph:dict, hierarchy:ClassHierarchy) -> set:
+    '''
+    保留能到达sink的入口方法的前向闭包, 以及被保留的类的静态初始化方法
+        返回 (能到达sink的入口方法, 保留的方法)
+    '''
+    canReachSink = reachable(sinkCallers, reverseGraph(graph))
+    seeds = set([m for m in entries if m in canReachSink])
+    return seeds, closeMethods(seeds, graph, hierarchy)
+
+def closeMethods(seeds, graph:dict, hierarchy:ClassHierarchy) -> set:
+    '''
+    seeds的前向闭包, 以及被保留的类的静态初始化方法
+    '''
+    kept = reachable(seeds, graph)
+    # 类被使用时会执行<clinit>, 它又可能引入新的方法
+    while True:
+        clinits = set()
+        for m in kept:
+            clinit = hierarchy.declared.get(splitSig(m)[0], {}).get('void <clinit>()')
+            if clinit!=None and clinit not in kept:
+                clinits.add(clinit)
+        if len(clinits)==0:
+            break
+        kept|= reachable(clinits, graph)
+    return kept
+
+def linkOrCopy(src:str, dst:str):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def writeSlice(fact_db:str, out_dir:str, kept:set) -> dict:
+    '''
+    把属于保留方法的行与不属于任何方法的行写入out_dir, 没有变化的文件直接硬链接
+        kept为None时保留所有行
+        返回 关系名 => (切片前行数, 切片后行数)
+    '''
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    stats = {}
+    for fn in sorted(os.listdir(fact_db)):
+        if not fn.endswith('.facts'):
+            continue
+        src = os.path.join(fact_db, fn)
+        dst = os.path.join(out_dir, fn)
+        name = fn[0:-len('.facts')]
+        if kept==None or name in unslicedRelations:
+            linkOrCopy(src, dst)
+            rows = countLines(src)
+            stats[name] = (rows, rows)
+            continue
+
+        total = 0
+        count = 0
+        with open(src, 'r') as i, open(dst, 'w') as o:
+            for line in i:
+                row = line.rstrip('\n')
+                if len(row)==0:
+                    continue
+                total+= 1
+                owner = rowOwner(row.split('\t'))
+                if owner==None or owner in kept:
+                    o.write(row+'\n')
+                    count+= 1
+        # 没有删除任何行时, 用硬链接代替副本
+        if count==total:
+            linkOrCopy(src, dst)
+        stats[name] = (total, count)
+    return stats
+
+def printReport(stats:dict, seeds:set, kept:set):
+    before = sum([b for (b, a) in stats.values()])
+    after = sum([a for (b, a) in stats.values()])
+    print("slice: %d entry methods reach a sink, keep %s methods"%(len(seeds), 'all' if kept==None else len(kept)))
+    print("%-40s %12s %12s %8s"%('relation', 'before', 'after', 'kept'))
+    for (name, (b, a)) in sorted(stats.items(), key=lambda item: item[1][1]-item[1][0]):
+        if b==a:
+            continue
+        print("%-40s %12d %12d %7.1f%%"%(name, b, a, 100.0*a/b))
+    print("%-40s %12d %12d %7.1f%%"%('total', before, after, 100.0*after/before if before>0 else 100.0))
+
+def sliceFactDb(fact_db:str, out_dir:str, entryRegex=None) -> dict:
+    '''
+    只保留从入口方法能到达sink方法的部分, 切片后的facts写入out_dir
+        没有入口能到达sink时不切片, out_dir中是fact_db的完整副本
+        返回 关系名 => (切片前行数, 切片后行数)
+    '''
+    hierarchy = loadHierarchy(fact_db)
+    refs, graph = buildCallGraph(fact_db, hierarchy)
+    entries = findEntries(fact_db, hierarchy, entryRegex)
+    sinkCallers = findSinkCallers(fact_db, refs)
+    seeds, kept = keptMethods(entries, sinkCallers, graph, hierarchy)
+    if len(seeds)==0:
+        print("slice: no entry method reaches a sink method, keep the whole fact db", file=sys.stderr)
+        kept = None
+    stats = writeSlice(fact_db, out_dir, kept)
+    printReport(stats, seeds, kept)
+    with open(os.path.join(out_dir, report_name), 'w') as f:
+        json.dump({
+            'entries': len(entries),
+            'sink_callers': len(sinkCallers),
+            'seeds': len(seeds),
+            'kept_methods': None if kept==None else len(kept),
+            'relations': dict([(name, {'before': b, 'after': a}) for (name, (b, a)) in stats.items()]),
+        }, f, indent=1)
+    return stats
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='drop facts of methods that cannot reach a sink from an entry point', # 描述
+    )
+    # 输入与输出的fact目录
+    parser.add_argument('fact_db', type=str, help='fact directory generated by soot')
+    parser.add_argument('out_dir', type=str, help='directory for the sliced facts')
+    # 额外的入口方法
+    parser.add_argument('-e', '--entry', type=str, help='regex of extra entry method signatures')
+    # 解析参数
+    args = parser.parse_args()
+
+    sliceFactDb(args.fact_db, args.out_dir, args.entry)
+
+if __name__=='__main__':
+    main()
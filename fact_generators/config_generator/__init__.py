@@ -0,0 +1,3 @@
+# coding:utf8
+# 配置文件facts生成器, 外部调用接口为Main
+from .main import Main, processArchive
@@ -1,30 +1,33 @@
 # coding:utf8
 import sys 
-from tempfile import TemporaryDirectory
-import shutil
+import io
+import json
+import hashlib
+import struct
 import zipfile
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-import SPI
-import properties
+# 作为fact_generators.config_generator包导入时使用相对导入, 作为脚本运行时导入同目录下的模块
+try:
+    from . import SPI
+    from . import properties
+except ImportError:
+    import SPI
+    import properties
 
-# 所有facts生成器, fact名 => 对应的生成器
+# 所有facts生成器, fact名 => (判断压缩包条目是否需要处理, 对应的生成器)
 factGenerators = {
     'SPI-Config': SPI.getGenerator(),   # 解析SPI相关配置文件
     'properties-Config': properties.getGenerator() # 解析properties配置文件
 }
 
-# 所有facts数据, fact名->[ [e1, e2, ...] ]
-allFacts = {}
-
-# 初始化
-for k in factGenerators.keys():
-    allFacts[k] = []
-
 
 def parseArgs():
     '''
-    解析参数, 返回facts输出目录与输出的jar包数组
+    解析参数, 返回facts输出目录, 输出的jar包数组, 并行进程数与缓存目录
     '''
 
     # facts输出目录
@@ -32,6 +35,12 @@ def parseArgs():
 
     # 输入的jar包数组
     inputJars = []
+    
+    # 并行进程数
+    jobs = os.cpu_count()
+    
+    # 按压缩包内容缓存facts的目录
+    cacheDir = None
 
     # 解析参数
     idx = 1
@@ -46,68 +55,236 @@ def parseArgs():
             idx+=1
             for fn in s[1:-1].split(","): 
                 inputJars.append(fn)
+        elif sys.argv[idx]=="-j":
+            idx+=1
+            jobs = int(sys.argv[idx])
+            idx+=1
+        elif sys.argv[idx]=="-c":
+            idx+=1
+            cacheDir = sys.argv[idx]
+            idx+=1
         else:
             idx+=1    
             
-    return factsDir, inputJars
+    return factsDir, inputJars, jobs, cacheDir
 
 
-def traverseJars(inputJars, tmpDir):    
-    # 遍历每一个jar包
-    cnt = 0
-    for jar in inputJars:
-        # 拼接出解压输出目录
-        outputPath = os.path.join(tmpDir, str(cnt))
-        if not os.path.exists(outputPath):
-            os.makedirs(outputPath) 
-            
-        # 解压到临时目录中
-        zfile = zipfile.ZipFile(jar, 'r')
-        zfile.extractall(outputPath)
-        
-        # 遍历所有facts生成器
-        for k in factGenerators.keys():
-            gen = factGenerators[k] # 生成器
-            facts = gen(outputPath) # 生成facts
-            allFacts[k]+= facts   # 生成的facts添加到数组中
+# 嵌套的jar包后缀, 例如BOOT-INF/lib/*.jar, WEB-INF/lib/*.jar, lib/*.jar
+nestedArchiveSuffixes = ('.jar', '.war')
+
+def entryDigest(zfile:zipfile.ZipFile, info:zipfile.ZipInfo) -> str:
+    '''
+    压缩包条目的本地文件头与压缩后数据的sha256, 不需要解压, 用作嵌套jar包的内容指纹
+    '''
+    h = hashlib.sha256()
+    zfile.fp.seek(info.header_offset)
+    header = zfile.fp.read(30)
+    nameLen, extraLen = struct.unpack('<HH', header[26:30])
+    h.update(header)
+    h.update(zfile.fp.read(nameLen+extraLen))
+    size = info.compress_size
+    while size>0:
+        chunk = zfile.fp.read(min(size, 1<<20))
+        if not chunk:
+            break
+        h.update(chunk)
+        size-= len(chunk)
+    return h.hexdigest()
+
+def processArchive(task:tuple) -> tuple:
+    '''
+    处理一个压缩包, 只处理它自己的条目, 嵌套的jar包作为新的任务返回, 可以在任意进程中执行
+        task: (排序键, 输入jar包路径, 从输入jar包到该压缩包的嵌套条目名, 压缩包指纹)
+        返回 (task, [(条目序号, fact名, facts)], [(条目序号, 嵌套jar包条目名, CRC, 大小, 内容指纹)])
+    '''
+    key, jar, chain, fp = task
+    results = []
+    nested = []
+    with zipfile.ZipFile(jar, 'r') as zfile:
+        # 在内存中逐层打开嵌套的jar包
+        try:
+            for name in chain:
+                zfile = zipfile.ZipFile(io.BytesIO(zfile.read(name)))
+        except zipfile.BadZipFile as e:
+            print("skip %s: %s"%(name, e))
+            return task, results, nested
         
-        cnt+=1
+        # 直接遍历压缩包的中央目录, 把匹配的条目以流的方式分发给所有facts生成器
+        for (idx, info) in enumerate(zfile.infolist()):
+            if info.is_dir():
+                continue
+            name = info.filename
+            
+            # 嵌套的jar包, 交给调用者作为新任务处理
+            if name.endswith(nestedArchiveSuffixes):
+                nested.append((idx, name, info.CRC, info.file_size, entryDigest(zfile, info)))
+                continue
+            
+            # 遍历所有facts生成器, 每个生成器独立地返回facts
+            for k in factGenerators.keys():
+                isTarget, gen = factGenerators[k] # 生成器
+                if not isTarget(name):
+                    continue
+                with zfile.open(info) as f:
+                    results.append((idx, k, gen(name, f)))
+    return task, results, nested
+
+def timedProcessArchive(task:tuple) -> tuple:
+    '''
+    在进程池中执行processArchive, 同时返回它在工作进程中消耗的CPU时间
+    '''
+    cpu = time.process_time()
+    res = processArchive(task)
+    return time.process_time()-cpu, res
+
+def fileFingerprint(path:str) -> str:
+    '''
+    输入jar包的内容指纹
+    '''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1<<20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def generatorsFingerprint() -> str:
+    '''
+    所有生成器代码的指纹, 生成器变化后缓存自动失效
+    '''
+    h = hashlib.sha256()
+    for mod in [sys.modules[__name__], SPI, properties]:
+        with open(mod.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[0:16]
+
+class ArchiveCache:
+    '''
+    按压缩包内容指纹缓存processArchive的结果
+        输入jar包的指纹是文件内容的sha256, 嵌套jar包的指纹是父压缩包中的CRC, 大小与条目内容的sha256, CRC冲突时不会误用其他jar包的facts
+    '''
+    def __init__(self, cacheDir:str):
+        self.dir = os.path.join(cacheDir, generatorsFingerprint())
+        os.makedirs(self.dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, task:tuple):
+        p = os.path.join(self.dir, task[3]+'.json')
+        if not os.path.exists(p):
+            self.misses+= 1
+            return None
+        self.hits+= 1
+        with open(p, 'r') as f:
+            res = json.load(f)
+        return task, res['results'], res['nested']
+    
+    def put(self, res:tuple):
+        task, results, nested = res
+        p = os.path.join(self.dir, task[3]+'.json')
+        with open(p+'.tmp', 'w') as f:
+            json.dump({'results': results, 'nested': nested}, f)
+        os.replace(p+'.tmp', p)
+
+def traverseJars(inputJars:list, jobs:int, cacheDir:str=None) -> dict:
+    '''
+    处理所有输入jar包与其中嵌套的jar包, 每个压缩包是一个任务, jobs>1时在进程池中并行处理
+        cacheDir不为None时, 内容未变化的压缩包直接复用缓存的facts
+        进程池使用spawn方式启动, 调用者中的其他线程不会被fork到工作进程中
+        返回 (fact名 => [ [e1, e2, ...] ], 工作进程的CPU时间), 顺序与按中央目录深度优先遍历时一致, 与调度顺序无关
+    '''
+    cache = None if cacheDir==None else ArchiveCache(cacheDir)
+    tasks = [((i,), jar, (), fileFingerprint(jar) if cache!=None else None) for (i, jar) in enumerate(inputJars)]
+    parts = []  # [(条目排序键, fact名, facts)]
+    
+    def collect(res):
+        '''
+        收集一个压缩包的结果, 返回其中嵌套的jar包对应的新任务
+        '''
+        (key, jar, chain, fp), results, nested = res
+        for (idx, k, facts) in results:
+            parts.append((key+(idx,), k, facts))
+        # 嵌套jar包的排序键为父压缩包中该条目的排序键
+        return [(key+(idx,), jar, chain+(name,), '%08x-%d-%s'%(crc, size, digest)) for (idx, name, crc, size, digest) in nested]
+    
+    def fromCache(tasks):
+        '''
+        处理可以直接从缓存得到结果的任务(包括其中嵌套的jar包), 返回剩余需要执行的任务
+        '''
+        if cache==None:
+            return tasks
+        todo = []
+        while len(tasks)>0:
+            task = tasks.pop()
+            res = cache.get(task)
+            if res==None:
+                todo.append(task)
+            else:
+                tasks+= collect(res)
+        return todo
+    
+    def finish(res):
+        if cache!=None:
+            cache.put(res)
+        return fromCache(collect(res))
+    
+    tasks = fromCache(tasks)
+    workerCpu = 0.0
+    if jobs<=1:
+        while len(tasks)>0:
+            tasks+= finish(processArchive(tasks.pop()))
+    else:
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+            pending = set([pool.submit(timedProcessArchive, task) for task in tasks])
+            while len(pending)>0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cpu, res = future.result()
+                    workerCpu+= cpu
+                    for task in finish(res):
+                        pending.add(pool.submit(timedProcessArchive, task))
+    if cache!=None:
+        print("config fact cache: %d archives reused, %d regenerated"%(cache.hits, cache.misses))
+    
+    # 按排序键合并
+    allFacts = {}
+    for k in factGenerators.keys():
+        allFacts[k] = []
+    parts.sort(key=lambda part: part[0])
+    for (_, k, facts) in parts:
+        allFacts[k]+= facts
+    return allFacts, workerCpu
 
-def Main(factsDir:str, inputJars:list):
+def Main(factsDir:str, inputJars:list, jobs:int=1, cacheDir:str=None):
     '''
     外部调用接口
         factsDir: 写入facts的目录
         inputJars: 输入的jar包
+        jobs: 并行处理压缩包的进程数
+        cacheDir: 按压缩包内容缓存facts的目录, None表示不缓存
+        返回进程池中的工作进程消耗的CPU时间, 本进程的CPU时间由调用者统计
     '''
     
-    # 创建临时目录
-    tmpDir = TemporaryDirectory().name
-    print("create "+tmpDir)
-    try:
-        # 解压所有jar包到临时目录中, 并调用所有的facts生成器
-        traverseJars(inputJars, tmpDir)
-    finally:
-        print("remdir "+tmpDir)
-        shutil.rmtree(tmpDir)
+    # 遍历所有jar包, 并调用所有的facts生成器
+    allFacts, workerCpu = traverseJars(inputJars, jobs, cacheDir)
     
-    # 根据allFacts生成fact文件
+    # 根据allFacts生成fact文件, 每个文件一次写入
     for k in factGenerators.keys():
         o = os.path.join(factsDir, "%s.facts"%(k))  # 路径拼接
-        f = open(o, "w")    # 写入文件
-        for line in allFacts[k]:    # 遍历每一行
-            f.write(line[0])    # 写入该行第一个元素
-            for i in range(1, len(line)):   # 写入剩余元素
-                f.write('\t'+line[i])
-            f.write('\n')
-        f.close()
+        lines = ['\t'.join(line)+'\n' for line in allFacts[k]]   # 与逐行写入一致, 重复的行由求解器去重
+        with open(o, "w") as f:
+            f.write(''.join(lines))
+    return workerCpu
     
 
 if __name__=='__main__':
     # 从argv中解析参数
-    factsDir, inputJars = parseArgs()
+    factsDir, inputJars, jobs, cacheDir = parseArgs()
     
     # 调用生成逻辑
-    Main(factsDir, inputJars)
+    Main(factsDir, inputJars, jobs, cacheDir)
     
     
 
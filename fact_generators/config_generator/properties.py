@@ -1,17 +1,24 @@
 # coding:utf8
 
-import os
+import posixpath
 
 # 生成 generator
 def getGenerator():
-    return generator
+    return isTarget, generator
 
-def parseProperties(path):
-    print("properties generator handle %s"%(path))
+# 是否为需要处理的压缩包条目
+def isTarget(name):
+    f = posixpath.basename(name)
+    if f =='pom.properties':
+        return False
+    return f.endswith('.properties')
+
+def parseProperties(name, f):
+    print("properties generator handle %s"%(name))
 
     res = []
     try:
-        content = open(path, 'r').read()
+        content = f.read().decode('utf8').replace('\r\n', '\n').replace('\r', '\n')
         for line in content.split('\n'):
             # 跳过空行
             if len(line)==0:
@@ -37,25 +44,6 @@ def parseProperties(path):
         
     return res
 
-# facts生成器, 返回数组表示的csv数据
-def generator(p):
-    # 遍历p中所有的properties文件
-    arr = []
-    for root, _, fs in os.walk(p):
-        for f in fs:
-            if f =='pom.properties':
-                continue
-            if not f.endswith('.properties'):
-                continue
-            path = os.path.join(root, f)
-            arr.append(path)
-    
-    # 如果没有符合条件的properties文件, 则直接返回
-    if len(arr)==0:
-        return []
-    
-    # 开始解析每一个properties文件
-    res = []
-    for path in arr:
-        res+=parseProperties(path)
-    return res
\ No newline at end of file
+# facts生成器, 解析一个properties文件, 返回数组表示的csv数据
+def generator(name, f):
+    return parseProperties(name, f)
@@ -0,0 +1,212 @@
+# coding:utf8
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+from collections import deque
+
+import telemetry
+from telemetry import processTree, processRSS
+
+# 分析可以使用的内存上限, 单位GB, None表示按可用内存计算, 由main.py --memory-limit设置
+memory_limit = None
+
+# 留给本进程与系统的内存, GB
+reserve_gb = 1.0
+
+# 内存估计的经验系数
+solver_base_gb = 0.5        # 求解器的固定开销
+solver_fact_factor = 12     # 求解器的内存约为facts大小的倍数
+solver_thread_gb = 0.25     # 每个求解线程额外的内存
+soot_base_gb = 2.0          # jvm与平台jar包的固定开销
+soot_input_factor = 40      # soot的堆内存约为输入包大小的倍数
+soot_core_gb = 0.5          # 每个生成facts的线程额外的内存
+heap_ratio = 0.8            # jvm的-Xmx占内存上限的比例, 其余留给元空间, 线程栈等
+
+# RLIMIT_AS限制的是虚拟内存, 比常驻内存大, 真正的上限由常驻内存监控保证
+address_space_slack = 2
+
+# jvm因内存不足失败时输出中的特征
+oom_markers = ['java.lang.OutOfMemoryError']
+
+# 求解器在RLIMIT_AS下分配内存失败时抛出未捕获的std::bad_alloc, 被SIGABRT结束
+solver_oom_signal = signal.SIGABRT
+# 被SIGABRT结束时, 只有输出中有这些特征, 或者峰值常驻内存接近上限时才是内存不足, 断言失败等其他abort不重试
+abort_oom_markers = ['std::bad_alloc']
+abort_rss_ratio = 0.9
+
+
+class ResourceExhausted(subprocess.CalledProcessError):
+    '''
+    子进程因超出内存上限失败, 是CalledProcessError的子类, 原有的异常处理不受影响
+    '''
+    def __str__(self):
+        return "Command '%s' ran out of memory (returned %d)"%(self.cmd, self.returncode)
+
+
+def memAvailableGB() -> float:
+    '''
+    当前可用的内存, 单位GB, 取/proc/meminfo的MemAvailable与cgroup剩余额度中较小的一个
+    '''
+    res = None
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            if line.startswith('MemAvailable:'):
+                res = int(line.split()[1])/(1<<20)
+                break
+    # cgroup v2的内存上限
+    try:
+        with open('/sys/fs/cgroup/memory.max', 'r') as f:
+            limit = f.read().strip()
+        with open('/sys/fs/cgroup/memory.current', 'r') as f:
+            current = int(f.read().strip())
+        if limit!='max':
+            left = (int(limit)-current)/(1<<30)
+            res = left if res==None else min(res, left)
+    except (OSError, ValueError):
+        pass
+    return 0.0 if res==None else res
+
+def memoryBudgetGB() -> float:
+    '''
+    子进程可以使用的内存, 指定了--memory-limit时不超过该值
+    '''
+    budget = max(memAvailableGB()-reserve_gb, 0.5)
+    if memory_limit!=None:
+        budget = min(budget, memory_limit)
+    return budget
+
+def pathBytes(path:str) -> int:
+    '''
+    文件的大小, 或者目录中所有文件的大小之和
+    '''
+    if path==None or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    res = 0
+    for (root, _, files) in os.walk(path):
+        for fn in files:
+            try:
+                res+= os.path.getsize(os.path.join(root, fn))
+            except OSError:
+                pass
+    return res
+
+def solverMemoryGB(fact_bytes:int, jobs:int) -> float:
+    '''
+    估计求解器使用jobs个线程时需要的内存
+    '''
+    return solver_base_gb+fact_bytes*solver_fact_factor/(1<<30)+jobs*solver_thread_gb
+
+def sootMemoryGB(input_bytes:int, jobs:int) -> float:
+    '''
+    估计soot使用jobs个线程生成facts时需要的内存
+    '''
+    return soot_base_gb+input_bytes*soot_input_factor/(1<<30)+jobs*soot_core_gb
+
+def killedBy(returncode:int, sig:int) -> bool:
+    '''
+    命令是否被信号sig结束, 经过shell执行时返回码为128+sig
+    '''
+    return returncode in (-sig, 128+sig)
+
+def pickJobs(jobs:int, budget:float, need) -> int:
+    '''
+    不超过jobs, 估计内存不超过budget的最大线程数, 至少为1
+        need: 线程数 => 估计的内存
+    '''
+    while jobs>1 and need(jobs)>budget:
+        jobs-= 1
+    return max(1, jobs)
+
+
+def governedRun(cmd:str, limit_gb:float, address_limit:bool=True, interval:float=0.5) -> int:
+    '''
+    在内存上限内执行shell命令, 子进程的输出逐行转发到标准输出
+        address_limit: 用RLIMIT_AS限制子进程的虚拟内存, jvm会预留大量虚拟内存, 因此java只用-Xmx与常驻内存监控
+        进程树的常驻内存超过上限时结束整个进程组; 因内存不足失败时抛出ResourceExhausted, 其他失败抛出CalledProcessError
+    '''
+    limit_kb = int(limit_gb*(1<<20))
+
+    run = cmd
+    if address_limit:
+        # 由shell在执行命令前设置RLIMIT_AS, 流水线的其他阶段在线程中运行, 不能使用preexec_fn
+        run = 'ulimit -v %d && %s'%(limit_kb*address_space_slack, cmd)
+
+    start = time.time()
+    # 新的进程组, 超出上限时可以结束shell及其所有子进程
+    p = subprocess.Popen(run, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+    tail = deque(maxlen=50)    # 最后的输出, 用于判断是否因内存不足失败
+    finished = threading.Event()
+    peak = [0]
+    killed = [False]
+
+    def pump():
+        for line in iter(p.stdout.readline, b''):
+            text = line.decode('utf8', 'replace')
+            tail.append(text)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    recorder = telemetry.recorder
+    stage = None if recorder==None else getattr(recorder.local, 'stage', None)
+
+    def watch():
+        while not finished.wait(interval):
+            rss = sum([processRSS(pid) for pid in processTree(p.pid)])
+            peak[0] = max(peak[0], rss)
+            if recorder!=None:
+                recorder.sample(stage, rss)
+            if rss>limit_kb and not killed[0]:
+                print("[governor] %s uses %.1fGB > %.1fGB, kill it"%(cmd.split(' ')[0], rss/(1<<20), limit_gb))
+                killed[0] = True
+                try:
+                    os.killpg(p.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+    threads = [threading.Thread(target=pump, daemon=True), threading.Thread(target=watch, daemon=True)]
+    for t in threads:
+        t.start()
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    finished.set()
+    for t in threads:
+        t.join()
+    p.stdout.close()
+
+    if recorder!=None:
+        recorder.recordProcess(cmd, start, usage, peak[0], p.returncode, memory_limit_kb=limit_kb)
+    if p.returncode==0:
+        return 0
+    # 被内存监控或OOM killer结束, jvm输出了OutOfMemoryError, 或者求解器在地址空间上限内分配失败
+    oom = killed[0] or killedBy(p.returncode, signal.SIGKILL) or any([marker in line for line in tail for marker in oom_markers])
+    if not oom and address_limit and killedBy(p.returncode, solver_oom_signal):
+        oom = any([marker in line for line in tail for marker in abort_oom_markers]) or peak[0]>=limit_kb*abort_rss_ratio
+    if oom:
+        raise ResourceExhausted(p.returncode, cmd)
+    raise subprocess.CalledProcessError(p.returncode, cmd)
+
+def governedCall(name:str, make_cmd, jobs:int, need, address_limit:bool=True, budget:float=None) -> int:
+    '''
+    按可用内存选择线程数并执行命令, 内存不足时减半线程数重试, 直到单线程仍然失败
+        make_cmd: (线程数, 内存上限GB) => shell命令
+        need: 线程数 => 估计的内存GB
+        budget: 内存上限GB, None表示memoryBudgetGB(), 多个命令同时执行时由调用者分配
+    '''
+    if budget==None:
+        budget = memoryBudgetGB()
+    picked = pickJobs(jobs, budget, need)
+    while True:
+        print("[governor] %s: %d/%d threads, estimated %.1fGB, limit %.1fGB"%(name, picked, jobs, need(picked), budget))
+        try:
+            return governedRun(make_cmd(picked, budget), budget, address_limit)
+        except ResourceExhausted:
+            if picked==1:
+                print("[governor] %s ran out of memory with 1 thread"%(name))
+                raise
+            picked = max(1, picked//2)
+            print("[governor] %s ran out of memory, retry with %d threads"%(name, picked))
@@ -0,0 +1,98 @@
+# coding:utf8
+import os
+import json
+import hashlib
+
+# 增量分析的缓存目录
+cache_dir = './last-analysis/cache'
+
+# 小于该大小的文件按内容计算指纹, 更大的文件按(大小, 修改时间)计算指纹
+content_hash_limit = 8<<20
+
+
+def fingerprint(*parts) -> str:
+    '''
+    把多个字符串组合成一个指纹
+    '''
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def fingerprintFile(path:str) -> str:
+    '''
+    文件内容的指纹, 文件不存在时返回固定的标记
+    '''
+    if not os.path.exists(path):
+        return 'missing'
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1<<20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def fingerprintFactDb(fact_db:str) -> str:
+    '''
+    fact目录的指纹: 小文件按内容计算, 大文件(soot生成的facts)按大小与修改时间计算
+        soot阶段被跳过时大文件不会被改写, 因此指纹保持不变
+    '''
+    parts = []
+    for fn in sorted(os.listdir(fact_db)):
+        if not fn.endswith('.facts'):
+            continue
+        p = os.path.join(fact_db, fn)
+        st = os.stat(p)
+        if st.st_size<content_hash_limit:
+            parts.append('%s:%s'%(fn, fingerprintFile(p)))
+        else:
+            parts.append('%s:%d:%d'%(fn, st.st_size, st.st_mtime_ns))
+    return fingerprint(*parts)
+
+
+class AnalysisCache:
+    '''
+    记录每个阶段上一次成功执行时输入的指纹, 输入不变的阶段可以跳过
+    '''
+    def __init__(self, cache_dir:str):
+        self.dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'state.json')
+        self.state = {}     # 阶段名 => 指纹
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.state = json.load(f)
+
+    def isFresh(self, stage:str, key:str, outputs:list) -> bool:
+        '''
+        阶段的输入指纹没有变化, 且输出都还存在
+        '''
+        if self.state.get(stage)!=key:
+            return False
+        for o in outputs:
+            if not os.path.exists(o):
+                return False
+        return True
+
+    def record(self, stage:str, key:str):
+        '''
+        阶段执行成功后记录输入指纹
+        '''
+        self.state[stage] = key
+        self.save()
+
+    def invalidate(self, stage:str):
+        '''
+        阶段开始执行前先清除记录, 执行中断时不会误用不完整的输出
+        '''
+        if stage in self.state.keys():
+            del self.state[stage]
+            self.save()
+
+    def save(self):
+        with open(self.path+'.tmp', 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(self.path+'.tmp', self.path)
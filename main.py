@@ -1,68 +1,85 @@
 import os
 import sys
-import subprocess
 import multiprocessing
 from datetime import datetime
-import re
 import argparse
 import json
+import hashlib
+
+from resultStore import leaking_csv, iterTsv, importResults, openStore
+from reachIndex import buildReachIndex, openReachIndex
+from incremental import cache_dir, fingerprint, fingerprintFile, fingerprintFactDb, AnalysisCache
+from platformBundle import findBundle, buildBundle, mergeBundle
+from pipeline import Pipeline
+from factSlicer import sliceFactDb
+from sinkRules import loadSinkRules, compileSinkRules
+from sharding import shardedSolve
+from changeImpact import scopeFactDb, loadChangedClasses, diffArchives, report_name as scope_report_name
+import telemetry
+import governor
+import fact_generators.config_generator as config_generator
+from governor import governedCall, pathBytes, sootMemoryGB, solverMemoryGB, heap_ratio
 
 fact_db = './last-analysis/database'        # facts生成目录
 res_db = './last-analysis/result'           # 数据流分析结果目录
 sink_def_tsv = './sink_rules/primitive_rules/LeakingSinkMethodArg.tsv' # 污点定义文件
 leaking_sink_method_name_arg = 'sink_rules/migrated_rules/LeakingSinkMethodNameArg.tsv' # 从白盒迁移的规则: 根据方法名正则定义污点
 leaking_sink_method_name_var_arg = 'sink_rules/migrated_rules/LeakingSinkMethodNameVarArg.tsv' # 从白盒迁移的规则: 根据方法名正则定义可变参数的污点
+soot_generator_jar = './fact_generators/soot-fact-generator.jar'    # 生成器jar包, fatjar格式, 包含所有的依赖
+solver_bin = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver')    # 求解器, 与本文件在同一目录, 与当前目录无关
+
+# 每次分析都要传给soot fact生成器的平台jar包: (参数, jar包路径)
+platform_jars = [
+    # 以下是分析servlet所需的jar包
+    ('-i', './mocked_jars/servlet/MockServlet-1.0-SNAPSHOT.jar'),
+    ('-ld', './mocked_jars/servlet/jakarta.servlet-api-5.0.0.jar'),
+    ('-ld', './mocked_jars/servlet/javax.servlet-api-4.0.1.jar'),
+    # 对于Spring框架相关方法mock的jar包
+    ('-i', './mocked_jars/spring/MockSpring-1.0-SNAPSHOT.jar'),
+    # mock后jdk的jar包
+    ('-l', './mocked_jars/jdk/rt.jar'),
+    ('-l', './mocked_jars/jdk/jce.jar'),
+    ('-l', './mocked_jars/jdk/jsse.jar'),
+]
 
-def valid_sink_defination(path):
+def sink_rule_files(path=sink_def_tsv):
     '''
-    验证污点定义文件的格式是否正确
+    污点定义关系 => 规则文件
     '''
-    line_idx = 0   # 第几行
-    for line in open(path, 'r').read().split('\n'):
-        line_idx+=1
-        if len(line)==0:
-            continue
-        row = line.split('\t')
-        
-        # 一行只能有3个元素
-        if len(row)!=3:
-            print("line %d: [%s] format wrong "%(line_idx, line))
-            return False
-        
-        # 解析列
-        sink_label = row[0] # 污点标签
-        arg_idx = row[1]    # 第几个参数
-        method_sig = row[2] # 方法的签名
-        
-        # 检查arg_idx格式是否正确
-        if re.match(r'^[0-9]\d*$', arg_idx)==None:
-            print("line %d: [%s] format wrong "%(line_idx, line))
-            return False
-        
-        # 检查method_sig  
-        matchObj = re.match(r'^\<(.*): (.*) (.*)\((.*)\)\>', method_sig)
-        if matchObj==None:
-            print("line %d: [%s] format wrong "%(line_idx, line))
-            return False
-        
-        # 检查arg_idx是否有效
-        param_list = matchObj.group(4)
-        if int(arg_idx)>param_list.count(','):
-            print("line %d: [%s] format wrong "%(line_idx, line))
-            return False
-        
-    return True
+    return {
+        'LeakingSinkMethodArg': path,
+        'LeakingSinkMethodNameArg': leaking_sink_method_name_arg,
+        'LeakingSinkMethodNameVarArg': leaking_sink_method_name_var_arg,
+    }
+
+def valid_sink_defination(path=sink_def_tsv):
+    '''
+    一次验证所有污点定义文件的格式是否正确, 正确时返回解析后的规则, 否则返回None
+        path: 按方法签名定义污点的文件, 从白盒迁移的规则文件一并验证
+    '''
+    rules = loadSinkRules(sink_rule_files(path))
+    if len(rules.errors)>0:
+        rules.printErrors()
+        return None
+    return rules
 
-def init_fact_db(fact_db):
+def init_fact_db(fact_db, keep_facts=False):
     '''
-    初始化fact_db目录, 创建分析前的必须的facts文件
+    初始化fact_db目录
+        keep_facts: 保留上一次soot生成的facts (增量分析时soot的输入没有变化)
     '''
     # 清空fact_db目录
-    os.system('rm -rf %s'%(fact_db))
+    if not keep_facts:
+        os.system('rm -rf %s'%(fact_db))
     os.system("mkdir -p %s"%(fact_db))
-    
+
+def install_sink_rules(fact_db):
+    '''
+    验证并复制污点定义文件, 创建分析前的必须的facts文件, 返回解析后的规则
+    '''
     # 验证sink定义文件格式是否正确
-    if not valid_sink_defination(sink_def_tsv):
+    rules = valid_sink_defination(sink_def_tsv)
+    if rules==None:
         print("valid sink def: %s fail, exit"%(sink_def_tsv))
         exit(1)
         
@@ -76,139 +93,351 @@ def init_fact_db(fact_db):
     for f in arr:
         path = os.path.join(fact_db, f)
         os.system('touch %s'%(path))
+    return rules
 
-def soot_fact_generate(war_path, fact_db, jobs):
+def soot_fact_generate(war_path, fact_db, jobs, platform_facts=True):
     '''
     调用fact_generators/soot-fact-generator.jar生成facts
+        war_path: 为None时只生成平台jar包的facts, 用于生成平台facts包
+        platform_facts: 为False时只生成要分析的包的facts, 平台jar包的参数与全程序分析不变, 平台facts由预先生成的facts包提供
     '''
     # 调用生成器
-    cmd = 'java '
-    cmd+= '-cp ./fact_generators/soot-fact-generator.jar '  # 生成器jar包, fatjar格式, 包含所有的依赖
-    cmd+= 'org.clyze.doop.soot.Main '   # 生成器入口类
+    def make_cmd(cores, limit_gb):
+        '''
+        jvm的堆内存上限与生成facts的线程数由资源管理器按可用内存确定
+        '''
+        cmd = 'java '
+        cmd+= '-Xmx%dm '%(int(limit_gb*1024*heap_ratio))  # jvm堆内存上限
+        cmd+= '-cp %s '%(soot_generator_jar)  # 生成器jar包, fatjar格式, 包含所有的依赖
+        cmd+= 'org.clyze.doop.soot.Main '   # 生成器入口类
+        cmd+= '--fact-gen-cores %d '%(cores)  # 并行生成facts
+        return cmd+args
 
-    # 并行生成facts
-    cmd+= '--fact-gen-cores %d '%(jobs)
-    
     # fact输出目录
-    cmd+= '-d %s '%(fact_db)
+    args = '-d %s '%(fact_db)
     
     # 要分析的war包, 或者spring boot jar包
-    cmd+= '-i %s '%(war_path)
+    if war_path!=None:
+        args+= '-i %s '%(war_path)
     
-    # 以下是分析servlet所需的jar包
-    cmd+= '-i ./mocked_jars/servlet/MockServlet-1.0-SNAPSHOT.jar '
-    cmd+= '-ld ./mocked_jars/servlet/jakarta.servlet-api-5.0.0.jar '
-    cmd+= '-ld ./mocked_jars/servlet/javax.servlet-api-4.0.1.jar '
-    
-    # 对于Spring框架相关方法mock的jar包
-    cmd+= '-i ./mocked_jars/spring/MockSpring-1.0-SNAPSHOT.jar '
-    
-    # mock后jdk的jar包
-    cmd+= '-l ./mocked_jars/jdk/rt.jar '
-    cmd+= '-l ./mocked_jars/jdk/jce.jar '
-    cmd+= '-l ./mocked_jars/jdk/jsse.jar '
+    # servlet, Spring与jdk相关的mock jar包
+    for (flag, jar) in platform_jars:
+        args+= '%s %s '%(flag, jar)
+    args+= '--full ' # 全程序分析
+    if not platform_facts:
+        args+= '--facts-subset APP ' # 只生成-i输入的facts, -l与-ld的jar包的facts由facts包提供
     
     # 生成fact的配置
-    cmd+= '--full ' # 全程序分析
-    cmd+= '--ssa '  # SSA格式的IR
-    cmd+= '--allow-phantom '    # 允许空方法与空类
-    cmd+= '--ignore-factgen-errors '    # 忽略生成时的异常
-    cmd+= '--generate-jimple '  # 保存字节码反编译后的jimple
+    args+= '--ssa '  # SSA格式的IR
+    args+= '--allow-phantom '    # 允许空方法与空类
+    args+= '--ignore-factgen-errors '    # 忽略生成时的异常
+    if war_path!=None:
+        args+= '--generate-jimple '  # 保存字节码反编译后的jimple
 
-    return subprocess.check_call(cmd, shell=True)
+    # 估计需要的内存时, 平台jar包只在生成它们的facts时计入
+    input_bytes = pathBytes(war_path)
+    if platform_facts:
+        input_bytes+= sum([pathBytes(jar) for (_, jar) in platform_jars])
+    return governedCall('soot', make_cmd, jobs, lambda cores: sootMemoryGB(input_bytes, cores), address_limit=False)
 
-def config_fact_generate(war_path, fact_db):
+def config_fact_generate(war_path, fact_db, jobs, config_cache=None):
     '''
-    调用fact_generators/config_generator中的py脚本, 生成配置文件相关fact
+    调用fact_generators/config_generator生成配置文件相关fact
+        jobs>1时生成器在spawn方式启动的进程池中处理压缩包, 工作进程的CPU时间计入当前阶段
+        config_cache: 按压缩包内容缓存facts的目录, None表示不缓存
     '''
     input_jars = [war_path]
-    cmd = "python3 "
-    cmd+= "./fact_generators/config_generator/main.py "
-    cmd+= "-o %s "%(fact_db)
-    cmd+= "-i %s "%(input_jars.__str__().replace(' ', '').replace('\'', ''))
-    return subprocess.check_call(cmd, shell=True)
+    telemetry.workerCpu(config_generator.Main(fact_db, input_jars, jobs, config_cache))
 
-def solver(fact_db, res_db, jobs):
+def solver(fact_db, res_db, jobs, limit_gb=None):
     '''
     调用求解器进行数据流分析
+        jobs: 最多使用的线程数, 资源管理器按fact_db的大小与可用内存选择实际的线程数, 内存不足时减少线程数重试
+        limit_gb: 内存上限, None表示全部可用内存
     '''
     # 创建目录
     os.system("mkdir -p %s"%(res_db))
     
-    # 求解器参数
-    cmd = './solver '
-    cmd+= '-j %d '%(jobs)   # 多线程求解
-    cmd+= '-F %s '%(fact_db)    # 输入facts目录
-    cmd+= '-D %s '%(res_db) # 求解结果目录
+    # 求解器参数, 内存上限通过RLIMIT_AS设置
+    def make_cmd(jobs, limit_gb):
+        cmd = '%s '%(solver_bin)
+        cmd+= '-j %d '%(jobs)   # 多线程求解
+        cmd+= '-F %s '%(fact_db)    # 输入facts目录
+        cmd+= '-D %s '%(res_db) # 求解结果目录
+        return cmd
     
-    return subprocess.check_call(cmd, shell=True)
+    fact_bytes = pathBytes(fact_db)
+    return governedCall('solver', make_cmd, jobs, lambda jobs: solverMemoryGB(fact_bytes, jobs), budget=limit_gb)
 
-def resultWC(fn):
-    f = open(os.path.join(res_db, fn))
-    count = len(f.readlines())
+def solve_facts(fact_db, res_db, jobs, slice_facts=False, shards=1, limit_gb=None, sliced_db=None):
+    '''
+    求解fact_db: 需要时先切片, 再整体求解或分片求解; 分布式分析中单独的求解任务也通过这里求解, 与本地分析一致
+        sliced_db: 切片后的fact目录, None表示fact_db-sliced
+    '''
+    if slice_facts:
+        # 删除从入口不能到达sink的方法的facts, 求解切片后的fact目录
+        sliced_db = fact_db.rstrip('/')+'-sliced' if sliced_db==None else sliced_db
+        with telemetry.stage('slice'):
+            sliceFactDb(fact_db, sliced_db)
+        fact_db = sliced_db
+    if shards>1:
+        # 各分片只包含部分入口方法, 多个较小的求解器并发执行
+        shardedSolve(fact_db, res_db, shards, jobs, lambda db, res, jobs, limit_gb: solver(db, res, jobs, limit_gb))
+    else:
+        solver(fact_db, res_db, jobs, limit_gb)
+
+def resultWC(fn, store=None, res_db=res_db):
+    # 优先使用结果库中记录的行数
+    count = None if store==None else store.relationRows(fn)
+    if count==None:
+        f = open(os.path.join(res_db, fn))
+        count = len(f.readlines())
     print("%s: %d"%(fn, count))
     
-def analysis(package_path, json_output, threads):
+def soot_fingerprint(package_path, platform_bundle):
+    '''
+    soot阶段所有输入的指纹: 要分析的包, 平台jar包与生成器本身, 以及是否使用平台facts包
+    '''
+    parts = [fingerprintFile(package_path), fingerprintFile(soot_generator_jar), 'bundle' if platform_bundle else 'full']
+    for (flag, jar) in platform_jars:
+        parts.append('%s %s %s'%(flag, jar, fingerprintFile(jar)))
+    return fingerprint(*parts)
+
+def distinct_flows(rows):
+    '''
+    流式去重LeakingTaintedInformation的行, 忽略ctxId字段, 产出首次出现的(fromLable, toLabel, sinkInvo, sinkParam, source)
+        只保存每个键的64位摘要, 内存只与不同污点流的数量有关, 与上下文重复的行数无关
+    '''
+    seen = set()
+    for row in rows:
+        key = (row[0], row[1], row[2], row[4], row[5])
+        digest = int.from_bytes(hashlib.blake2b('\t'.join(key).encode('utf8'), digest_size=8).digest(), 'little')
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield key
+
+class FlowWriter:
+    '''
+    逐条写入污点流, 文件名以.ndjson或.jsonl结尾时每行一个json对象, 否则写成一个json数组
+    '''
+    def __init__(self, path):
+        self.f = open(path, 'w')
+        self.ndjson = path.endswith(('.ndjson', '.jsonl'))
+        self.count = 0
+        if not self.ndjson:
+            self.f.write('[')
+
+    def write(self, flow:dict):
+        if self.ndjson:
+            self.f.write(json.dumps(flow)+'\n')
+        else:
+            self.f.write((', ' if self.count>0 else '')+json.dumps(flow))
+        self.count+= 1
+
+    def close(self):
+        if not self.ndjson:
+            self.f.write(']')
+        self.f.close()
+
+def scope_json_path(json_output):
+    '''
+    范围分析时与json输出一起写入的范围报告, 例如res.json => res.scope.json
+    '''
+    return os.path.splitext(json_output)[0]+'.scope.json'
+
+def write_scope_json(json_output, scope_db, flows):
+    '''
+    写入范围分析的报告: 变化的类, 受影响的入口方法与输出的污点流数
+    '''
+    with open(os.path.join(scope_db, scope_report_name), 'r') as f:
+        scope = json.load(f)
+    res = {'scoped': True, 'flows': flows}
+    res.update(scope)
+    with open(scope_json_path(json_output), 'w') as f:
+        json.dump(res, f, indent=1)
+
+def workspace_paths(workspace):
+    '''
+    工作目录中的facts目录, 结果目录与增量分析缓存目录, workspace为None时使用默认的./last-analysis
+    '''
+    if workspace==None:
+        return fact_db, res_db, cache_dir
+    return os.path.join(workspace, 'database'), os.path.join(workspace, 'result'), os.path.join(workspace, 'cache')
+
+def analysis(package_path, json_output, threads, incremental=False, platform_bundle=False, metrics_dir=None, workspace=None, solver_threads=None, facts_only=False, slice_facts=False, resolve_sink_rules=False, shards=1, changed_classes=None, index_results=False):
     '''
     进行分析的主过程
         package_path: 要分析的包路径
         json_output: 把分析结果按照json格式写入指定文件中
+        incremental: 增量分析, 跳过输入指纹没有变化的阶段
+        platform_bundle: 平台jar包的facts使用预先生成的facts包, 不存在或已过期时先生成
+        metrics_dir: 把各阶段的耗时, 子进程的峰值内存与关系的大小写入该目录, None表示不记录
+        workspace: 工作目录, 同时运行的分析使用不同的工作目录, None表示./last-analysis
+        solver_threads: 求解器最多使用的线程数, None表示threads, 实际的线程数由资源管理器按可用内存确定
+        facts_only: 只生成facts, 不求解
+        slice_facts: 求解前删除从入口方法不能到达sink方法的facts
+        resolve_sink_rules: 求解前把按方法名正则定义的污点规则解析为fact_db中具体的方法
+        shards: 按入口方法把fact_db分为最多shards个分片, 在内存预算内并发求解后合并结果, 1表示不分片
+        changed_classes: 变化的类, 只求解能调用到这些类的入口方法, 结果标记为scoped; None表示分析整个程序
     '''
+    fact_db, res_db, cache_dir = workspace_paths(workspace)
+    if solver_threads==None:
+        solver_threads = threads
+    if metrics_dir!=None:
+        telemetry.enable()
+    scoped = changed_classes!=None
+    scope_db = fact_db+'-scoped'
+    cache = AnalysisCache(cache_dir) if incremental else None
+    
+    # soot阶段的输入没有变化时, 保留上一次生成的facts
+    soot_key = soot_fingerprint(package_path, platform_bundle) if incremental else None
+    reuse_soot = incremental and cache.isFresh('soot', soot_key, [fact_db])
+    if incremental and not reuse_soot:
+        cache.invalidate('soot')
     
     # 初始化fact_db目录
-    init_fact_db(fact_db)
+    init_fact_db(fact_db, reuse_soot)
+
+    def soot_stage():
+        '''
+        调用soot fact生成器
+        '''
+        if reuse_soot:
+            print("soot inputs unchanged, reuse facts in %s"%(fact_db))
+            return
+        if platform_bundle:
+            # 只为要分析的包生成facts, 再合并平台facts包
+            bundle = findBundle(platform_jars, soot_generator_jar)
+            if bundle==None:
+                print("platform bundle is missing or out of date, build it")
+                bundle = buildBundle(platform_jars, soot_generator_jar, lambda path: soot_fact_generate(None, path, threads))
+            soot_fact_generate(package_path, fact_db, threads, platform_facts=False)
+            mergeBundle(bundle, fact_db)
+        else:
+            soot_fact_generate(package_path, fact_db, threads)
+        if incremental:
+            cache.record('soot', soot_key)
+
+    def config_stage():
+        '''
+        调用配置文件fact生成器, 增量分析时只重新处理内容变化的压缩包
+        '''
+        config_fact_generate(package_path, fact_db, max(1, threads//2), os.path.join(cache_dir, 'config') if incremental else None)
 
-    # 调用soot fact生成器
-    soot_fact_generate(package_path, fact_db, threads)
+    unaffected = [False]    # 范围分析中没有受影响的入口方法
 
-    # 调用配置文件fact生成器
-    config_fact_generate(package_path, fact_db)
+    def solver_stage():
+        '''
+        fact_db与求解器都没有变化时, 复用上一次的求解结果, 否则开始数据流分析
+            切片只取决于fact_db, 因此指纹按切片前的fact_db计算; 范围分析的指纹还包括变化的类
+        '''
+        scope_key = 'scope '+fingerprint(*changed_classes) if scoped else 'program'
+        solver_key = fingerprint(fingerprintFactDb(fact_db), fingerprintFile(solver_bin), 'slice' if slice_facts else 'full', 'shards=%d'%(shards), scope_key) if incremental else None
+        if incremental and cache.isFresh('solver', solver_key, [os.path.join(res_db, 'LeakingTaintedInformation.csv')]):
+            print("fact db unchanged, reuse results in %s"%(res_db))
+            return
+        solver_fact_db = fact_db
+        if scoped:
+            # 只保留受变化影响的入口方法, 它们作为求解的根
+            with telemetry.stage('scope'):
+                scope = scopeFactDb(fact_db, scope_db, changed_classes)
+            if len(scope['affected_entries'])==0:
+                # 变化不影响任何入口方法, 不求解, 保留上一次的结果
+                unaffected[0] = True
+                return
+            solver_fact_db = scope_db
+        if incremental:
+            cache.invalidate('solver')
+        solve_facts(solver_fact_db, res_db, solver_threads, slice_facts, shards, sliced_db=fact_db+'-sliced')
+        if incremental:
+            cache.record('solver', solver_key)
 
-    # 开始数据流分析
-    print("[%s] start dataflow analysis"%(datetime.now()))
-    solver(fact_db, res_db, threads//2)
-    print("[%s] fin dataflow analysis"%(datetime.now()))
+    # soot运行在jvm中, 配置文件facts与污点定义文件可以同时生成, 三者都完成后开始求解
+    pipeline = Pipeline()
+    pipeline.add('soot', soot_stage)
+    pipeline.add('config', config_stage)
+    pipeline.add('sink_rules', lambda: install_sink_rules(fact_db))
+    solver_deps = ['soot', 'config', 'sink_rules']
+    if resolve_sink_rules:
+        # 方法签名都在soot生成的facts中, 正则规则只需匹配一次
+        pipeline.add('resolve_sink_rules', lambda: compileSinkRules(pipeline.results['sink_rules'], fact_db), ['soot', 'sink_rules'])
+        solver_deps.append('resolve_sink_rules')
+    if not facts_only:
+        pipeline.add('solver', solver_stage, solver_deps)
+    pipeline.run()
+    if facts_only:
+        return True
+    if unaffected[0]:
+        print("scoped analysis: no entry method is affected by the %d changed classes, keep the previous results in %s"%(len(changed_classes), res_db))
+        # 没有受影响的入口方法时也写入json输出, 调用者不会读到上一次分析的结果
+        if json_output!=None:
+            FlowWriter(json_output).close()
+            write_scope_json(json_output, scope_db, 0)
+        if metrics_dir!=None:
+            telemetry.recorder.write(metrics_dir, fact_db, res_db)
+        return True
+    
+    # 已有的结果库只在与结果目录一致时使用, 过期的结果库被忽略
+    store = openStore(res_db)
+    if index_results:
+        # 把结果目录导入为带索引的结果库, 后续的查询直接读取结果库
+        with telemetry.stage('import_results'):
+            if store==None:
+                importResults(res_db)
+                store = openStore(res_db)
+        
+        # 每个污点对象的流向图的可达性索引, showTaintFlow用它跳过注定失败的路径搜索
+        with telemetry.stage('reach_index'):
+            if openReachIndex(res_db)==None:
+                buildReachIndex(res_db, store)
     
     print("=====count=======")
-    resultWC("SpringBeans.csv")
-    resultWC("SpringEntryMethod.csv")
-    resultWC("CallGraphEdge.csv")
-    resultWC("VarPointsTo.csv")
+    resultWC("SpringBeans.csv", store, res_db)
+    resultWC("SpringEntryMethod.csv", store, res_db)
+    resultWC("CallGraphEdge.csv", store, res_db)
+    resultWC("VarPointsTo.csv", store, res_db)
     print("\n")
     
     print("analysis result as follwed\n")
 
+    # 范围分析只包含受变化影响的入口方法, 结果不是完整程序的结果
+    if scoped:
+        with open(os.path.join(scope_db, scope_report_name), 'r') as f:
+            scope = json.load(f)
+        print("scoped analysis: %d changed classes, %d/%d entry methods affected\n"%(len(scope['changed']), len(scope['affected_entries']), scope['entries']))
+
     # 处理结果, 这里打印结果时忽略掉ctxId字段, 该字段是为了显式污点流用的, 因此要进行一个去重
-    LeakingTaintedInformation_immuCtx = set()
-    for l in open(os.path.join(res_db, 'LeakingTaintedInformation.csv')).read().split('\n')[0:-1]:
-        l = l.split('\t')
-        fromLable = l[0]
-        toLabel = l[1] 
-        sinkInvo = l[2] # 污点方法的调用语句
-        sinkParam = l[4]    # 污点方法调用的实参
-        source = l[5]   # 污点源
-        LeakingTaintedInformation_immuCtx.add((fromLable, toLabel, sinkInvo, sinkParam, source))
-        
-    # 最后输出结果
-    for (fromLable, toLabel, sinkInvo, sinkParam, source) in LeakingTaintedInformation_immuCtx:
+    # 逐行读取结果文件, 每发现一条新的污点流就立即输出
+    writer = FlowWriter(json_output) if json_output!=None else None
+    for (fromLable, toLabel, sinkInvo, sinkParam, source) in distinct_flows(iterTsv(os.path.join(res_db, leaking_csv), 6)):
         print("[%s=>%s]: "%(fromLable, toLabel))
         print("\tSource: %s"%(source))
         print("\tInvocation to sink method: %s"%(sinkInvo))
         print("\tSink argument: %s"%(sinkParam))
         print("")
         
-    # 按照json格式写入指定文件中
-    if json_output!=None:
-        res = []
-        for (fromLable, toLabel, sinkInvo, sinkParam, source) in LeakingTaintedInformation_immuCtx:
-            res.append({
+        # 按照json格式写入指定文件中
+        if writer!=None:
+            flow = {
                 'source_label': fromLable,
                 'sink_label': toLabel,
                 'sink_invo': sinkInvo,
                 'sink_param': sinkParam,
                 'source': source
-            })
-        json.dump(res, open(json_output, 'w'))
+            }
+            if scoped:
+                flow['scoped'] = True
+            writer.write(flow)
+    if writer!=None:
+        writer.close()
+        if scoped:
+            write_scope_json(json_output, scope_db, writer.count)
+    
+    # 写入各阶段的性能指标与时间线
+    if metrics_dir!=None:
+        telemetry.recorder.write(metrics_dir, fact_db, res_db)
+        print("metrics written to %s"%(metrics_dir))
         
     return True
 
@@ -221,14 +450,57 @@ def main():
     # 输入文件
     parser.add_argument('package_path', type=str, help='java package path, support .jar/.war/.zip')     
     # 是否json格式输出
-    parser.add_argument('-J', '--json', type=str, help='output analysis result in JSON format')
+    parser.add_argument('-J', '--json', type=str, help='output analysis result in JSON format, one object per line if the file ends with .ndjson/.jsonl')
      # 并行核数
     parser.add_argument('-T', '--threads', type=int, help='num of parallel threads', default=multiprocessing.cpu_count())
+    # 增量分析
+    parser.add_argument('-I', '--incremental', action='store_true', help='skip stages whose inputs are unchanged since the last analysis')
+    # 使用预先生成的平台facts包
+    parser.add_argument('-P', '--platform-bundle', action='store_true', help='reuse pre-generated facts of the mocked platform jars (see platformBundle.py)')
+    # 性能指标
+    parser.add_argument('-M', '--metrics', type=str, help='write per-stage metrics.json and a Chrome trace.json into this directory')
+    # 工作目录
+    parser.add_argument('-W', '--workspace', type=str, help='workspace directory for facts and results, default ./last-analysis')
+    # 求解器线程数
+    parser.add_argument('--solver-threads', type=int, help='max num of solver threads, default --threads, lowered to fit the available memory')
+    # 内存上限
+    parser.add_argument('--memory-limit', type=float, help='memory limit in GB for soot and the solver, default the available memory')
+    # 只生成facts
+    parser.add_argument('--facts-only', action='store_true', help='stop after fact generation')
+    # 求解前切片
+    parser.add_argument('-S', '--slice', action='store_true', help='drop facts of methods that cannot reach a sink from an entry point before solving')
+    # 分片求解
+    parser.add_argument('-K', '--shards', type=int, help='split entry methods into up to K shards and solve them concurrently within the memory budget, each shard is pruned like --slice', default=1)
+    # 求解前解析正则污点规则
+    parser.add_argument('-R', '--resolve-sink-rules', action='store_true', help='resolve the method-name regex sink rules against the fact db before solving')
+    # 范围分析: 变化的类
+    parser.add_argument('--changed', type=str, help='only solve entry methods that can reach these changed classes, a comma separated list or a file with one class/path per line')
+    # 范围分析: 与旧版本的压缩包比较
+    parser.add_argument('--diff-base', type=str, help='old version of the package, only solve entry methods that can reach the classes changed since it')
+    # 分析后建立结果库与可达性索引
+    parser.add_argument('--index', action='store_true', help='import the results into result.sqlite and build the reachability index reach.sqlite after the analysis, to speed up repeated showTaintFlow.py queries')
     # 解析参数
     args = parser.parse_args()
+    
+    # 变化的类
+    changed_classes = None
+    if args.changed!=None or args.diff_base!=None:
+        changed_classes = []
+        if args.changed!=None:
+            changed_classes+= loadChangedClasses(args.changed)
+        if args.diff_base!=None:
+            if not os.path.exists(args.diff_base):
+                print("%s not exists"%(args.diff_base))
+                exit(1)
+            changed_classes+= diffArchives(args.diff_base, args.package_path)
+        changed_classes = sorted(set(changed_classes))
+        print("%d changed classes"%(len(changed_classes)))
+    
+    # soot与求解器的内存上限
+    governor.memory_limit = args.memory_limit
         
     # 开始分析 
-    analysis(args.package_path, args.json, args.threads)
+    analysis(args.package_path, args.json, args.threads, args.incremental, args.platform_bundle, args.metrics, args.workspace, args.solver_threads, args.facts_only, args.slice, args.resolve_sink_rules, args.shards, changed_classes, args.index)
 
 if __name__ =="__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+# coding:utf8
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import telemetry
+
+
+class Stage:
+    '''
+    流水线中的一个阶段
+        name: 阶段名
+        func: 无参数的函数, 返回值作为阶段的结果
+        deps: 依赖的阶段名, 这些阶段都完成后才开始执行
+    '''
+    def __init__(self, name:str, func, deps:list):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.start = None   # 开始与结束时间, time.time()
+        self.end = None
+
+
+class Pipeline:
+    '''
+    按依赖关系执行各个阶段, 没有依赖关系的阶段并发执行
+        各阶段主要是等待子进程(soot, 求解器)或者自己管理进程池, 因此用线程调度即可
+    '''
+    def __init__(self):
+        self.stages = {}    # 阶段名 => Stage, 按添加顺序
+        self.results = {}   # 阶段名 => 返回值
+
+    def add(self, name:str, func, deps=()):
+        '''
+        添加一个阶段, 依赖的阶段必须已经添加, 因此不会出现环
+        '''
+        for dep in deps:
+            if dep not in self.stages.keys():
+                raise ValueError("stage %s depends on unknown stage %s"%(name, dep))
+        self.stages[name] = Stage(name, func, deps)
+
+    def run(self) -> dict:
+        '''
+        执行所有阶段, 返回 阶段名 => 返回值
+            某个阶段抛出异常后不再启动新的阶段, 等正在执行的阶段结束后重新抛出该异常
+        '''
+        done = set()
+        running = {}    # future => Stage
+        error = None
+
+        def execute(stage):
+            stage.start = time.time()
+            print("[%s] start %s"%(datetime.now(), stage.name))
+            try:
+                with telemetry.stage(stage.name):
+                    return stage.func()
+            finally:
+                stage.end = time.time()
+                print("[%s] fin %s (%.1fs)"%(datetime.now(), stage.name, stage.end-stage.start))
+
+        with ThreadPoolExecutor(max(1, len(self.stages))) as pool:
+            while True:
+                # 启动所有依赖已经完成的阶段
+                if error==None:
+                    for stage in self.stages.values():
+                        if stage.name in done or stage in running.values():
+                            continue
+                        if all([dep in done for dep in stage.deps]):
+                            running[pool.submit(execute, stage)] = stage
+                if len(running)==0:
+                    break
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        self.results[stage.name] = future.result()
+                        done.add(stage.name)
+                    except BaseException as e:
+                        if error==None:
+                            error = e
+
+        if error!=None:
+            raise error
+        return self.results
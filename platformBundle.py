@@ -0,0 +1,126 @@
+# coding:utf8
+import os
+import json
+import fcntl
+import shutil
+import argparse
+from datetime import datetime
+
+from incremental import fingerprint, fingerprintFile
+
+# 平台facts包的根目录, 每个版本一个子目录, 位于仓库目录下, 与当前目录无关
+bundle_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'platform_bundle')
+# 生成facts包时持有的文件锁, 同时只有一个进程生成
+lock_name = '.lock'
+# 平台facts包中记录版本信息的文件
+manifest_name = 'manifest.json'
+
+
+def bundleVersion(platform_jars:list, generator_jar:str) -> str:
+    '''
+    平台facts包的版本: 所有平台jar包与生成器的内容指纹, 任何一个jar包变化都会得到新版本
+    '''
+    parts = [fingerprintFile(generator_jar)]
+    for (flag, jar) in platform_jars:
+        parts.append('%s %s %s'%(flag, os.path.basename(jar), fingerprintFile(jar)))
+    return fingerprint(*parts)[0:16]
+
+def findBundle(platform_jars:list, generator_jar:str):
+    '''
+    返回与当前平台jar包匹配的facts包目录, 不存在时返回None
+    '''
+    path = os.path.join(bundle_root, bundleVersion(platform_jars, generator_jar))
+    if not os.path.exists(os.path.join(path, manifest_name)):
+        return None
+    return path
+
+def buildBundle(platform_jars:list, generator_jar:str, generate, force=False) -> str:
+    '''
+    生成平台facts包, 返回facts包目录, 其他版本的facts包会被删除
+        generate: generate(fact_db), 把平台jar包的facts生成到fact_db中
+        多个分析同时生成时, 后拿到锁的进程直接使用先生成的facts包; force为True时总是重新生成
+    '''
+    os.makedirs(bundle_root, exist_ok=True)
+    with open(os.path.join(bundle_root, lock_name), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = findBundle(platform_jars, generator_jar)
+        if path!=None and not force:
+            return path
+        return generateBundle(platform_jars, generator_jar, generate)
+
+def generateBundle(platform_jars:list, generator_jar:str, generate) -> str:
+    '''
+    在锁内生成facts包并替换同版本的旧facts包
+    '''
+    version = bundleVersion(platform_jars, generator_jar)
+    path = os.path.join(bundle_root, version)
+    tmp = path+'.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    generate(tmp)
+
+    manifest = {
+        'version': version,
+        'created': datetime.now().isoformat(),
+        'generator': {'path': generator_jar, 'sha256': fingerprintFile(generator_jar)},
+        'jars': [{'flag': flag, 'path': jar, 'sha256': fingerprintFile(jar)} for (flag, jar) in platform_jars],
+        'facts': sorted([fn for fn in os.listdir(tmp) if fn.endswith('.facts')]),
+    }
+    with open(os.path.join(tmp, manifest_name), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    # 生成完成后再替换, 中断时不会留下不完整的facts包
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    for fn in os.listdir(bundle_root):
+        if fn!=version and fn!=lock_name:
+            shutil.rmtree(os.path.join(bundle_root, fn), ignore_errors=True)
+    return path
+
+def mergeBundle(bundle:str, fact_db:str):
+    '''
+    把平台facts包追加到fact_db中同名的facts文件, 重复的行由求解器去重
+    '''
+    with open(os.path.join(bundle, manifest_name), 'r') as f:
+        manifest = json.load(f)
+    for fn in manifest['facts']:
+        dst = os.path.join(fact_db, fn)
+        # 补上缺失的换行, 避免两个文件的行拼接在一起
+        if os.path.exists(dst) and os.path.getsize(dst)>0:
+            with open(dst, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                newline = f.read(1)!=b'\n'
+        else:
+            newline = False
+        with open(dst, 'ab') as o, open(os.path.join(bundle, fn), 'rb') as i:
+            if newline:
+                o.write(b'\n')
+            shutil.copyfileobj(i, o, 1<<20)
+    print("merge platform facts %s (%d relations) into %s"%(manifest['version'], len(manifest['facts']), fact_db))
+
+
+def main():
+    # 生成器的调用方式定义在main.py中
+    from main import platform_jars, soot_generator_jar, soot_fact_generate
+
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='pre-generate facts of the mocked platform jars', # 描述
+    )
+    # 并行核数
+    parser.add_argument('-T', '--threads', type=int, help='num of parallel threads', default=os.cpu_count())
+    # 即使已有当前版本也重新生成
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild even if the bundle is up to date')
+    # 解析参数
+    args = parser.parse_args()
+
+    bundle = findBundle(platform_jars, soot_generator_jar)
+    if bundle!=None and not args.force:
+        print("platform bundle %s is up to date"%(bundle))
+        return
+    bundle = buildBundle(platform_jars, soot_generator_jar, lambda fact_db: soot_fact_generate(None, fact_db, args.threads), args.force)
+    print("platform bundle written to %s"%(bundle))
+
+if __name__=='__main__':
+    main()
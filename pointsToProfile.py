@@ -0,0 +1,335 @@
+# coding:utf8
+import os
+import sys
+import json
+import heapq
+import argparse
+from array import array
+
+# numpy是可选的, 没有安装时用纯python计数, 结果相同但大结果目录上较慢
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from factSlicer import methodPrefix, splitSig
+from resultStore import res_db
+
+# 剖析报告的文件名, 默认保存在结果目录中
+report_name = 'pointsto-report.json'
+vpt_csv = 'VarPointsTo.csv'
+cge_csv = 'CallGraphEdge.csv'
+
+# 关系的列布局: 列数 => {字段: 列号}, 上下文敏感的结果为4列, 上下文无关的结果为2列
+relation_layouts = {
+    vpt_csv: {
+        4: {'hctx': 0, 'heap': 1, 'ctx': 2, 'var': 3},
+        2: {'heap': 0, 'var': 1},
+    },
+    cge_csv: {
+        4: {'ctx': 0, 'invo': 1, 'calleeCtx': 2, 'method': 3},
+        2: {'invo': 0, 'method': 1},
+    },
+}
+# 共用同一个字典的字段
+shared_dictionaries = {'hctx': 'ctx', 'calleeCtx': 'ctx'}
+
+
+class Dictionary:
+    '''
+    字符串 => 从0开始的连续编号
+    '''
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def encode(self, value:str) -> int:
+        i = self.ids.get(value)
+        if i==None:
+            i = len(self.values)
+            self.ids[value] = i
+            self.values.append(value)
+        return i
+
+    def __len__(self):
+        return len(self.values)
+
+class Relation:
+    '''
+    按列字典编码后的关系, 每个字段一个array('i')
+    '''
+    def __init__(self, path:str, layouts:dict, dictionaries:dict):
+        self.path = path
+        self.columns = {}   # 字段 => array('i')
+        self.rows = 0
+        self.skipped = 0    # 列数与第一行不同的行
+        layout = None
+        encoders = []       # (列号, 字典的encode, 编号数组)
+        with open(path, 'r') as f:
+            for line in f:
+                row = line.rstrip('\n').split('\t')
+                if len(row)==1 and len(row[0])==0:
+                    continue
+                if layout==None:
+                    layout = layouts.get(len(row))
+                    if layout==None:
+                        raise ValueError('%s: unknown layout with %d columns'%(path, len(row)))
+                    for (field, idx) in layout.items():
+                        self.columns[field] = array('i')
+                        d = dictionaries.setdefault(shared_dictionaries.get(field, field), Dictionary())
+                        encoders.append((idx, d.encode, self.columns[field].append))
+                    width = len(row)
+                if len(row)!=width:
+                    self.skipped+= 1
+                    continue
+                for (idx, encode, append) in encoders:
+                    append(encode(row[idx]))
+                self.rows+= 1
+
+    def has(self, field:str) -> bool:
+        return field in self.columns
+
+
+def groupCount(codes:array, mapping, n:int) -> list:
+    '''
+    每个编号按mapping映射到组后, 各组的行数, mapping为None时按编号本身分组
+    '''
+    if np!=None:
+        c = np.frombuffer(codes, dtype=np.int32)
+        if mapping!=None:
+            c = np.asarray(mapping, dtype=np.int32)[c]
+        return np.bincount(c, minlength=n).tolist()
+    res = [0]*n
+    if mapping==None:
+        for c in codes:
+            res[c]+= 1
+    else:
+        for c in codes:
+            res[mapping[c]]+= 1
+    return res
+
+def distinctCount(codes:array, mapping, n:int, other:array, m:int) -> list:
+    '''
+    每个组(codes按mapping映射)中不同的other编号的个数, m为other编号的范围
+    '''
+    if np!=None:
+        c = np.frombuffer(codes, dtype=np.int32)
+        if mapping!=None:
+            c = np.asarray(mapping, dtype=np.int32)[c]
+        keys = np.unique(c.astype(np.int64)*m+np.frombuffer(other, dtype=np.int32))
+        return np.bincount((keys//m).astype(np.int64), minlength=n).tolist()
+    pairs = set()
+    if mapping==None:
+        pairs.update(zip(codes, other))
+    else:
+        pairs.update([(mapping[c], o) for (c, o) in zip(codes, other)])
+    res = [0]*n
+    for (g, _) in pairs:
+        res[g]+= 1
+    return res
+
+def ranked(counts:list, names:list, total:int, n:int, key:str, **extra) -> list:
+    '''
+    行数最多的n个组, extra中是与counts对齐的其他指标
+    '''
+    res = []
+    for i in heapq.nlargest(n, range(len(counts)), key=counts.__getitem__):
+        if counts[i]==0:
+            break
+        item = {key: names[i], 'rows': counts[i], 'share': round(100.0*counts[i]/total, 2) if total>0 else 0.0}
+        for (name, values) in extra.items():
+            item[name] = values[i]
+        res.append(item)
+    return res
+
+
+class Owners:
+    '''
+    变量, 调用点, 堆对象等所属的方法, 以及方法所属的类与包
+        不属于任何方法的值(例如mock的堆对象)归入'-'
+    '''
+    def __init__(self, package_depth:int):
+        self.depth = package_depth
+        self.methods = Dictionary()
+        self.classes = Dictionary()
+        self.packages = Dictionary()
+        self.classOf = []   # 方法编号 => 类编号
+        self.packageOf = [] # 类编号 => 包编号
+
+    def package(self, cls:str) -> str:
+        parts = cls.split('.')[0:-1]
+        return '.'.join(parts[0:self.depth]) if len(parts)>0 else '-'
+
+    def method(self, value:str) -> int:
+        sig = methodPrefix(value)
+        if sig==None:
+            sig = '-'
+        i = self.methods.encode(sig)
+        if i==len(self.classOf):
+            cls = '-' if sig=='-' else splitSig(sig)[0]
+            c = self.classes.encode(cls)
+            if c==len(self.packageOf):
+                self.packageOf.append(self.packages.encode('-' if cls=='-' else self.package(cls)))
+            self.classOf.append(c)
+        return i
+
+    def mapping(self, d:Dictionary) -> list:
+        '''
+        字典中每个值 => 所属方法的编号
+        '''
+        return [self.method(value) for value in d.values]
+
+def compose(first:list, second:list) -> list:
+    return [second[i] for i in first]
+
+def heapType(heap:str) -> str:
+    '''
+    分配点<方法>/new 类型/序号中的类型, 格式不符时返回整个值
+    '''
+    i = heap.find('/new ')
+    if i<0:
+        return heap
+    t = heap[i+len('/new '):]
+    j = t.rfind('/')
+    return t if j<0 else t[0:j]
+
+
+def profilePointsTo(vpt:Relation, dictionaries:dict, owners, report:dict, n:int):
+    '''
+    指向关系按方法, 类, 包, 堆分配点与上下文的分布, 写入report
+    '''
+    total = vpt.rows
+    var = dictionaries['var']
+    heap = dictionaries['heap']
+    varMethod = owners.mapping(var)
+    heapMethod = owners.mapping(heap)
+    report['relations'][vpt_csv] = {'rows': total, 'skipped': vpt.skipped, 'vars': len(var), 'heaps': len(heap),
+                                    'contexts': len(dictionaries['ctx']) if vpt.has('ctx') else None}
+
+    # 按变量所属的方法, 类, 包统计
+    nm = len(owners.methods)
+    methodRows = groupCount(vpt.columns['var'], varMethod, nm)
+    methodVars = groupCount(array('i', varMethod), None, nm)
+    extra = {'vars': methodVars, 'avg_pts': [round(r/v, 1) if v>0 else 0.0 for (r, v) in zip(methodRows, methodVars)]}
+    if vpt.has('ctx'):
+        extra['contexts'] = distinctCount(vpt.columns['var'], varMethod, nm, vpt.columns['ctx'], len(dictionaries['ctx']))
+    report['methods'] = ranked(methodRows, owners.methods.values, total, n, 'method', **extra)
+    varClass = compose(varMethod, owners.classOf)
+    report['classes'] = ranked(groupCount(vpt.columns['var'], varClass, len(owners.classes)), owners.classes.values, total, n, 'class')
+    report['packages'] = ranked(groupCount(vpt.columns['var'], compose(varClass, owners.packageOf), len(owners.packages)), owners.packages.values, total, n, 'package')
+
+    # 按堆分配点与分配点的类型统计
+    heapRows = groupCount(vpt.columns['heap'], None, len(heap))
+    heapVars = distinctCount(vpt.columns['heap'], None, len(heap), vpt.columns['var'], len(var))
+    report['heaps'] = ranked(heapRows, heap.values, total, n, 'heap', vars=heapVars)
+    types = Dictionary()
+    heapTypeOf = [types.encode(heapType(h)) for h in heap.values]
+    report['heap_types'] = ranked(groupCount(vpt.columns['heap'], heapTypeOf, len(types)), types.values, total, n, 'type')
+    heapPackage = compose(compose(heapMethod, owners.classOf), owners.packageOf)
+    report['heap_packages'] = ranked(groupCount(vpt.columns['heap'], heapPackage, len(owners.packages)), owners.packages.values, total, n, 'package')
+
+    # 按上下文统计
+    if vpt.has('ctx'):
+        ctx = dictionaries['ctx']
+        report['contexts'] = ranked(groupCount(vpt.columns['ctx'], None, len(ctx)), ctx.values, total, n, 'context')
+        report['heap_contexts'] = ranked(groupCount(vpt.columns['hctx'], None, len(ctx)), ctx.values, total, n, 'context')
+
+def profile(res_dir:str, n:int=20, package_depth:int=3, call_graph:bool=True) -> dict:
+    '''
+    统计结果目录中的指向关系按方法, 类, 包, 堆分配点与上下文的分布, 以及调用图按方法与包的分布
+        空的关系没有可以统计的字段, 只输出0行
+        返回剖析报告
+    '''
+    dictionaries = {}
+    owners = Owners(package_depth)
+    report = {'relations': {}, 'numpy': np!=None}
+
+    vpt = Relation(os.path.join(res_dir, vpt_csv), relation_layouts[vpt_csv], dictionaries)
+    if vpt.rows==0:
+        report['relations'][vpt_csv] = {'rows': 0, 'skipped': vpt.skipped, 'vars': 0, 'heaps': 0, 'contexts': None}
+        for key in ['methods', 'classes', 'packages', 'heaps', 'heap_types', 'heap_packages']:
+            report[key] = []
+    else:
+        profilePointsTo(vpt, dictionaries, owners, report, n)
+    del vpt
+
+    # 调用图: 被调用方法的调用边与上下文
+    p = os.path.join(res_dir, cge_csv)
+    if call_graph and os.path.exists(p):
+        cge = Relation(p, relation_layouts[cge_csv], dictionaries)
+        if cge.rows==0:
+            report['relations'][cge_csv] = {'rows': 0, 'skipped': cge.skipped, 'methods': 0}
+            return report
+        method = dictionaries['method']
+        calleeMethod = owners.mapping(method)
+        nm = len(owners.methods)
+        extra = {}
+        if cge.has('calleeCtx'):
+            extra['contexts'] = distinctCount(cge.columns['method'], calleeMethod, nm, cge.columns['calleeCtx'], len(dictionaries['ctx']))
+        report['relations'][cge_csv] = {'rows': cge.rows, 'skipped': cge.skipped, 'methods': len(method)}
+        report['callees'] = ranked(groupCount(cge.columns['method'], calleeMethod, nm), owners.methods.values, cge.rows, n, 'method', **extra)
+        calleePackage = compose(compose(calleeMethod, owners.classOf), owners.packageOf)
+        report['callee_packages'] = ranked(groupCount(cge.columns['method'], calleePackage, len(owners.packages)), owners.packages.values, cge.rows, n, 'package')
+    return report
+
+
+def printTable(title:str, items:list, key:str, columns:list):
+    if items==None or len(items)==0:
+        return
+    print("== %s"%(title))
+    print("%12s %7s %s %s"%('rows', 'share', ''.join(['%10s '%(c) for c in columns]), key))
+    for item in items:
+        print("%12d %6.2f%% %s %s"%(item['rows'], item['share'], ''.join(['%10s '%(item[c]) for c in columns]), item[key]))
+    print("")
+
+def printReport(report:dict):
+    for (name, stats) in report['relations'].items():
+        print("%s: %s"%(name, ', '.join(['%s %s'%(k, v) for (k, v) in stats.items() if v!=None])))
+    print("")
+    methodColumns = ['vars', 'avg_pts']+(['contexts'] if len(report['methods'])>0 and 'contexts' in report['methods'][0] else [])
+    printTable('points-to facts by method of the variable', report['methods'], 'method', methodColumns)
+    printTable('points-to facts by class', report['classes'], 'class', [])
+    printTable('points-to facts by package', report['packages'], 'package', [])
+    printTable('points-to facts by heap allocation site', report['heaps'], 'heap', ['vars'])
+    printTable('points-to facts by allocated type', report['heap_types'], 'type', [])
+    printTable('points-to facts by package of the allocation site', report['heap_packages'], 'package', [])
+    printTable('points-to facts by context', report.get('contexts'), 'context', [])
+    printTable('points-to facts by heap context', report.get('heap_contexts'), 'context', [])
+    callees = report.get('callees')
+    printTable('call graph edges by callee', callees, 'method', ['contexts'] if callees!=None and len(callees)>0 and 'contexts' in callees[0] else [])
+    printTable('call graph edges by package of the callee', report.get('callee_packages'), 'package', [])
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='profile where the points-to facts of a solver result come from', # 描述
+    )
+    # 结果目录
+    parser.add_argument('res_db', type=str, nargs='?', help='result directory, default %s'%(res_db), default=res_db)
+    # 每类统计输出的个数
+    parser.add_argument('-n', '--top', type=int, help='num of top offenders per table', default=20)
+    # 包名保留的层数
+    parser.add_argument('-d', '--package-depth', type=int, help='num of package name components to group by', default=3)
+    # 报告文件
+    parser.add_argument('-o', '--output', type=str, help='json report path, default RES_DB/%s'%(report_name))
+    # 不统计调用图
+    parser.add_argument('--no-call-graph', action='store_true', help='skip CallGraphEdge.csv')
+    # 解析参数
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.res_db, vpt_csv)):
+        print("%s not exists"%(os.path.join(args.res_db, vpt_csv)))
+        exit(1)
+    if np==None:
+        print("numpy is not installed, count in pure python (pip install numpy for large results)", file=sys.stderr)
+    report = profile(args.res_db, args.top, args.package_depth, not args.no_call_graph)
+    printReport(report)
+    output = args.output if args.output!=None else os.path.join(args.res_db, report_name)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print("report written to %s"%(output))
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,352 @@
+# coding:utf8
+import os
+import sys
+import sqlite3
+import argparse
+from array import array
+
+from resultStore import res_db, leaking_csv, edge_csv, fileStat, openStore, importResults
+
+# 可达性索引文件名, 保存在结果目录中
+index_name = 'reach.sqlite'
+
+
+def condense(offsets, adjTo) -> tuple:
+    '''
+    用非递归的Tarjan算法求强连通分量
+        分量按完成的顺序编号, 能从分量a到达分量b(a!=b)时一定有a>b, 编号即逆拓扑序
+        返回 (节点 => 分量编号, 分量个数)
+    '''
+    n = len(offsets)-1
+    index = array('i', [-1])*n
+    low = array('i', bytes(4*n))
+    comp = array('i', [-1])*n
+    onStack = bytearray(n)
+    stack = array('i')
+    counter = 0
+    count = 0
+    for root in range(n):
+        if index[root]!=-1:
+            continue
+        index[root] = low[root] = counter
+        counter+= 1
+        stack.append(root)
+        onStack[root] = 1
+        work = [[root, offsets[root]]]     # (节点, 下一条要访问的边)
+        while len(work)>0:
+            top = work[-1]
+            v = top[0]
+            if top[1]<offsets[v+1]:
+                w = adjTo[top[1]]
+                top[1]+= 1
+                if index[w]==-1:
+                    index[w] = low[w] = counter
+                    counter+= 1
+                    stack.append(w)
+                    onStack[w] = 1
+                    work.append([w, offsets[w]])
+                elif onStack[w] and index[w]<low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if len(work)>0 and low[v]<low[work[-1][0]]:
+                low[work[-1][0]] = low[v]
+            if low[v]==index[v]:
+                while True:
+                    w = stack.pop()
+                    onStack[w] = 0
+                    comp[w] = count
+                    if w==v:
+                        break
+                count+= 1
+    return comp, count
+
+def condensedDAG(offsets, adjTo, comp, count:int) -> tuple:
+    '''
+    分量之间去重后的边, CSR格式 (dagOffsets, dagAdj)
+    '''
+    succ = [set() for _ in range(count)]
+    for v in range(len(offsets)-1):
+        c = comp[v]
+        for pos in range(offsets[v], offsets[v+1]):
+            d = comp[adjTo[pos]]
+            if d!=c:
+                succ[c].add(d)
+    dagOffsets = array('i', [0])
+    dagAdj = array('i')
+    for c in range(count):
+        dagAdj.extend(sorted(succ[c]))
+        dagOffsets.append(len(dagAdj))
+    return dagOffsets, dagAdj
+
+def intervals(dagOffsets, dagAdj, count:int) -> tuple:
+    '''
+    在DAG的生成森林上做先序/后序编号, pre[a]<=pre[b]且post[b]<=post[a]时b是a在生成树上的后代, 一定可达
+    '''
+    pre = array('i', [-1])*count
+    post = array('i', bytes(4*count))
+    clock = 0
+    # 从编号大的分量(拓扑序靠前)开始, 尽量让生成树覆盖更多的可达关系
+    for root in range(count-1, -1, -1):
+        if pre[root]!=-1:
+            continue
+        pre[root] = clock
+        clock+= 1
+        work = [[root, dagOffsets[root]]]
+        while len(work)>0:
+            top = work[-1]
+            c = top[0]
+            if top[1]<dagOffsets[c+1]:
+                d = dagAdj[top[1]]
+                top[1]+= 1
+                if pre[d]==-1:
+                    pre[d] = clock
+                    clock+= 1
+                    work.append([d, dagOffsets[d]])
+                continue
+            work.pop()
+            post[c] = clock
+            clock+= 1
+    return pre, post
+
+def targetLabels(dagOffsets, dagAdj, count:int, own:dict) -> list:
+    '''
+    每个分量能到达的目标的位图, own: 分量 => 自身包含的目标的位图
+        按编号从小到大计算, 后继的编号总是更小, 已经计算完成
+    '''
+    labels = [0]*count
+    for c in range(count):
+        label = own.get(c, 0)
+        for pos in range(dagOffsets[c], dagOffsets[c+1]):
+            label|= labels[dagAdj[pos]]
+        labels[c] = label
+    return labels
+
+
+def buildReachIndex(res_dir:str=res_db, store=None) -> str:
+    '''
+    为每个污点对象的流向图构造可达性索引, 写入结果目录中的reach.sqlite
+        强连通分量缩点后, 每个分量记录拓扑序, 生成树区间与能到达的目标位图
+        目标是LeakingTaintedInformation中该污点对象的sink参数, 起点到目标的查询只需读一个位
+    '''
+    if store==None:
+        store = openStore(res_dir)
+        if store==None:
+            importResults(res_dir)
+            store = openStore(res_dir)
+
+    # 每个污点对象的sink参数
+    targets = {}    # 污点对象 => {(ctxId, 节点名): 位}
+    for (_, _, _, sinkCtx, sinkParam, source) in store.leaks():
+        t = targets.setdefault(source, {})
+        t.setdefault((int(sinkCtx), sinkParam), len(t))
+
+    path = os.path.join(res_dir, index_name)
+    tmp = path+'.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript('''
+        CREATE TABLE manifest(relation TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+        CREATE TABLE graphs(id INTEGER PRIMARY KEY, source TEXT UNIQUE, start_comp INTEGER, comps INTEGER, label_bytes INTEGER,
+                            dag_offsets BLOB, dag_adj BLOB, pre BLOB, post BLOB, labels BLOB);
+        CREATE TABLE targets(graph_id INTEGER, bit INTEGER, ctx INTEGER, name TEXT);
+        CREATE TABLE vertices(graph_id INTEGER, ctx INTEGER, name TEXT, comp INTEGER);
+    ''')
+    for relation in [leaking_csv, edge_csv]:
+        p = os.path.join(res_dir, relation)
+        if os.path.exists(p):
+            conn.execute('INSERT INTO manifest VALUES(?, ?, ?)', (relation,)+fileStat(p))
+
+    graphCount = 0
+    compCount = 0
+    vertexCount = 0
+    for (source, graph) in store.iterFlowGraphs():
+        gid = graphCount
+        graphCount+= 1
+        comp, count = condense(graph.offsets, graph.adjTo)
+        dagOffsets, dagAdj = condensedDAG(graph.offsets, graph.adjTo, comp, count)
+        pre, post = intervals(dagOffsets, dagAdj, count)
+
+        # 目标所在的分量
+        own = {}
+        rows = []
+        for ((ctxId, name), bit) in targets.get(source, {}).items():
+            rows.append((gid, bit, ctxId, name))
+            v = graph.findVertex((ctxId, name))
+            if v is not None:
+                own[comp[v]] = own.get(comp[v], 0) | (1<<bit)
+        conn.executemany('INSERT INTO targets VALUES(?, ?, ?, ?)', rows)
+        labels = targetLabels(dagOffsets, dagAdj, count, own)
+        width = (len(rows)+7)//8
+        blob = b''.join([label.to_bytes(width, 'little') for label in labels]) if width>0 else b''
+
+        startV = graph.findVertex((graph.startCtxId, source)) if graph.startCtxId is not None else None
+        conn.execute('INSERT INTO graphs VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (gid, source, None if startV is None else comp[startV], count, width,
+                     dagOffsets.tobytes(), dagAdj.tobytes(), pre.tobytes(), post.tobytes(), blob))
+        conn.executemany('INSERT INTO vertices VALUES(?, ?, ?, ?)', [(gid, graph.vCtx[v], graph.names.get(graph.vName[v]), comp[v]) for v in range(len(comp))])
+        compCount+= count
+        vertexCount+= len(comp)
+
+    conn.executescript('''
+        CREATE INDEX targets_key ON targets(graph_id, name, ctx);
+        CREATE INDEX vertices_key ON vertices(graph_id, name, ctx);
+    ''')
+    conn.commit()
+    conn.close()
+    os.replace(tmp, path)
+    print("reach index: %d graphs, %d vertices in %d components"%(graphCount, vertexCount, compCount))
+    return path
+
+
+class GraphLabels:
+    '''
+    一个污点对象的流向图的索引, 数组在第一次查询时从索引文件读出
+    '''
+    def __init__(self, row:tuple):
+        gid, self.source, self.startComp, self.comps, self.width, dagOffsets, dagAdj, pre, post, self.labels = row
+        self.id = gid
+        self.dagOffsets = array('i', dagOffsets)
+        self.dagAdj = array('i', dagAdj)
+        self.pre = array('i', pre)
+        self.post = array('i', post)
+
+    def label(self, c:int) -> int:
+        return int.from_bytes(self.labels[c*self.width:(c+1)*self.width], 'little')
+
+    def compReaches(self, a:int, b:int) -> bool:
+        '''
+        分量a能否到达分量b: 逆拓扑序与生成树区间能回答大部分查询, 其余在DAG上搜索, 跳过编号小于b的分量
+        '''
+        if a==b:
+            return True
+        if a<b:
+            return False
+        if self.pre[a]<=self.pre[b] and self.post[b]<=self.post[a]:
+            return True
+        seen = set([a])
+        todo = [a]
+        while len(todo)>0:
+            c = todo.pop()
+            for pos in range(self.dagOffsets[c], self.dagOffsets[c+1]):
+                d = self.dagAdj[pos]
+                if d==b:
+                    return True
+                if d>b and d not in seen:
+                    # 区间包含b的后代一定可达
+                    if self.pre[d]<=self.pre[b] and self.post[b]<=self.post[d]:
+                        return True
+                    seen.add(d)
+                    todo.append(d)
+        return False
+
+class ReachIndex:
+    '''
+    打开的可达性索引
+    '''
+    def __init__(self, path:str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.manifest = {}
+        for (relation, size, mtime) in self.conn.execute('SELECT relation, size, mtime_ns FROM manifest'):
+            self.manifest[relation] = (size, mtime)
+        self.graphs = {}    # 污点对象 => GraphLabels, None表示没有流向图
+
+    def isFresh(self, res_dir:str) -> bool:
+        for relation in [leaking_csv, edge_csv]:
+            p = os.path.join(res_dir, relation)
+            if os.path.exists(p) and self.manifest.get(relation)!=fileStat(p):
+                return False
+        return True
+
+    def graph(self, source:str):
+        if source not in self.graphs:
+            row = self.conn.execute('SELECT * FROM graphs WHERE source=?', (source,)).fetchone()
+            self.graphs[source] = None if row==None else GraphLabels(row)
+        return self.graphs[source]
+
+    def comp(self, g:GraphLabels, vertex:tuple):
+        row = self.conn.execute('SELECT comp FROM vertices WHERE graph_id=? AND name=? AND ctx=?', (g.id, vertex[1], vertex[0])).fetchone()
+        return None if row==None else row[0]
+
+    def canReachSink(self, source:str, sink:tuple) -> bool:
+        '''
+        污点对象的起点能否到达sink参数(ctxId, 节点名), 不是该污点对象的sink参数时按一般的节点查询
+        '''
+        g = self.graph(source)
+        if g==None or g.startComp==None:
+            return False
+        row = self.conn.execute('SELECT bit FROM targets WHERE graph_id=? AND name=? AND ctx=?', (g.id, sink[1], sink[0])).fetchone()
+        if row!=None:
+            return (g.label(g.startComp)>>row[0])&1==1
+        c = self.comp(g, sink)
+        return c!=None and g.compReaches(g.startComp, c)
+
+    def reaches(self, source:str, start:tuple, end:tuple) -> bool:
+        '''
+        在污点对象的流向图中, 节点start能否到达end, 节点为(ctxId, 节点名)
+        '''
+        g = self.graph(source)
+        if g==None:
+            return False
+        a = self.comp(g, start)
+        b = self.comp(g, end)
+        return a!=None and b!=None and g.compReaches(a, b)
+
+    def reachableSinks(self, source:str) -> list:
+        '''
+        污点对象的起点能到达的sink参数 [(ctxId, 节点名)]
+        '''
+        g = self.graph(source)
+        if g==None or g.startComp==None:
+            return []
+        label = g.label(g.startComp)
+        return [(ctx, name) for (bit, ctx, name) in self.conn.execute('SELECT bit, ctx, name FROM targets WHERE graph_id=? ORDER BY bit', (g.id,)) if (label>>bit)&1]
+
+
+def openReachIndex(res_dir:str=res_db):
+    '''
+    打开结果目录中的可达性索引, 不存在或已过期时返回None
+    '''
+    path = os.path.join(res_dir, index_name)
+    if not os.path.exists(path):
+        return None
+    index = ReachIndex(path)
+    if not index.isFresh(res_dir):
+        print("reach index %s is out of date, ignore it"%(path), file=sys.stderr)
+        return None
+    return index
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='build or query the reachability index of the taint propagation graphs', # 描述
+    )
+    # 结果目录
+    parser.add_argument('result_dir', type=str, nargs='?', help='solver output directory', default=res_db)
+    # 查询某个污点对象能到达的sink参数
+    parser.add_argument('-S', '--source', type=str, help='list the sink arguments reachable from this taint source')
+    # 查询两个节点之间是否可达
+    parser.add_argument('--reach', type=str, nargs=2, metavar=('FROM', 'TO'), help='whether vertex FROM reaches TO in the graph of --source, a vertex is CTX_ID:NAME')
+    # 解析参数
+    args = parser.parse_args()
+
+    if args.source==None:
+        buildReachIndex(args.result_dir)
+        return
+    index = openReachIndex(args.result_dir)
+    if index==None:
+        print("no reach index in %s, build it first"%(args.result_dir))
+        exit(1)
+    if args.reach!=None:
+        start, end = [(int(v[0:v.index(':')]), v[v.index(':')+1:]) for v in args.reach]
+        print(index.reaches(args.source, start, end))
+    else:
+        for (ctx, name) in index.reachableSinks(args.source):
+            print("%d\t%s"%(ctx, name))
+
+if __name__=='__main__':
+    main()
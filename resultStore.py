@@ -0,0 +1,262 @@
+# coding:utf8
+import os
+import sys
+import sqlite3
+import argparse
+
+from taintGraph import buildFlowGraphs
+
+# 数据流分析结果目录
+res_db = './last-analysis/result'
+# 索引后的结果库文件名, 保存在结果目录中
+store_name = 'result.sqlite'
+# 导入到结果库中的关系
+leaking_csv = 'LeakingTaintedInformation.csv'
+edge_csv = 'TaintObjectPropagateEdge.csv'
+
+
+def storePath(res_db):
+    return os.path.join(res_db, store_name)
+
+def fileStat(path):
+    '''
+    返回文件的(大小, 修改时间), 用来判断结果库是否过期
+    '''
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def countLines(path):
+    '''
+    按块统计文件行数, 与len(readlines())的结果一致
+    '''
+    count = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1<<20)
+            if not chunk:
+                break
+            count+= chunk.count(b'\n')
+            last = chunk[-1:]
+    if last!=b'\n':
+        count+= 1
+    return count
+
+def invokedMethod(invo:str) -> str:
+    '''
+    调用语句<caller>/cls.method/idx中被调用的方法cls.method, 格式不符时返回None
+        调用者签名以')>'结尾, 从这里切分, 使构造函数cls.<init>中的'>'不影响解析
+    '''
+    start = invo.find(')>/')
+    end = invo.rfind('/')
+    if start<0 or end<=start+3:
+        return None
+    return invo[start+3:end]
+
+def iterTsv(path, columns):
+    '''
+    流式读取tsv文件, 跳过空行, 每行转换为columns列的元组
+    '''
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if len(line)==0:
+                continue
+            row = line.split('\t')
+            yield tuple(row[0:columns])
+
+def importResults(res_db):
+    '''
+    把求解器输出的结果目录导入为带索引的sqlite结果库, 返回结果库路径
+        leaks: LeakingTaintedInformation, 在污点源, sink方法调用, sink标签上建索引
+        edges: TaintObjectPropagateEdge, 在污点源上建索引, 污点源与边的原因驻留为整数
+        manifest: 每个关系文件的大小, 修改时间与行数
+    '''
+    path = storePath(res_db)
+    tmp = path+'.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    conn = sqlite3.connect(tmp)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript('''
+        CREATE TABLE manifest(relation TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, rows INTEGER);
+        CREATE TABLE sources(id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+        CREATE TABLE reasons(id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+        CREATE TABLE leaks(from_label TEXT, to_label TEXT, sink_invo TEXT, sink_ctx INTEGER, sink_param TEXT, source TEXT);
+        CREATE TABLE edges(source_id INTEGER, from_ctx INTEGER, from_name TEXT, to_ctx INTEGER, to_name TEXT, reason_id INTEGER);
+    ''')
+
+    # 记录所有关系的行数, 供resultWC使用
+    for fn in sorted(os.listdir(res_db)):
+        if not fn.endswith('.csv'):
+            continue
+        p = os.path.join(res_db, fn)
+        size, mtime = fileStat(p)
+        conn.execute('INSERT INTO manifest VALUES(?, ?, ?, ?)', (fn, size, mtime, countLines(p)))
+
+    # 导入污点流分析结果
+    p = os.path.join(res_db, leaking_csv)
+    if os.path.exists(p):
+        conn.executemany('INSERT INTO leaks VALUES(?, ?, ?, ?, ?, ?)', iterTsv(p, 6))
+
+    # 导入污点传播边, 污点源与原因的种类很少, 驻留为整数以节省空间
+    p = os.path.join(res_db, edge_csv)
+    if os.path.exists(p):
+        sources = {}
+        reasons = {}
+        def rows():
+            for row in iterTsv(p, 6):
+                sourceId = sources.get(row[0])
+                if sourceId is None:
+                    sourceId = sources[row[0]] = len(sources)
+                reasonId = reasons.get(row[5])
+                if reasonId is None:
+                    reasonId = reasons[row[5]] = len(reasons)
+                yield (sourceId, int(row[1]), row[2], int(row[3]), row[4], reasonId)
+        conn.executemany('INSERT INTO edges VALUES(?, ?, ?, ?, ?, ?)', rows())
+        conn.executemany('INSERT INTO sources VALUES(?, ?)', [(v, k) for (k, v) in sources.items()])
+        conn.executemany('INSERT INTO reasons VALUES(?, ?)', [(v, k) for (k, v) in reasons.items()])
+
+    # 数据导入后再建索引, 比逐行维护索引快
+    conn.executescript('''
+        CREATE INDEX leaks_source ON leaks(source);
+        CREATE INDEX leaks_sink_invo ON leaks(sink_invo);
+        CREATE INDEX leaks_to_label ON leaks(to_label);
+        CREATE INDEX edges_source ON edges(source_id);
+    ''')
+    conn.commit()
+    conn.close()
+
+    # 导入完成后再替换, 避免读到不完整的结果库
+    os.replace(tmp, path)
+    return path
+
+
+class ResultStore:
+    '''
+    表示一个导入后的结果库
+    '''
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.manifest = {}  # 关系文件名 => (大小, 修改时间, 行数)
+        for (relation, size, mtime, rows) in self.conn.execute('SELECT relation, size, mtime_ns, rows FROM manifest'):
+            self.manifest[relation] = (size, mtime, rows)
+
+    def isFresh(self, res_db) -> bool:
+        '''
+        导入的关系文件在导入后没有被修改过; 关系文件被删除时, 以结果库为准
+        '''
+        for relation in [leaking_csv, edge_csv]:
+            p = os.path.join(res_db, relation)
+            if not os.path.exists(p):
+                continue
+            if relation not in self.manifest.keys() or fileStat(p)!=self.manifest[relation][0:2]:
+                return False
+        return True
+
+    def relationRows(self, relation):
+        '''
+        关系的行数, 不在结果库中时返回None
+        '''
+        if relation not in self.manifest.keys():
+            return None
+        return self.manifest[relation][2]
+
+    def leaks(self, only_source=None, sink_invo=None, sink_label=None, sink_method=None) -> list:
+        '''
+        按结果文件中的顺序返回LeakingTaintedInformation的行, 格式与showTaintFlow.loadCsv一致
+            only_source, sink_invo, sink_label: 按污点源, sink方法调用, sink标签过滤, None表示不过滤
+            sink_method: 按调用的sink方法过滤, 如java.lang.Runtime.exec, 匹配调用语句<caller>/cls.method/idx中间的部分
+        '''
+        sql = 'SELECT from_label, to_label, sink_invo, sink_ctx, sink_param, source FROM leaks'
+        conds = []
+        args = []
+        for (column, value) in [('source', only_source), ('sink_invo', sink_invo), ('to_label', sink_label)]:
+            if value!=None:
+                conds.append('%s=?'%(column))
+                args.append(value)
+        if sink_method!=None:
+            conds.append('instr(sink_invo, ?)>0')
+            args.append(')>/%s/'%(sink_method))
+        if len(conds)>0:
+            sql+= ' WHERE '+' AND '.join(conds)
+        sql+= ' ORDER BY rowid'
+        rows = [[row[0], row[1], row[2], str(row[3]), row[4], row[5]] for row in self.conn.execute(sql, args)]
+        if sink_method!=None:
+            # instr只是预筛选, 这里按调用语句的结构精确匹配
+            rows = [row for row in rows if invokedMethod(row[2])==sink_method]
+        return rows
+
+    def distinctLeaks(self) -> list:
+        '''
+        忽略ctxId字段后去重的结果 (fromLable, toLabel, sinkInvo, sinkParam, source)
+        '''
+        return self.conn.execute('SELECT DISTINCT from_label, to_label, sink_invo, sink_param, source FROM leaks').fetchall()
+
+    def iterEdgeRows(self, sources):
+        '''
+        按csv中的顺序产出sources中的污点对象的边, 格式与taintGraph.iterEdgeRows一致
+        '''
+        id2source = dict(self.conn.execute('SELECT id, name FROM sources'))
+        id2reason = dict(self.conn.execute('SELECT id, name FROM reasons'))
+        sql = 'SELECT source_id, from_ctx, from_name, to_ctx, to_name, reason_id FROM edges'
+        if sources is None:
+            ids = [None]
+        else:
+            source2id = dict([(v, k) for (k, v) in id2source.items()])
+            ids = sorted([source2id[src] for src in sources if src in source2id.keys()])
+            sql+= ' WHERE source_id=?'
+        sql+= ' ORDER BY rowid'
+        for sourceId in ids:
+            args = () if sourceId is None else (sourceId,)
+            for (sid, fromCtxId, _from, toCtxId, _to, reasonId) in self.conn.execute(sql, args):
+                yield (id2source[sid], fromCtxId, _from, toCtxId, _to, id2reason[reasonId])
+
+    def iterFlowGraphs(self):
+        '''
+        逐个污点对象构造流向图, 同一时间只保留一个图, 产出 (污点对象, FlowGraph)
+        '''
+        id2reason = dict(self.conn.execute('SELECT id, name FROM reasons'))
+        for (sourceId, source) in self.conn.execute('SELECT id, name FROM sources ORDER BY id').fetchall():
+            rows = self.conn.execute('SELECT from_ctx, from_name, to_ctx, to_name, reason_id FROM edges WHERE source_id=? ORDER BY rowid', (sourceId,))
+            graphs = buildFlowGraphs((source, fromCtxId, _from, toCtxId, _to, id2reason[reasonId]) for (fromCtxId, _from, toCtxId, _to, reasonId) in rows)
+            yield (source, graphs[source])
+
+    def loadFlowGraphs(self, sources, projected=False) -> dict:
+        '''
+        只为sources中的污点对象构造流向图, 与taintGraph.loadFlowGraphs的结果一致
+        '''
+        return buildFlowGraphs(self.iterEdgeRows(sources), projected)
+
+
+def openStore(res_db):
+    '''
+    打开结果目录中的结果库, 不存在或已过期时返回None
+    '''
+    path = storePath(res_db)
+    if not os.path.exists(path):
+        return None
+    store = ResultStore(path)
+    if not store.isFresh(res_db):
+        print("result store %s is out of date, ignore it"%(path), file=sys.stderr)
+        return None
+    return store
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='import analysis result into an indexed store', # 描述
+    )
+    # 结果目录
+    parser.add_argument('result_dir', type=str, nargs='?', help='solver output directory', default=res_db)
+    # 解析参数
+    args = parser.parse_args()
+
+    print("import %s into %s"%(args.result_dir, importResults(args.result_dir)))
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,278 @@
+# coding:utf8
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import telemetry
+from factSlicer import loadHierarchy, buildCallGraph, findEntries, findSinkCallers, keptMethods, closeMethods, reachable, writeSlice, splitSig
+from governor import memoryBudgetGB, pathBytes, solverMemoryGB
+from resultStore import iterTsv, leaking_csv, edge_csv
+from taintGraph import START_EDGE_REASONS
+
+# 分片的报告文件
+report_name = 'shard-report.json'
+
+# 合并时需要重新编号上下文的其他关系: 文件名 => 上下文ID所在的列, 与污点传播边使用同一套上下文ID
+context_columns = {
+    'VarPointsTo.csv': (0, 2),      # hctx, heap, ctx, var
+    'CallGraphEdge.csv': (0, 2),    # ctx, invo, calleeCtx, callee
+}
+
+
+def partitionEntries(seeds:set, graph:dict, hierarchy, k:int) -> list:
+    '''
+    把能到达sink的入口方法分为k组, 同一个类的入口方法分在同一组
+        按类的前向闭包大小从大到小, 依次放入当前闭包总大小最小的组
+        返回 [(入口方法集合, 保留的方法集合)], 空的组被去掉
+    '''
+    units = {}  # 类 => 入口方法
+    for m in seeds:
+        units.setdefault(splitSig(m)[0], set()).add(m)
+    sized = sorted([(len(reachable(methods, graph)), cls) for (cls, methods) in units.items()], reverse=True)
+
+    groups = [set() for _ in range(k)]
+    loads = [0]*k
+    for (size, cls) in sized:
+        i = loads.index(min(loads))
+        groups[i]|= units[cls]
+        loads[i]+= size
+    return [(group, closeMethods(group, graph, hierarchy)) for group in groups if len(group)>0]
+
+def shardFactDb(fact_db:str, out_dir:str, k:int, entryRegex=None) -> list:
+    '''
+    按入口方法把fact_db分为最多k个分片, 每个分片只保留它的入口方法的前向闭包, 没有变化的facts文件硬链接到fact_db
+        分片与factSlicer的切片使用相同的裁剪, 不能到达sink的入口方法与其他方法的facts被丢弃, 与是否指定--slice无关
+        保留上下文的策略下, 不同入口的数据流不会混合, 因此分片结果的并集就是完整的结果
+        不能到达sink的入口方法不属于任何分片; 没有入口能到达sink时只有一个完整的分片
+        返回各分片的fact目录
+    '''
+    hierarchy = loadHierarchy(fact_db)
+    refs, graph = buildCallGraph(fact_db, hierarchy)
+    entries = findEntries(fact_db, hierarchy, entryRegex)
+    sinkCallers = findSinkCallers(fact_db, refs)
+    seeds, _ = keptMethods(entries, sinkCallers, graph, hierarchy)
+
+    if len(seeds)==0:
+        print("shard: no entry method reaches a sink method, solve the whole fact db", file=sys.stderr)
+        parts = [(set(), None)]
+    else:
+        parts = partitionEntries(seeds, graph, hierarchy, k)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    shard_dbs = []
+    report = []
+    for (i, (group, kept)) in enumerate(parts):
+        shard_db = os.path.join(out_dir, str(i))
+        stats = writeSlice(fact_db, shard_db, kept)
+        shard_dbs.append(shard_db)
+        report.append({
+            'entries': len(group),
+            'kept_methods': None if kept==None else len(kept),
+            'rows': sum([a for (_, a) in stats.values()]),
+            'bytes': pathBytes(shard_db),
+        })
+        print("shard %d: %d entry methods, keep %s methods, %d rows"%(i, len(group), 'all' if kept==None else len(kept), report[-1]['rows']))
+    with open(os.path.join(out_dir, report_name), 'w') as f:
+        json.dump({'entries': len(entries), 'seeds': len(seeds), 'shards': report}, f, indent=1)
+    return shard_dbs
+
+
+def solveShards(shards:list, threads:int, solve) -> list:
+    '''
+    在内存预算内并发求解各分片, 估计内存大的分片先启动
+        shards: [(分片fact目录, 分片结果目录)]
+        solve: (fact目录, 结果目录, 线程数, 内存上限GB) => None
+        每个分片启动时分到的内存上限是预算减去正在运行的分片的估计内存; 放不下时等待, 没有分片运行时总是启动
+    '''
+    budget = memoryBudgetGB()
+    jobs = max(1, threads//len(shards))
+    pending = sorted([(solverMemoryGB(pathBytes(db), jobs), i, db, res) for (i, (db, res)) in enumerate(shards)], reverse=True)
+    running = {}    # future => (分片序号, 估计内存)
+    error = None
+    with ThreadPoolExecutor(len(shards)) as pool:
+        while len(pending)>0 or len(running)>0:
+            while len(pending)>0 and error==None:
+                need, i, db, res = pending[0]
+                used = sum([n for (_, n) in running.values()])
+                if len(running)>0 and used+need>budget:
+                    break
+                pending.pop(0)
+                print("[%s] start shard %d, estimated %.1fGB, limit %.1fGB"%(datetime.now(), i, need, budget-used))
+                running[pool.submit(solve, db, res, jobs, budget-used)] = (i, need)
+            if len(running)==0:
+                break
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                i, _ = running.pop(future)
+                try:
+                    future.result()
+                    print("[%s] fin shard %d"%(datetime.now(), i))
+                except BaseException as e:
+                    if error==None:
+                        error = e
+    if error!=None:
+        raise error
+    return [res for (_, res) in shards]
+
+
+def rowDigest(key:str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf8'), digest_size=8).digest(), 'little')
+
+def shardCtx(ctx:str, k:int, i:int) -> str:
+    '''
+    分片i中的上下文ID在合并后的编号: 整数编号为 ctx*k+i, 与污点传播边一致; 其他格式的上下文保留原值并加上分片序号前缀
+    '''
+    try:
+        return str(int(ctx)*k+i)
+    except ValueError:
+        return '%d:%s'%(i, ctx)
+
+def mergeShardResults(res_dirs:list, res_db:str) -> dict:
+    '''
+    合并各分片的结果到res_db
+        各分片的上下文ID互不相关, 重新编号为 ctxId*k+分片序号; 污点源节点的上下文统一为第一个包含它的分片的编号, 使各分片的流向图在污点源处连通
+        LeakingTaintedInformation: 忽略上下文后, 去掉前面的分片已经找到的污点流, 分片内按上下文区分的行全部保留, 与不分片时一致
+        TaintObjectPropagateEdge: 重新编号后合并
+        context_columns中的关系: 用shardCtx重新编号上下文列后合并, 不同分片的行上下文不同, 不会重复; 列数不足的行原样保留
+        其他关系: 去掉完全相同的行, 其中的上下文ID不重新编号
+        返回 关系名 => 合并后的行数
+    '''
+    k = len(res_dirs)
+    os.makedirs(res_db, exist_ok=True)
+
+    # 每个分片中污点源的上下文
+    starts = []     # 分片 => {污点源: ctxId}
+    canon = {}      # 污点源 => 合并后的上下文
+    for (i, res_dir) in enumerate(res_dirs):
+        start = {}
+        p = os.path.join(res_dir, edge_csv)
+        if os.path.exists(p):
+            for row in iterTsv(p, 6):
+                if row[5] in START_EDGE_REASONS and row[0] not in start:
+                    start[row[0]] = int(row[1])
+        starts.append(start)
+        for (src, ctx) in start.items():
+            canon.setdefault(src, ctx*k+i)
+
+    def remap(i, src, ctx, name):
+        if name==src and starts[i].get(src)==ctx:
+            return canon[src]
+        return ctx*k+i
+
+    counts = {}
+    with open(os.path.join(res_db, edge_csv), 'w') as f:
+        count = 0
+        for (i, res_dir) in enumerate(res_dirs):
+            p = os.path.join(res_dir, edge_csv)
+            if not os.path.exists(p):
+                continue
+            for (src, fromCtx, _from, toCtx, _to, reason) in iterTsv(p, 6):
+                f.write('%s\t%d\t%s\t%d\t%s\t%s\n'%(src, remap(i, src, int(fromCtx), _from), _from, remap(i, src, int(toCtx), _to), _to, reason))
+                count+= 1
+        counts[edge_csv] = count
+
+    with open(os.path.join(res_db, leaking_csv), 'w') as f:
+        seen = set()    # 前面的分片中忽略上下文后的64位摘要
+        count = 0
+        for (i, res_dir) in enumerate(res_dirs):
+            p = os.path.join(res_dir, leaking_csv)
+            if not os.path.exists(p):
+                continue
+            found = set()
+            for row in iterTsv(p, 6):
+                digest = rowDigest('\t'.join([row[0], row[1], row[2], row[4], row[5]]))
+                if digest in seen:
+                    continue
+                found.add(digest)
+                f.write('%s\t%s\t%s\t%d\t%s\t%s\n'%(row[0], row[1], row[2], remap(i, row[5], int(row[3]), row[4]), row[4], row[5]))
+                count+= 1
+            seen.update(found)
+        counts[leaking_csv] = count
+
+    # 其他关系
+    names = set()
+    for res_dir in res_dirs:
+        names.update([fn for fn in os.listdir(res_dir) if fn.endswith('.csv') and fn not in [edge_csv, leaking_csv]])
+    for fn in sorted(names):
+        ctxCols = context_columns.get(fn)
+        seen = set()
+        count = 0
+        with open(os.path.join(res_db, fn), 'w') as f:
+            for (i, res_dir) in enumerate(res_dirs):
+                p = os.path.join(res_dir, fn)
+                if not os.path.exists(p):
+                    continue
+                for line in open(p, 'r'):
+                    line = line.rstrip('\n')
+                    if len(line)==0:
+                        continue
+                    if ctxCols!=None:
+                        row = line.split('\t')
+                        if len(row)>max(ctxCols):
+                            for c in ctxCols:
+                                row[c] = shardCtx(row[c], k, i)
+                            line = '\t'.join(row)
+                    else:
+                        # 没有上下文列的关系, 相同的行只保留一次
+                        digest = rowDigest(line)
+                        if digest in seen:
+                            continue
+                        seen.add(digest)
+                    f.write(line+'\n')
+                    count+= 1
+        counts[fn] = count
+    return counts
+
+
+def shardedSolve(fact_db:str, res_db:str, k:int, threads:int, solve, entryRegex=None) -> dict:
+    '''
+    分片求解: 按入口方法把fact_db分为k个分片, 在内存预算内并发求解, 再把结果合并到res_db
+        分片的facts在fact_db-shards中, 分片的结果在res_db-shards中
+    '''
+    with telemetry.stage('shard'):
+        shard_dbs = shardFactDb(fact_db, fact_db.rstrip('/')+'-shards', k, entryRegex)
+    res_root = res_db.rstrip('/')+'-shards'
+    shutil.rmtree(res_root, ignore_errors=True)
+    shards = [(db, os.path.join(res_root, os.path.basename(db))) for db in shard_dbs]
+    res_dirs = solveShards(shards, threads, solve)
+    with telemetry.stage('merge_shards'):
+        counts = mergeShardResults(res_dirs, res_db)
+    print("merged %d shards: %s"%(len(res_dirs), ', '.join(['%s %d rows'%(fn, n) for (fn, n) in sorted(counts.items())])))
+    return counts
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='split a fact directory into per-entry-point shards, or merge the results of solved shards; each shard keeps only the facts of the methods reachable from its entry methods, as factSlicer.py does', # 描述
+    )
+    # 输入与输出目录
+    parser.add_argument('input', type=str, help='fact directory to split, or with --merge the parent directory of the shard results')
+    parser.add_argument('out_dir', type=str, help='directory for the shards, or with --merge the merged result directory')
+    # 分片数
+    parser.add_argument('-k', '--shards', type=int, help='max num of shards', default=4)
+    # 额外的入口方法
+    parser.add_argument('-e', '--entry', type=str, help='regex of extra entry method signatures')
+    # 合并分片的结果
+    parser.add_argument('--merge', action='store_true', help='merge the shard results in the numbered sub directories of input; context ids of the taint edges, flows, VarPointsTo and CallGraphEdge are renumbered as ctx*K+i, flows already found by an earlier shard and identical rows of other relations are dropped')
+    # 解析参数
+    args = parser.parse_args()
+
+    if args.merge:
+        res_dirs = sorted([os.path.join(args.input, fn) for fn in os.listdir(args.input) if fn.isdigit()], key=lambda p: int(os.path.basename(p)))
+        if len(res_dirs)==0:
+            print("no shard results in %s"%(args.input))
+            exit(1)
+        print(mergeShardResults(res_dirs, args.out_dir))
+    else:
+        shardFactDb(args.input, args.out_dir, args.shards, args.entry)
+
+if __name__=='__main__':
+    main()
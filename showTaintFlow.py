@@ -1,8 +1,11 @@
-import sys
-from queue import Queue
+import os
 import argparse
 import json
 
+from taintGraph import Edge, FlowGraph, ContextFreePath, loadFlowGraphs, resolvePathsParallel
+from resultStore import openStore, invokedMethod
+from reachIndex import openReachIndex
+
 # 污点对象传播边
 edge_csv_path = './last-analysis/result/TaintObjectPropagateEdge.csv'
 # 污点分析的结果
@@ -21,185 +24,6 @@ def loadCsv(path):
         res.append(row.split('\t'))
     return res
 
-class Edge:
-    '''
-    表示一个污点传播边
-    '''
-    def __init__(self, edge) -> None:
-        self.fromCtxId = int(edge[1])    # 区分from的上下文的ID
-        self._from = edge[2]     # 该边的起点
-        self.toCtxId = int(edge[3])  # 区分to的上下文的ID
-        self._to = edge[4]       # 该边的终点
-        self.reason = edge[5]    # 产生该边的原因
-
-    def __str__(self) -> str:
-        return "[%s] => [%s], reason: %s"%(self._from, self._to, self.reason)
-    
-    def isStartEdge(self) -> bool:  
-        '''
-        是否为起始边
-        '''
-        return self.reason in ['Call source method', 'Spring entry method param']
-    
-    def getToDesc(self) -> str: 
-        '''
-        获取对于_to的描述字符串
-        '''
-        if self.reason=='Instance field store':
-            obj = self._to.split('|')[0]
-            sig = self._to.split('|')[1]
-            return '对象[%s]的[%s]字段'%(obj, sig)
-        elif self.reason=='Array index store':
-            arr = self._to.split('|')[0] 
-            return '数组对象[%s]的索引指针'%(arr)
-        else:
-            return self._to
-    
-def sortEdgeBySource(edges):
-    '''
-    根据污点对象的来源对边进行整理
-    '''
-    source2edgeSet = {}   # 污点对象=>该污点对象传播的边的集合
-    for edge_csv in edges:
-        # 获取污点对象id
-        source = edge_csv[0]
-        if source not in source2edgeSet.keys():
-            source2edgeSet[source] = []
-        
-        # 把该边转换为Edge对象加入到对应的集合中
-        source2edgeSet[source].append(Edge(edge_csv))
-    return source2edgeSet
-
-
-
-class FlowGraph:
-    '''
-    表示某个污点对象的流向图
-    '''
-    def __init__(self, edgeSet:list):  
-        self.adjList = {}       # 邻接表, adjList[b] = 所有以a为起点的边
-        self.startCtxId = None
-        for edge in edgeSet:    # 遍历所有边
-            edge:Edge
-            
-            # 把edge记录到邻接表中
-            _from = (edge.fromCtxId, edge._from)    # 该边的起始点 
-            if _from not in self.adjList.keys():
-                self.adjList[_from] = []
-            self.adjList[_from].append(edge) 
-            
-            # 如果找到了起始边, 则记录起始边source的上下文
-            if edge.isStartEdge():
-                # 所有起始边的from点的上下文应该一致
-                assert(self.startCtxId in [None, edge.fromCtxId])
-                self.startCtxId = edge.fromCtxId
-                
-                
-            
-    def DFS(self, vertex:tuple, end:tuple, path: list, isVisited: map)->bool:
-        '''
-        通过DFS算法遍历图, 找到从vertex到end的路径, 成功找到时返回True
-        '''
-        # 已经访问过了, 跳过
-        if isVisited.get(vertex, False)==True:
-            return False
-        
-        # 如果vertex就是终点, 则找到路径
-        if vertex == end:
-            return True
-        
-        # 标记一下, 已经访问过vertex
-        isVisited[vertex] = True
-        
-        # vertex存在邻接边
-        if vertex in self.adjList.keys():           
-            # 遍历所有vertex可达的边
-            for edge in self.adjList[vertex]:
-                edge:Edge
-                path.append(edge)   # 在路径数组中添加该边
-                _to = (edge.toCtxId, edge._to)  # 该边的可达点
-                if self.DFS(_to, end, path, isVisited):    # 从下一个点接着探索, 探索成功则说明edge找对了
-                    return True
-                else:   # 否则说明edge不对, 弹出
-                    path.pop()
-            
-        return False
-    
-    def BFS(self, start:tuple, end:tuple, path: list, isVisited: map)->bool:
-        '''
-        通过BFS算法, 在图self.adjList中搜索start=>end的最短路径, 搜索成功返回True
-        '''
-        # 任务队列
-        que = Queue()
-        que.put(start)  # 放入起点
-        
-        # 是否找到
-        found = False
-        
-        # lastVertex[x]表示到达x的前驱边, 也就是终点为x的边
-        pre = {}
-        
-        while not que.empty():
-            v = que.get()
-            # print(v)
-            
-            # 已经到达终点
-            if v==end:
-                found = True
-                break
-            
-            # 遍历v的邻接边
-            if v in self.adjList.keys():
-                for edge in self.adjList[v]:
-                    edge:Edge
-        
-                    # 通过edge的可达点
-                    _to = (edge.toCtxId, edge._to)
-                    
-                    # 已经访问过则跳过
-                    if isVisited.get(_to, False)==True:
-                        continue
-                    isVisited[v] = True
-                    
-                    # 记录前驱边
-                    pre[_to] = edge
-                    
-                    # 探索_to节点
-                    que.put(_to)
-
-        # 搜索失败
-        if not found:
-            return False
-        
-        # 搜索成功, 从终点开始反推出整个调用路径
-        cur = end   # 当前到底的点
-        while cur!=start:   # 只要cur有前驱边, 就一直循环
-            edge:Edge
-            edge = pre[cur] # 获取pre的前驱边
-            path.insert(0, edge)    # 从头部倒序插入
-            cur = (edge.fromCtxId, edge._from)  # 移动到edge的起始点  
-            
-        return True
-    
-    def resolvePath(self, start:tuple, end:tuple) -> list:
-        '''
-        返回一个数组, 包含从source产生污点对象传播到sinkParam的完整边集
-        ''' 
-        path = []
-        isVisited = {}
-        if self.BFS(start, end, path, isVisited):
-            return path
-        else:
-            return None
-        
-    def __str__(self) -> str:
-        str = ''
-        for vertex in self.adjList.keys():  # 遍历所有的起点
-            str+= '以[%s]为起点的边: \n'%(vertex)
-            for edge in self.adjList[vertex]:
-                str+= '\t'+ edge.__str__() +'\n' 
-        return str
-        
 class FlowPath:
     '''
     表示一条污点传播路径
@@ -212,9 +36,12 @@ class FlowPath:
         self.sinkParam = analysis_res[4]        # 调用sink方法时的实参, 该参数指向污点对象 
         self.source = analysis_res[5]       # 表示污点对象来源的字符串
         self.fullPath = []                  # 完整的传播路径
+        self.contextFree = False            # 传播路径的上下文是否无法恢复, 只保证节点名构成的路径存在
         
     def __str__(self) -> str:
         str = 'taint flow: [%s] ==> [%s]\n'%(self.sourceLabel, self.sinkLabel)
+        if self.contextFree:
+            str+= '\t(上下文无法恢复, 以下为上下文不敏感的路径)\n'
         str+= '\tSource[%s]\n'%(self.fullPath[0]._from)     # 起始节点
         for edge in self.fullPath:
             edge: Edge
@@ -244,33 +71,128 @@ class FlowPath:
             })
             idx+=1
         return res
+    
+    def toJson(self) -> dict:
+        '''
+        --json输出中的一条污点流, 上下文无法恢复的路径带有context_insensitive标记
+        '''
+        res = {
+            'source_label': self.sourceLabel,   # 污点源标签
+            'source': self.source,  # 污点源
+            'sink_label': self.sinkLabel,   # 污点方法标签
+            'sink_param_ctx_id': self.sinkParamCtxId,   # 污点参数的上下文
+            'sink_param': self.sinkParam,   # 污点参数
+            'sink_invo': self.invo, # 污点方法调用语句
+            'path': self.printInJson()  # 源传播污点的上下文
+        }
+        if self.contextFree:
+            res['context_insensitive'] = True
+        return res
 
 
-def showTaintFlow(only_source, json_output):
-    # 加载所有的调用边
-    edges = loadCsv(edge_csv_path)
-    
-    # 获取污点对象传播的边集
-    src_edgeSet = sortEdgeBySource(edges)
-    
-    # 为每一个污点对象的边集构造一个流向图
-    src_flowGraph = {}
-    for src in src_edgeSet.keys():
-        src_flowGraph[src] = FlowGraph(src_edgeSet[src])
+def resolveFlowPaths(paths:list, src_flowGraph:dict, jobs=1, restrict=False):
+    '''
+    为每条污点流搜索完整的传播路径, 结果写入path.fullPath
+        按污点对象分组, 每个污点对象只构造一次最短路径树, 回答它的所有sink参数
+        restrict: 只查询了部分sink, 先通过反向邻接表求出能到达这些sink参数的子图, 源点不在子图中时不再搜索
+    '''
+    src_paths = {}
+    for path in paths:
+        if path.source not in src_paths.keys():
+            src_paths[path.source] = []
+        src_paths[path.source].append(path)
+    queries = []    # [(流向图, 起点, [终点])]
+    groups = []     # 与queries一一对应的污点流
+    for src in src_paths.keys():
+        graph = src_flowGraph.get(src)    # 获取污点对象传播图
+        graph:FlowGraph
+        group = src_paths[src]
+        if graph==None:
+            for path in group:
+                path.fullPath = None
+            continue
+        ends = [(path.sinkParamCtxId, path.sinkParam) for path in group]
+        # 多进程时先排除不能到达这些sink参数的污点对象, 单进程时由resolvePaths排除
+        if restrict and jobs>1:
+            startV = graph.findVertex((graph.startCtxId, src))
+            if startV is None or not graph.sinkMask(ends)[startV]:
+                for path in group:
+                    path.fullPath = None
+                continue
+        queries.append((graph, (graph.startCtxId, src), ends))
+        groups.append(group)
     
-    # json结果
-    json_res = []
+    # 搜索从源点到污点参数的传播路径, 多进程时按污点对象分片, 投影图的搜索很快, 总是在本进程中进行
+    if jobs>1 and all([isinstance(graph, FlowGraph) for (graph, _, _) in queries]):
+        results = resolvePathsParallel(queries, jobs)
+    else:
+        results = [graph.resolvePaths(start, ends, restrict) for (graph, start, ends) in queries]
+    for (group, fullPaths) in zip(groups, results):
+        for (path, fullPath) in zip(group, fullPaths):
+            path.fullPath = fullPath
+            path.contextFree = isinstance(fullPath, ContextFreePath)
+
+
+def matchSink(path:FlowPath, sink, sink_label) -> bool:
+    '''
+    污点流是否流入指定的sink
+        sink: sink方法调用语句, 或者被调用的方法cls.method, None表示不过滤
+        sink_label: sink方法的标签, None表示不过滤
+    '''
+    if sink_label!=None and path.sinkLabel!=sink_label:
+        return False
+    if sink!=None and path.invo!=sink and invokedMethod(path.invo)!=sink:
+        return False
+    return True
+
+def showTaintFlow(only_source, json_output, jobs=1, sink=None, sink_label=None, projected=False):
+    # 优先使用导入后的结果库, 不存在时直接读取csv
+    store = openStore(os.path.dirname(analysis_res_path))
     
     # 加载污点流分析结果, 也就是起点和终点
-    for flow in loadCsv(analysis_res_path):
+    paths = []
+    if store==None:
+        flows = loadCsv(analysis_res_path)
+    elif sink!=None and invokedMethod(sink)==None:
+        # sink是被调用的方法名
+        flows = store.leaks(only_source, sink_label=sink_label, sink_method=sink)
+    else:
+        flows = store.leaks(only_source, sink, sink_label)
+    for flow in flows:
         path = FlowPath(flow)                   # 获取污点流的源点, 终点, 流入sink点的污点对象
         if only_source!=None and path.source!=only_source:  # 跳过不想看的污点流图
             continue
-        graph = src_flowGraph[path.source]    # 获取污点对象传播图
-        graph:FlowGraph
-        # 搜索从源点到污点参数的传播路径
-        path.fullPath = graph.resolvePath((graph.startCtxId, path.source), (path.sinkParamCtxId, path.sinkParam))  
-        
+        if not matchSink(path, sink, sink_label):   # 跳过不流入指定sink的污点流
+            continue
+        paths.append(path)
+    
+    # 可达性索引中起点不能到达sink参数的污点流不再搜索, 所有污点流都不可达的污点对象不构造流向图
+    # 上下文投影的搜索可能返回上下文不敏感的路径, 不能排除
+    searched = paths
+    index = openReachIndex(os.path.dirname(analysis_res_path)) if not projected else None
+    if index!=None:
+        searched = []
+        for path in paths:
+            if index.canReachSink(path.source, (path.sinkParamCtxId, path.sinkParam)):
+                searched.append(path)
+            else:
+                path.fullPath = None
+    
+    # 流式加载传播边, 只为结果中出现的污点对象构造流向图
+    sources = set([path.source for path in searched])
+    if store==None:
+        src_flowGraph = loadFlowGraphs(edge_csv_path, sources, projected)
+    else:
+        src_flowGraph = store.loadFlowGraphs(sources, projected)
+    
+    # 搜索从源点到污点参数的传播路径, 指定了sink时只搜索能到达这些sink参数的子图
+    resolveFlowPaths(searched, src_flowGraph, jobs, sink!=None or sink_label!=None)
+    
+    # json结果
+    json_res = []
+    
+    # 按照结果文件中的顺序输出
+    for path in paths:
         # 输出到STDOUT
         if path.fullPath==None:
             print("污点流[%s]=>[%d, %s]搜索失败"%(path.source, path.sinkParamCtxId, path.sinkParam))
@@ -279,15 +201,7 @@ def showTaintFlow(only_source, json_output):
             
         # 输出到json文件
         if json_output!=None:
-            json_res.append({
-                'source_label': path.sourceLabel,   # 污点源标签
-                'source': path.source,  # 污点源
-                'sink_label': path.sinkLabel,   # 污点方法标签
-                'sink_param_ctx_id': path.sinkParamCtxId,   # 污点参数的上下文
-                'sink_param': path.sinkParam,   # 污点参数
-                'sink_invo': path.invo, # 污点方法调用语句
-                'path': path.printInJson()  # 源传播污点的上下文
-            })
+            json_res.append(path.toJson())
     
     # 写入json到文件中
     if json_output!=None:
@@ -302,13 +216,20 @@ def main():
     )
     # 只输出某个源点的污点流
     parser.add_argument('-S', '--source', type=str, help='only taint flow from specific source')
+    # 只输出流入某个sink的污点流
+    parser.add_argument('--sink', type=str, help='only taint flow into a sink invocation, or into calls of a method such as java.lang.Runtime.exec')
+    parser.add_argument('--sink-label', type=str, help='only taint flow into sink methods with this label')
+    # 在上下文投影后的图上搜索
+    parser.add_argument('-C', '--context-projected', action='store_true', help='search a context-projected graph and recover contexts along the found path')
     # 是否json格式输出
     parser.add_argument('-J', '--json', type=str, help='output analysis result in JSON format')
+    # 并行搜索路径的进程数
+    parser.add_argument('-j', '--jobs', type=int, help='num of worker processes for path resolution', default=1)
     # 解析参数
     args = parser.parse_args()
     
     # 输出污点流图
-    showTaintFlow(args.source, args.json)
+    showTaintFlow(args.source, args.json, args.jobs, args.sink, args.sink_label, args.context_projected)
     
 if __name__=='__main__':
     main()
@@ -0,0 +1,193 @@
+# coding:utf8
+import os
+import re
+import sys
+import argparse
+
+from factSlicer import sigPattern, splitSig, iterFacts
+
+# 污点定义关系 => 列数
+rule_columns = {
+    'LeakingSinkMethodArg': 3,          # 污点标签, 参数序号, 方法签名
+    'LeakingSinkMethodNameArg': 4,      # 污点标签, 类名, 方法名正则, 参数序号
+    'LeakingSinkMethodNameVarArg': 4,   # 污点标签, 类名, 方法名正则, 参数序号
+}
+
+# 方法签名与参数序号的格式
+methodSigPattern = re.compile(r'^\<(.*): (.*) (.*)\((.*)\)\>')
+argIdxPattern = re.compile(r'^[0-9]\d*$')
+# 类名的格式
+classPattern = re.compile(r'^[\w$.\[\]]+$')
+
+
+class SinkRules:
+    '''
+    一次读入并验证所有污点定义文件, 按方法名正则定义的规则以类名为键建立索引
+    '''
+    def __init__(self):
+        self.rows = {}      # 关系名 => [行]
+        self.index = {}     # 关系名 => {类名: [(标签, 预编译的方法名正则, 参数序号)]}
+        self.errors = []    # (规则文件, 行号, 行)
+
+    def load(self, relation:str, path:str, columns:int) -> bool:
+        '''
+        读入并验证一个规则文件, 返回格式是否正确
+        '''
+        rows = []
+        index = {}
+        ok = True
+        line_idx = 0   # 第几行
+        for line in open(path, 'r').read().split('\n'):
+            line_idx+=1
+            if len(line)==0:
+                continue
+            row = line.split('\t')
+            if not self.validRow(row, columns):
+                self.errors.append((path, line_idx, line))
+                ok = False
+                continue
+            rows.append(row)
+            if columns==4:
+                label, cls, nameRegex, argIdx = row
+                index.setdefault(cls, []).append((label, re.compile(nameRegex), int(argIdx)))
+        self.rows[relation] = rows
+        self.index[relation] = index
+        return ok
+
+    def validRow(self, row:list, columns:int) -> bool:
+        # 一行的列数必须正确, 参数序号必须是非负整数
+        if len(row)!=columns or argIdxPattern.match(row[1] if columns==3 else row[3])==None:
+            return False
+        if columns==3:
+            # 检查方法签名, 以及参数序号是否有效
+            matchObj = methodSigPattern.match(row[2])
+            return matchObj!=None and int(row[1])<=matchObj.group(4).count(',')
+        # 检查类名与方法名正则
+        if classPattern.match(row[1])==None:
+            return False
+        try:
+            re.compile(row[2])
+        except re.error:
+            return False
+        return True
+
+    def resolve(self, sigs) -> dict:
+        '''
+        把按方法名正则定义的规则与方法签名逐一匹配, 方法名必须完整匹配正则, 参数序号必须小于参数个数
+            返回 关系名 => [(标签, 参数序号, 方法签名)], 按规则文件中的顺序
+        '''
+        res = {}
+        for (relation, index) in self.index.items():
+            if len(index)==0:
+                continue
+            matched = {}    # 规则序号 => [(标签, 参数序号, 方法签名)]
+            for sig in sigs:
+                cls, sub = splitSig(sig)
+                rules = index.get(cls)
+                if rules==None:
+                    continue
+                name = sub[sub.index(' ')+1:sub.index('(')]
+                params = sub[sub.index('(')+1:-1]
+                arity = 0 if len(params)==0 else params.count(',')+1
+                for (i, (label, pattern, argIdx)) in enumerate(rules):
+                    if argIdx<arity and pattern.fullmatch(name)!=None:
+                        matched.setdefault((cls, i), []).append((label, argIdx, sig))
+            res[relation] = [fact for key in sorted(matched.keys()) for fact in sorted(matched[key])]
+        return res
+
+    def printErrors(self):
+        for (path, line_idx, line) in self.errors:
+            print("%s line %d: [%s] format wrong "%(path, line_idx, line))
+
+
+def loadSinkRules(rule_files:dict) -> SinkRules:
+    '''
+    读入并验证所有规则文件, 规则文件不存在时视为空
+        rule_files: 关系名 => 规则文件
+    '''
+    rules = SinkRules()
+    for (relation, columns) in rule_columns.items():
+        path = rule_files.get(relation)
+        if path!=None and os.path.exists(path):
+            rules.load(relation, path, columns)
+        else:
+            rules.rows[relation] = []
+            rules.index[relation] = {}
+    return rules
+
+def factDbSignatures(fact_db:str) -> set:
+    '''
+    fact_db中声明的方法与调用点引用的方法签名
+    '''
+    sigs = set()
+    for fn in sorted(os.listdir(fact_db)):
+        if fn!='Method.facts' and not fn.endswith('MethodInvocation.facts'):
+            continue
+        for row in iterFacts(os.path.join(fact_db, fn)):
+            for value in row:
+                if ')>' in value:
+                    sigs.update([m.group(0) for m in sigPattern.finditer(value)])
+    return sigs
+
+def writeFacts(path:str, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def compileSinkRules(rules:SinkRules, fact_db:str) -> dict:
+    '''
+    把按方法名正则定义的规则预先解析为fact_db中具体的方法
+        LeakingSinkMethodNameArg的匹配结果合并到LeakingSinkMethodArg中, 求解器不再需要匹配正则
+        LeakingSinkMethodNameVarArg的语义不同, 只保留能匹配到方法的规则
+        返回 关系名 => 写入的行数
+    '''
+    resolved = rules.resolve(factDbSignatures(fact_db))
+
+    # 具体的规则, 按签名定义的规则在前, 去掉重复的行
+    facts = []
+    seen = set()
+    for row in [tuple(row) for row in rules.rows['LeakingSinkMethodArg']]+[(label, str(argIdx), sig) for (label, argIdx, sig) in resolved.get('LeakingSinkMethodNameArg', [])]:
+        if row not in seen:
+            seen.add(row)
+            facts.append(row)
+
+    # 可变参数规则中能匹配到方法的规则
+    used = set([(sig[1:sig.index(': ')], label, argIdx) for (label, argIdx, sig) in resolved.get('LeakingSinkMethodNameVarArg', [])])
+    varArg = [row for row in rules.rows['LeakingSinkMethodNameVarArg'] if (row[1], row[0], int(row[3])) in used]
+
+    writeFacts(os.path.join(fact_db, 'LeakingSinkMethodArg.facts'), facts)
+    writeFacts(os.path.join(fact_db, 'LeakingSinkMethodNameArg.facts'), [])
+    writeFacts(os.path.join(fact_db, 'LeakingSinkMethodNameVarArg.facts'), varArg)
+    res = {
+        'LeakingSinkMethodArg': len(facts),
+        'LeakingSinkMethodNameArg': 0,
+        'LeakingSinkMethodNameVarArg': len(varArg),
+    }
+    print("sink rules: %d name rules resolved to %d methods, %d/%d var-arg rules match"%(
+        len(rules.rows['LeakingSinkMethodNameArg']), len(facts)-len(rules.rows['LeakingSinkMethodArg']),
+        len(varArg), len(rules.rows['LeakingSinkMethodNameVarArg'])))
+    return res
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='validate sink rules and resolve the regex rules against a fact directory', # 描述
+    )
+    # 要解析规则的fact目录, 不指定时只验证规则文件
+    parser.add_argument('fact_db', type=str, nargs='?', help='fact directory, only validate the rule files if omitted')
+    # 解析参数
+    args = parser.parse_args()
+
+    from main import sink_rule_files
+    rules = loadSinkRules(sink_rule_files())
+    if len(rules.errors)>0:
+        rules.printErrors()
+        sys.exit(1)
+    print("%s"%(', '.join(['%s: %d rules'%(relation, len(rows)) for (relation, rows) in rules.rows.items()])))
+    if args.fact_db!=None:
+        compileSinkRules(rules, args.fact_db)
+
+if __name__=='__main__':
+    main()
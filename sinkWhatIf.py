@@ -0,0 +1,204 @@
+# coding:utf8
+import os
+import json
+import argparse
+
+from factSlicer import methodPrefix, iterFacts
+from sinkRules import SinkRules, loadSinkRules
+from resultStore import leaking_csv, edge_csv, iterTsv, invokedMethod
+from taintGraph import iterEdgeRows, START_EDGE_REASONS
+
+
+class WhatIfIndex:
+    '''
+    已有分析结果中被污染的实参与调用点的索引, 用来在不重新求解的情况下评估新的污点规则
+        调用点与实参来自fact_db中的*MethodInvocation.facts与ActualParam.facts
+        被污染的变量来自TaintObjectPropagateEdge中的节点, 只保留作为实参出现的变量
+        污点对象的种类是它的起始边的原因与产生它的source方法, 同一种类的污点对象使用相同的源标签
+    '''
+    def __init__(self, fact_db:str, res_dir:str):
+        self.invocations = {}   # 调用点的方法签名 => [调用语句]
+        self.params = {}        # 调用语句 => [(参数序号, 实参变量)]
+        self.tainted = {}       # 实参变量 => set((污点对象编号, ctxId))
+        self.sources = []       # 污点对象编号 => 污点对象
+        self.sourceLabels = {}  # 污点对象 => 源标签, 来自已有的污点流
+        self.sourceKinds = {}   # 污点对象 => (起始边的原因, source方法), 来自TaintObjectPropagateEdge
+
+        for fn in sorted(os.listdir(fact_db)):
+            if not fn.endswith('MethodInvocation.facts'):
+                continue
+            for row in iterFacts(os.path.join(fact_db, fn)):
+                # 动态调用等没有方法签名的调用点不会匹配按签名定义的规则
+                if len(row)>2 and methodPrefix(row[2])==row[2]:
+                    self.invocations.setdefault(row[2], []).append(row[0])
+        p = os.path.join(fact_db, 'ActualParam.facts')
+        if os.path.exists(p):
+            for (idx, invo, var) in iterFacts(p):
+                self.params.setdefault(invo, []).append((int(idx), var))
+        paramVars = set([var for params in self.params.values() for (_, var) in params])
+
+        p = os.path.join(res_dir, leaking_csv)
+        self.leaks = set()      # 求解器得到的污点流, 忽略ctxId
+        if os.path.exists(p):
+            for row in iterTsv(p, 6):
+                self.sourceLabels.setdefault(row[5], row[0])
+                self.leaks.add((row[0], row[1], row[2], row[4], row[5]))
+
+        sourceIds = {}
+        p = os.path.join(res_dir, edge_csv)
+        if os.path.exists(p):
+            for (source, fromCtxId, _from, toCtxId, _to, reason) in iterEdgeRows(p, None):
+                sid = sourceIds.get(source)
+                if sid is None:
+                    sid = sourceIds[source] = len(self.sources)
+                    self.sources.append(source)
+                if reason in START_EDGE_REASONS and _from==source:
+                    self.sourceKinds.setdefault(source, (reason, invokedMethod(source)))
+                for (ctxId, var) in [(fromCtxId, _from), (toCtxId, _to)]:
+                    if var in paramVars:
+                        self.tainted.setdefault(var, set()).add((sid, ctxId))
+
+        # 每种污点对象在已有的污点流中最常见的源标签
+        counts = {}
+        for (source, label) in self.sourceLabels.items():
+            kind = self.sourceKinds.get(source)
+            if kind!=None:
+                counts.setdefault(kind, {}).setdefault(label, 0)
+                counts[kind][label]+= 1
+        self.kindLabels = dict([(kind, max(sorted(labels.items()), key=lambda item: item[1])[0]) for (kind, labels) in counts.items()])
+
+    def sourceLabel(self, source:str) -> str:
+        '''
+        污点对象的源标签: 已有的污点流中的标签, 没有时使用同一种类的污点对象的标签, 都没有时为'-'
+        '''
+        label = self.sourceLabels.get(source)
+        if label==None:
+            label = self.kindLabels.get(self.sourceKinds.get(source), '-')
+        return label
+
+    def sinkSites(self, rules:SinkRules) -> dict:
+        '''
+        规则匹配到的调用点签名 => set((污点标签, 参数序号, 是否为可变参数))
+            按签名定义的规则直接查找; 按方法名正则定义的规则与调用点的签名逐一匹配, 与sinkRules.resolve一致
+        '''
+        sites = {}
+        for (label, argIdx, sig) in rules.rows.get('LeakingSinkMethodArg', []):
+            if sig in self.invocations:
+                sites.setdefault(sig, set()).add((label, int(argIdx), False))
+        resolved = rules.resolve(self.invocations.keys())
+        for (relation, varArg) in [('LeakingSinkMethodNameArg', False), ('LeakingSinkMethodNameVarArg', True)]:
+            for (label, argIdx, sig) in resolved.get(relation, []):
+                sites.setdefault(sig, set()).add((label, argIdx, varArg))
+        return sites
+
+    def flows(self, rules:SinkRules) -> set:
+        '''
+        在已有的污点传播结果上, 按rules得到的污点流 (fromLable, toLabel, sinkInvo, sinkParam, source), 与main.py的输出一样忽略ctxId
+            可变参数规则的参数序号及其之后的实参都是sink参数
+            实参在任意上下文中被污染即算作流入sink, 不检查调用点的上下文, 因此结果是求解器结果的上界
+        '''
+        res = set()
+        for (sig, sinks) in self.sinkSites(rules).items():
+            for invo in self.invocations[sig]:
+                for (idx, var) in self.params.get(invo, []):
+                    tainted = self.tainted.get(var)
+                    if tainted is None:
+                        continue
+                    for (label, argIdx, varArg) in sinks:
+                        if idx==argIdx or (varArg and idx>argIdx):
+                            for source in set([self.sources[sid] for (sid, _) in tainted]):
+                                res.add((self.sourceLabel(source), label, invo, var, source))
+        return res
+
+
+def printFlows(title:str, flows:list):
+    print("===== %s: %d ====="%(title, len(flows)))
+    for (fromLable, toLabel, sinkInvo, sinkParam, source) in flows:
+        print("[%s=>%s]: "%(fromLable, toLabel))
+        print("\tSource: %s"%(source))
+        print("\tInvocation to sink method: %s"%(sinkInvo))
+        print("\tSink argument: %s"%(sinkParam))
+        print("")
+
+def flowJson(flow:tuple) -> dict:
+    fromLable, toLabel, sinkInvo, sinkParam, source = flow
+    return {
+        'source_label': fromLable,
+        'sink_label': toLabel,
+        'sink_invo': sinkInvo,
+        'sink_param': sinkParam,
+        'source': source
+    }
+
+def whatIf(fact_db:str, res_dir:str, new_rule_files:dict, json_output=None) -> dict:
+    '''
+    比较fact_db中求解时使用的规则与新的规则文件, 输出新增与消失的污点流
+        旧规则也在同一个索引上评估, 两者的差别只来自规则的变化; 同时报告旧规则复现了多少求解器的结果
+    '''
+    rules = loadSinkRules(new_rule_files)
+    if len(rules.errors)>0:
+        rules.printErrors()
+        exit(1)
+    old_rules = loadSinkRules(dict([(relation, os.path.join(fact_db, relation+'.facts')) for relation in new_rule_files.keys()]))
+
+    index = WhatIfIndex(fact_db, res_dir)
+    if len(index.params)==0:
+        print("no ActualParam.facts in %s, cannot evaluate rules"%(fact_db))
+        exit(1)
+    old = index.flows(old_rules)
+    new = index.flows(rules)
+    added = sorted(new-old)
+    removed = sorted(old-new)
+    printFlows('added flows', added)
+    printFlows('removed flows', removed)
+    print("old rules: %d flows, reproduce %d/%d solver flows"%(len(old), len(old&index.leaks), len(index.leaks)))
+    print("new rules: %d flows, %d added, %d removed"%(len(new), len(added), len(removed)))
+    print("note: contexts are ignored, an argument tainted in any context counts, so the flow counts are upper bounds of what the solver reports")
+
+    res = {
+        'context_insensitive': True,    # 流的数量是上界
+        'old_flows': len(old),
+        'new_flows': len(new),
+        'solver_flows': len(index.leaks),
+        'reproduced': len(old&index.leaks),
+        'added': [flowJson(flow) for flow in added],
+        'removed': [flowJson(flow) for flow in removed],
+    }
+    if json_output!=None:
+        with open(json_output, 'w') as f:
+            json.dump(res, f, indent=1)
+    return res
+
+
+def main():
+    from main import sink_rule_files, workspace_paths
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='evaluate new or edited sink rules against the last analysis without re-running the solver', # 描述
+    )
+    # 工作目录
+    parser.add_argument('-W', '--workspace', type=str, help='workspace directory of the analysis, default ./last-analysis')
+    # 新的规则文件, 默认是sink_rules中的规则文件
+    rule_files = sink_rule_files()
+    parser.add_argument('--arg', type=str, help='LeakingSinkMethodArg rule file, default %s'%(rule_files['LeakingSinkMethodArg']), default=rule_files['LeakingSinkMethodArg'])
+    parser.add_argument('--name-arg', type=str, help='LeakingSinkMethodNameArg rule file, default %s'%(rule_files['LeakingSinkMethodNameArg']), default=rule_files['LeakingSinkMethodNameArg'])
+    parser.add_argument('--name-var-arg', type=str, help='LeakingSinkMethodNameVarArg rule file, default %s'%(rule_files['LeakingSinkMethodNameVarArg']), default=rule_files['LeakingSinkMethodNameVarArg'])
+    # 是否json格式输出
+    parser.add_argument('-J', '--json', type=str, help='write the added and removed flows in JSON format')
+    # 解析参数
+    args = parser.parse_args()
+
+    fact_db, res_db, _ = workspace_paths(args.workspace)
+    for p in [fact_db, res_db]:
+        if not os.path.exists(p):
+            print("%s not exists, run main.py first"%(p))
+            exit(1)
+    whatIf(fact_db, res_db, {
+        'LeakingSinkMethodArg': args.arg,
+        'LeakingSinkMethodNameArg': args.name_arg,
+        'LeakingSinkMethodNameVarArg': args.name_var_arg,
+    }, args.json)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,228 @@
+# coding:utf8
+import os
+import sys
+import json
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+
+from showTaintFlow import FlowPath, resolveFlowPaths
+from resultStore import res_db, storePath, importResults, openStore
+
+
+class FlowGraphCache:
+    '''
+    污点对象 => FlowGraph 的LRU缓存, 按缓存的边数限制内存
+    '''
+    def __init__(self, budget:int):
+        self.budget = budget            # 最多缓存的边数
+        self.graphs = OrderedDict()     # 污点对象 => FlowGraph, 最近使用的在末尾
+        self.edges = 0                  # 当前缓存的边数
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, store, sources) -> dict:
+        '''
+        返回sources中每个污点对象的流向图, 缺失的从结果库中加载
+        '''
+        res = {}
+        missing = set()
+        for src in sources:
+            graph = self.graphs.get(src)
+            if graph is None:
+                missing.add(src)
+                continue
+            self.graphs.move_to_end(src)
+            res[src] = graph
+        self.hits+= len(res)
+        self.misses+= len(missing)
+
+        if len(missing)>0:
+            for (src, graph) in store.loadFlowGraphs(missing).items():
+                self.graphs[src] = graph
+                self.edges+= graph.edgeCount()
+                res[src] = graph
+
+        # 淘汰最久未使用的图, 本次查询用到的图保留
+        while self.edges>self.budget and len(self.graphs)>0:
+            src = next(iter(self.graphs))
+            if src in res.keys():
+                break
+            self.edges-= self.graphs.pop(src).edgeCount()
+        return res
+
+    def clear(self):
+        self.graphs.clear()
+        self.edges = 0
+
+
+class TaintFlowService:
+    '''
+    常驻内存的污点流查询服务, 结果文件变化时自动重新加载
+    '''
+    def __init__(self, res_db:str, budget:int):
+        self.res_db = res_db
+        self.cache = FlowGraphCache(budget)
+        self.lock = threading.Lock()
+        self.store = None
+        self.storeStat = None   # 加载时结果库文件的(大小, 修改时间)
+        self.reload()
+
+    def reload(self):
+        '''
+        打开结果库, 不存在或过期时先导入
+        '''
+        store = openStore(self.res_db)
+        if store==None:
+            print("import %s"%(importResults(self.res_db)), file=sys.stderr)
+            store = openStore(self.res_db)
+        st = os.stat(storePath(self.res_db))
+        self.store = store
+        self.storeStat = (st.st_size, st.st_mtime_ns)
+        self.cache.clear()
+
+    def checkReload(self):
+        '''
+        结果文件或结果库被修改时重新加载
+        '''
+        with self.lock:
+            try:
+                st = os.stat(storePath(self.res_db))
+                changed = (st.st_size, st.st_mtime_ns)!=self.storeStat or not self.store.isFresh(self.res_db)
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                print("result files changed, reload", file=sys.stderr)
+                self.reload()
+
+    def flows(self, only_source=None, sink_invo=None, sink_label=None) -> list:
+        '''
+        查询污点流及其传播路径, 格式与showTaintFlow --json一致
+        '''
+        with self.lock:
+            paths = [FlowPath(row) for row in self.store.leaks(only_source, sink_invo, sink_label)]
+            src_flowGraph = self.cache.get(self.store, set([path.source for path in paths]))
+            resolveFlowPaths(paths, src_flowGraph, 1, sink_invo!=None or sink_label!=None)
+            return [path.toJson() for path in paths]
+
+    def sources(self) -> list:
+        '''
+        所有污点源及其污点流的数量
+        '''
+        with self.lock:
+            counts = OrderedDict()
+            for row in self.store.leaks():
+                counts[row[5]] = counts.get(row[5], 0)+1
+            return [{'source': src, 'flows': count} for (src, count) in counts.items()]
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                'result_dir': self.res_db,
+                'cached_graphs': len(self.cache.graphs),
+                'cached_edges': self.cache.edges,
+                'cache_budget': self.cache.budget,
+                'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses,
+            }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    '''
+    GET /flows?source=..&sink_invo=..&sink_label=..   查询污点流
+    GET /sources                                      列出污点源
+    GET /status                                       缓存状态
+    '''
+    service = None  # TaintFlowService
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        def arg(name):
+            return query[name][0] if name in query.keys() else None
+
+        if url.path=='/flows':
+            res = self.service.flows(arg('source'), arg('sink_invo'), arg('sink_label'))
+        elif url.path=='/sources':
+            res = self.service.sources()
+        elif url.path=='/status':
+            res = self.service.status()
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(res).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def watch(service:TaintFlowService, interval:float):
+    '''
+    定期检查结果文件是否变化
+    '''
+    event = threading.Event()
+    while not event.wait(interval):
+        service.checkReload()
+
+
+def main():
+    # 解析argv参数
+    parser = argparse.ArgumentParser(
+        prog='JDoop Helper Script', # 程序名
+        description='resident server for taint flow queries', # 描述
+    )
+    # 结果目录
+    parser.add_argument('-R', '--result', type=str, help='solver output directory', default=res_db)
+    # 监听地址
+    parser.add_argument('--host', type=str, help='HTTP listen address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='HTTP listen port', default=8765)
+    # 使用unix socket代替TCP
+    parser.add_argument('--unix', type=str, help='listen on a unix socket path instead of TCP')
+    # LRU缓存预算
+    parser.add_argument('--cache-edges', type=int, help='max num of edges of cached flow graphs', default=20000000)
+    # 检查结果文件变化的间隔
+    parser.add_argument('--poll', type=float, help='seconds between checks for changed result files', default=5.0)
+    # 解析参数
+    args = parser.parse_args()
+
+    QueryHandler.service = TaintFlowService(args.result, args.cache_edges)
+    threading.Thread(target=watch, args=(QueryHandler.service, args.poll), daemon=True).start()
+
+    if args.unix!=None:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = ThreadingUnixHTTPServer(args.unix, QueryHandler)
+        print("serving on unix socket %s"%(args.unix))
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+        print("serving on http://%s:%d"%(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix!=None and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,828 @@
+# coding:utf8
+import mmap
+import tempfile
+import multiprocessing
+from array import array
+
+# 起始边的原因, 起始边的from点就是污点源
+START_EDGE_REASONS = ('Call source method', 'Spring entry method param')
+
+# 投影图中恢复上下文时, 上下文敏感搜索最多访问的(节点, 上下文)状态数
+REFINE_MAX_STATES = 200000
+
+
+class StringPool:
+    '''
+    字符串驻留池, 把重复出现的字符串(节点名, 边的原因)映射为连续的整数ID
+    '''
+    def __init__(self) -> None:
+        self.str2id = {}    # 字符串 => ID
+        self.strs = []      # ID => 字符串
+
+    def intern(self, s:str) -> int:
+        '''
+        返回s对应的ID, 不存在时分配一个新的ID
+        '''
+        idx = self.str2id.get(s)
+        if idx is None:
+            idx = len(self.strs)
+            self.str2id[s] = idx
+            self.strs.append(s)
+        return idx
+
+    def lookup(self, s:str):
+        '''
+        返回s对应的ID, 不存在时返回None
+        '''
+        return self.str2id.get(s)
+
+    def get(self, idx:int) -> str:
+        return self.strs[idx]
+
+    def __len__(self) -> int:
+        return len(self.strs)
+
+
+class Edge:
+    '''
+    表示一个污点传播边
+    '''
+    def __init__(self, edge) -> None:
+        self.fromCtxId = int(edge[1])    # 区分from的上下文的ID
+        self._from = edge[2]     # 该边的起点
+        self.toCtxId = int(edge[3])  # 区分to的上下文的ID
+        self._to = edge[4]       # 该边的终点
+        self.reason = edge[5]    # 产生该边的原因
+
+    def __str__(self) -> str:
+        return "[%s] => [%s], reason: %s"%(self._from, self._to, self.reason)
+
+    def isStartEdge(self) -> bool:
+        '''
+        是否为起始边
+        '''
+        return self.reason in START_EDGE_REASONS
+
+    def getToDesc(self) -> str:
+        '''
+        获取对于_to的描述字符串
+        '''
+        if self.reason=='Instance field store':
+            obj = self._to.split('|')[0]
+            sig = self._to.split('|')[1]
+            return '对象[%s]的[%s]字段'%(obj, sig)
+        elif self.reason=='Array index store':
+            arr = self._to.split('|')[0]
+            return '数组对象[%s]的索引指针'%(arr)
+        else:
+            return self._to
+
+
+def shortestPathTree(offsets, adjTo, start:int, end:int=-1, mask:bytearray=None):
+    '''
+    在CSR邻接表(offsets, adjTo)中从start开始BFS, 构造最短路径的前驱树, 到达end时提前停止(end为-1时遍历所有可达点)
+        mask: 只访问标记的节点, 通常是能到达终点的节点, 其余节点不在任何路径上, 前驱树与不限制时一致
+        返回(preVertex, preEdge), preVertex[x], preEdge[x]表示到达x的前驱边的起点与位置, -1表示未到达
+    '''
+    n = len(offsets)-1
+
+    # 任务队列, 节点在被发现时就标记为已访问, 保证每个节点只入队一次
+    que = array('i', [start])
+    head = 0
+    isVisited = bytearray(n)
+    isVisited[start] = 1
+
+    # 前驱树
+    preVertex = array('i', [-1])*n
+    preEdge = array('i', [-1])*n
+
+    while head<len(que):
+        v = que[head]
+        head+= 1
+
+        # 已经到达终点
+        if v==end:
+            break
+
+        # 遍历v的邻接边
+        for pos in range(offsets[v], offsets[v+1]):
+            _to = adjTo[pos]    # 通过edge的可达点
+
+            # 已经访问过或者不能到达终点则跳过
+            if isVisited[_to] or (mask is not None and not mask[_to]):
+                continue
+            isVisited[_to] = 1
+
+            # 记录前驱边
+            preVertex[_to] = v
+            preEdge[_to] = pos
+
+            # 探索_to节点
+            que.append(_to)
+
+    return preVertex, preEdge
+
+def tracePath(tree:tuple, start:int, end:int, path:list)->bool:
+    '''
+    在前驱树tree中从end反推到start, 路径按正序写入path, end不可达时返回False
+    '''
+    preVertex, preEdge = tree
+    if end!=start and preVertex[end]==-1:
+        return False
+
+    # 从终点开始反推出整个调用路径
+    cur = end   # 当前到底的点
+    while cur!=start:   # 只要cur有前驱边, 就一直循环
+        path.append((preVertex[cur], preEdge[cur]))
+        cur = preVertex[cur]  # 移动到edge的起始点
+    path.reverse()
+    return True
+
+def resolveTreePaths(offsets, adjTo, start:int, ends:list, mask:bytearray=None) -> list:
+    '''
+    从start只做一次BFS构造最短路径树, 然后回答ends中每个终点的路径
+        mask: 只访问标记的节点, 见shortestPathTree
+        每条路径是[(起点, 边在CSR中的位置), ...], 不可达的终点对应None
+        无论查询几个终点, 路径都取自同一棵按发现顺序构造的前驱树, 同一条污点流总是得到同一条路径
+    '''
+    # 只有一个终点时, 提前停止的BFS更快
+    tree = shortestPathTree(offsets, adjTo, start, ends[0] if len(ends)==1 else -1, mask)
+    res = []
+    for end in ends:
+        path = []
+        if end>=0 and tracePath(tree, start, end, path):
+            res.append(path)
+        else:
+            res.append(None)
+    return res
+
+
+def reverseCSR(offsets, adjTo):
+    '''
+    由正向CSR邻接表构造反向邻接表: rOffsets[v]..rOffsets[v+1]是以v为终点的边
+        返回(rOffsets, rFrom, rPos), rFrom为边的起点, rPos为边在正向CSR中的位置
+    '''
+    n = len(offsets)-1
+    m = len(adjTo)
+    rOffsets = array('i', bytes(4*(n+1)))
+    for v in adjTo:
+        rOffsets[v+1]+= 1
+    for v in range(n):
+        rOffsets[v+1]+= rOffsets[v]
+
+    # 按正向CSR的顺序放入, 同一终点的边保持原有的先后顺序
+    cursor = array('i', rOffsets[0:n])
+    rFrom = array('i', bytes(4*m))
+    rPos = array('i', bytes(4*m))
+    for v in range(n):
+        for pos in range(offsets[v], offsets[v+1]):
+            _to = adjTo[pos]
+            i = cursor[_to]
+            rFrom[i] = v
+            rPos[i] = pos
+            cursor[_to] = i+1
+    return rOffsets, rFrom, rPos
+
+def backwardReachable(reverse:tuple, ends:list) -> bytearray:
+    '''
+    在反向邻接表中从ends开始遍历, 返回能到达任一终点的节点集合(按局部ID的标记数组)
+    '''
+    rOffsets, rFrom, _ = reverse
+    mask = bytearray(len(rOffsets)-1)
+    que = array('i')
+    for end in ends:
+        if end>=0 and not mask[end]:
+            mask[end] = 1
+            que.append(end)
+    head = 0
+    while head<len(que):
+        v = que[head]
+        head+= 1
+        for i in range(rOffsets[v], rOffsets[v+1]):
+            _from = rFrom[i]
+            if not mask[_from]:
+                mask[_from] = 1
+                que.append(_from)
+    return mask
+
+class FlowGraph:
+    '''
+    表示某个污点对象的流向图
+        节点(ctxId, name)被编号为0..n-1的局部ID, 节点名与边的原因都驻留在共享的StringPool中
+        邻接表使用CSR格式保存: offsets[v]..offsets[v+1]是以v为起点的边在adjTo/adjReason中的位置
+    '''
+    def __init__(self, source:str, names:StringPool, reasons:StringPool):
+        self.source = source    # 污点对象
+        self.names = names      # 节点名驻留池
+        self.reasons = reasons  # 边的原因驻留池
+        self.startCtxId = None
+
+        self.vertexIdx = {}         # (ctxId<<32 | nameId) => 局部节点ID
+        self.vCtx = array('q')      # 局部节点ID => ctxId
+        self.vName = array('i')     # 局部节点ID => nameId
+
+        # 构建阶段暂存的边, build()之后转换为CSR并释放
+        self.eFrom = array('i')
+        self.eTo = array('i')
+        self.eReason = array('i')
+
+        # CSR邻接表
+        self.offsets = None
+        self.adjTo = None
+        self.adjReason = None
+
+        # 反向邻接表(rOffsets, rFrom, rPos), 第一次按终点查询时构造
+        self.reverse = None
+
+    def vertex(self, ctxId:int, nameId:int) -> int:
+        '''
+        返回节点(ctxId, nameId)的局部ID, 不存在时分配一个新的ID
+        '''
+        key = (ctxId<<32) | nameId
+        v = self.vertexIdx.get(key)
+        if v is None:
+            v = len(self.vCtx)
+            self.vertexIdx[key] = v
+            self.vCtx.append(ctxId)
+            self.vName.append(nameId)
+        return v
+
+    def findVertex(self, vertex:tuple):
+        '''
+        查找(ctxId, name)对应的局部ID, 不存在时返回None
+        '''
+        nameId = self.names.lookup(vertex[1])
+        if nameId is None:
+            return None
+        return self.vertexIdx.get((vertex[0]<<32) | nameId)
+
+    def addEdge(self, fromCtxId:int, _from:str, toCtxId:int, _to:str, reason:str):
+        '''
+        在构建阶段添加一条边
+        '''
+        reasonId = self.reasons.intern(reason)
+        self.eFrom.append(self.vertex(fromCtxId, self.names.intern(_from)))
+        self.eTo.append(self.vertex(toCtxId, self.names.intern(_to)))
+        self.eReason.append(reasonId)
+
+        # 如果找到了起始边, 则记录起始边source的上下文
+        if reason in START_EDGE_REASONS:
+            # 所有起始边的from点的上下文应该一致
+            assert(self.startCtxId in [None, fromCtxId])
+            self.startCtxId = fromCtxId
+
+    def build(self):
+        '''
+        把暂存的边转换为CSR邻接表, 同一起点的边保持在csv中的先后顺序
+        '''
+        n = len(self.vCtx)
+        m = len(self.eFrom)
+
+        # 统计每个节点的出度, 前缀和得到偏移
+        offsets = array('i', bytes(4*(n+1)))
+        for v in self.eFrom:
+            offsets[v+1]+= 1
+        for v in range(n):
+            offsets[v+1]+= offsets[v]
+
+        # 稳定地把每条边放到起点对应的区间中
+        cursor = array('i', offsets[0:n])
+        adjTo = array('i', bytes(4*m))
+        adjReason = array('i', bytes(4*m))
+        for i in range(m):
+            v = self.eFrom[i]
+            pos = cursor[v]
+            adjTo[pos] = self.eTo[i]
+            adjReason[pos] = self.eReason[i]
+            cursor[v] = pos+1
+
+        self.offsets = offsets
+        self.adjTo = adjTo
+        self.adjReason = adjReason
+        self.eFrom = self.eTo = self.eReason = None
+        return self
+
+    def edgeCount(self) -> int:
+        return len(self.adjTo)
+
+    def reverseIndex(self) -> tuple:
+        '''
+        反向邻接表, 只在按终点查询时构造一次
+        '''
+        if self.reverse is None:
+            self.reverse = reverseCSR(self.offsets, self.adjTo)
+        return self.reverse
+
+    def sinkMask(self, ends:list) -> bytearray:
+        '''
+        能到达ends中任一节点的节点集合, ends为(ctxId, 节点名)
+        '''
+        endVs = [self.findVertex(end) for end in ends]
+        return backwardReachable(self.reverseIndex(), [-1 if v is None else v for v in endVs])
+
+    def getEdge(self, fromV:int, pos:int) -> Edge:
+        '''
+        把CSR中位置为pos, 起点为fromV的边还原为Edge对象
+        '''
+        toV = self.adjTo[pos]
+        return Edge([
+            self.source,
+            self.vCtx[fromV], self.names.get(self.vName[fromV]),
+            self.vCtx[toV], self.names.get(self.vName[toV]),
+            self.reasons.get(self.adjReason[pos])
+        ])
+
+    def DFS(self, vertex:int, end:int, path: list, isVisited: bytearray)->bool:
+        '''
+        通过DFS算法遍历图, 找到从vertex到end的路径, 成功找到时返回True
+            path中记录的是(起点, 边在CSR中的位置)
+        '''
+        # 已经访问过了, 跳过
+        if isVisited[vertex]:
+            return False
+
+        # 如果vertex就是终点, 则找到路径
+        if vertex == end:
+            return True
+
+        # 标记一下, 已经访问过vertex
+        isVisited[vertex] = 1
+
+        # 遍历所有vertex可达的边
+        for pos in range(self.offsets[vertex], self.offsets[vertex+1]):
+            path.append((vertex, pos))   # 在路径数组中添加该边
+            if self.DFS(self.adjTo[pos], end, path, isVisited):    # 从下一个点接着探索, 探索成功则说明edge找对了
+                return True
+            else:   # 否则说明edge不对, 弹出
+                path.pop()
+
+        return False
+
+    def shortestPathTree(self, start:int, end:int=-1):
+        '''
+        从start开始BFS, 构造最短路径的前驱树, 到达end时提前停止(end为-1时遍历所有可达点)
+        '''
+        return shortestPathTree(self.offsets, self.adjTo, start, end)
+
+    def BFS(self, start:int, end:int, path: list)->bool:
+        '''
+        通过BFS算法, 在CSR邻接表中搜索start=>end的最短路径, 搜索成功返回True
+            path中记录的是(起点, 边在CSR中的位置)
+        '''
+        tree = self.shortestPathTree(start, end)
+        return tracePath(tree, start, end, path)
+
+    def resolvePath(self, start:tuple, end:tuple) -> list:
+        '''
+        返回一个数组, 包含从source产生污点对象传播到sinkParam的完整边集
+            start, end: (ctxId, 节点名)
+        '''
+        startV = self.findVertex(start)
+        endV = self.findVertex(end)
+        if startV is None or endV is None:
+            return None
+
+        path = []
+        if self.BFS(startV, endV, path):
+            return self.materialize(path)
+        else:
+            return None
+
+    def resolvePaths(self, start:tuple, ends:list, restrict:bool=False) -> list:
+        '''
+        批量查询: 从start只做一次BFS构造最短路径树, 然后回答ends中每个终点的路径
+            restrict: 先通过反向邻接表求出能到达ends的子图, BFS只访问该子图, 适合只查询少数sink的情况
+            与逐个调用resolvePath的结果一致, 不可达的终点对应None
+        '''
+        startV = self.findVertex(start)
+        if startV is None:
+            return [None]*len(ends)
+
+        endVs = []
+        for end in ends:
+            endV = self.findVertex(end)
+            endVs.append(-1 if endV is None else endV)
+        mask = None
+        if restrict:
+            mask = backwardReachable(self.reverseIndex(), endVs)
+            if not mask[startV]:
+                return [None]*len(ends)
+        return [self.materialize(path) for path in resolveTreePaths(self.offsets, self.adjTo, startV, endVs, mask)]
+
+    def materialize(self, path:list) -> list:
+        '''
+        把[(起点, 边在CSR中的位置), ...]还原为Edge数组, path为None时返回None
+        '''
+        if path is None:
+            return None
+        return [self.getEdge(v, pos) for (v, pos) in path]
+
+    def __str__(self) -> str:
+        str = ''
+        for v in range(len(self.vCtx)):  # 遍历所有的起点
+            if self.offsets[v]==self.offsets[v+1]:
+                continue
+            str+= '以[%s]为起点的边: \n'%((self.vCtx[v], self.names.get(self.vName[v])),)
+            for pos in range(self.offsets[v], self.offsets[v+1]):
+                str+= '\t'+ self.getEdge(v, pos).__str__() +'\n'
+        return str
+
+
+class ContextFreePath(list):
+    '''
+    无法沿候选路径恢复一致上下文的路径, 每条边取任意一个上下文, 只保证节点名构成的路径存在
+    '''
+    pass
+
+
+class ProjectedFlowGraph:
+    '''
+    把上下文投影掉的污点对象流向图, 同名不同上下文的节点合并为一个, 节点数与节点名的数量相同
+        投影边(u, w)按CSR保存: offsets[v]..offsets[v+1]是以v为起点的投影边, adjTo为终点, adjEdge为投影边的编号
+        每条投影边对应的具体边连续保存在inst*数组中: instOffsets[e]..instOffsets[e+1], 保持csv中的先后顺序
+        先在投影图上搜索候选路径, 再只沿候选路径恢复具体的上下文ID
+    '''
+    def __init__(self, source:str, names:StringPool, reasons:StringPool):
+        self.source = source    # 污点对象
+        self.names = names      # 节点名驻留池
+        self.reasons = reasons  # 边的原因驻留池
+        self.startCtxId = None
+
+        self.vertexIdx = {}         # nameId => 局部节点ID
+        self.vName = array('i')     # 局部节点ID => nameId
+
+        # 构建阶段暂存的投影边与具体边, build()之后转换为CSR并释放
+        self.edgeIdx = {}           # (起点<<32 | 终点) => 投影边编号
+        self.eFrom = array('i')     # 投影边编号 => 起点
+        self.eTo = array('i')       # 投影边编号 => 终点
+        self.iEdge = array('i')     # 具体边 => 投影边编号
+        self.iFromCtx = array('q')
+        self.iToCtx = array('q')
+        self.iReason = array('i')
+
+        # CSR邻接表
+        self.offsets = None
+        self.adjTo = None
+        self.adjEdge = None
+        self.instOffsets = None
+        self.instFromCtx = None
+        self.instToCtx = None
+        self.instReason = None
+        self.reverse = None
+
+    def vertex(self, nameId:int) -> int:
+        v = self.vertexIdx.get(nameId)
+        if v is None:
+            v = len(self.vName)
+            self.vertexIdx[nameId] = v
+            self.vName.append(nameId)
+        return v
+
+    def findVertex(self, vertex:tuple):
+        '''
+        查找(ctxId, name)对应的局部ID, 上下文被投影掉, 不存在时返回None
+        '''
+        nameId = self.names.lookup(vertex[1])
+        if nameId is None:
+            return None
+        return self.vertexIdx.get(nameId)
+
+    def addEdge(self, fromCtxId:int, _from:str, toCtxId:int, _to:str, reason:str):
+        '''
+        在构建阶段添加一条具体边
+        '''
+        u = self.vertex(self.names.intern(_from))
+        w = self.vertex(self.names.intern(_to))
+        key = (u<<32) | w
+        e = self.edgeIdx.get(key)
+        if e is None:
+            e = len(self.eFrom)
+            self.edgeIdx[key] = e
+            self.eFrom.append(u)
+            self.eTo.append(w)
+        self.iEdge.append(e)
+        self.iFromCtx.append(fromCtxId)
+        self.iToCtx.append(toCtxId)
+        self.iReason.append(self.reasons.intern(reason))
+
+        # 如果找到了起始边, 则记录起始边source的上下文
+        if reason in START_EDGE_REASONS:
+            assert(self.startCtxId in [None, fromCtxId])
+            self.startCtxId = fromCtxId
+
+    def build(self):
+        '''
+        把暂存的边转换为投影边的CSR与按投影边分组的具体边
+        '''
+        n = len(self.vName)
+        p = len(self.eFrom)
+        m = len(self.iEdge)
+
+        # 投影边按起点分组, 同一起点的边保持首次出现的顺序
+        offsets = array('i', bytes(4*(n+1)))
+        for v in self.eFrom:
+            offsets[v+1]+= 1
+        for v in range(n):
+            offsets[v+1]+= offsets[v]
+        cursor = array('i', offsets[0:n])
+        adjTo = array('i', bytes(4*p))
+        adjEdge = array('i', bytes(4*p))
+        for e in range(p):
+            v = self.eFrom[e]
+            pos = cursor[v]
+            adjTo[pos] = self.eTo[e]
+            adjEdge[pos] = e
+            cursor[v] = pos+1
+
+        # 具体边按投影边分组, 保持csv中的顺序
+        instOffsets = array('i', bytes(4*(p+1)))
+        for e in self.iEdge:
+            instOffsets[e+1]+= 1
+        for e in range(p):
+            instOffsets[e+1]+= instOffsets[e]
+        cursor = array('i', instOffsets[0:p])
+        instFromCtx = array('q', bytes(8*m))
+        instToCtx = array('q', bytes(8*m))
+        instReason = array('i', bytes(4*m))
+        for i in range(m):
+            e = self.iEdge[i]
+            pos = cursor[e]
+            instFromCtx[pos] = self.iFromCtx[i]
+            instToCtx[pos] = self.iToCtx[i]
+            instReason[pos] = self.iReason[i]
+            cursor[e] = pos+1
+
+        self.offsets, self.adjTo, self.adjEdge = offsets, adjTo, adjEdge
+        self.instOffsets, self.instFromCtx, self.instToCtx, self.instReason = instOffsets, instFromCtx, instToCtx, instReason
+        self.edgeIdx = None
+        self.eFrom = self.eTo = self.iEdge = self.iFromCtx = self.iToCtx = self.iReason = None
+        return self
+
+    def edgeCount(self) -> int:
+        '''
+        具体边的数量
+        '''
+        return len(self.instReason)
+
+    def reverseIndex(self) -> tuple:
+        if self.reverse is None:
+            self.reverse = reverseCSR(self.offsets, self.adjTo)
+        return self.reverse
+
+    def sinkMask(self, ends:list) -> bytearray:
+        endVs = [self.findVertex(end) for end in ends]
+        return backwardReachable(self.reverseIndex(), [-1 if v is None else v for v in endVs])
+
+    def refine(self, path:list, startCtxId:int, endCtxId:int):
+        '''
+        沿投影图上的候选路径逐层传播可能的上下文, 返回每条投影边选中的具体边, 无法到达endCtxId时返回None
+            path: [(起点, 投影边在CSR中的位置), ...]
+        '''
+        layers = []     # 每一层: 到达的上下文 => (前一层的上下文, 具体边)
+        cur = {startCtxId: None}
+        for (_, pos) in path:
+            e = self.adjEdge[pos]
+            nxt = {}
+            for i in range(self.instOffsets[e], self.instOffsets[e+1]):
+                toCtx = self.instToCtx[i]
+                if self.instFromCtx[i] in cur and toCtx not in nxt:
+                    nxt[toCtx] = (self.instFromCtx[i], i)
+            if len(nxt)==0:
+                return None
+            layers.append(nxt)
+            cur = nxt
+        if endCtxId not in cur:
+            return None
+
+        # 从终点的上下文反推每一层选中的具体边
+        chosen = []
+        ctx = endCtxId
+        for layer in reversed(layers):
+            ctx, i = layer[ctx]
+            chosen.append(i)
+        chosen.reverse()
+        return chosen
+
+    def searchContexts(self, startV:int, endV:int, endCtxId:int):
+        '''
+        候选路径上无法恢复上下文时, 在(节点, 上下文)上做BFS, 只访问能到达终点的投影节点, 最多访问REFINE_MAX_STATES个状态
+            返回[(起点, 投影边在CSR中的位置, 具体边), ...], 找不到或超出限制时返回None
+        '''
+        if self.startCtxId is None or startV is None or endV is None:
+            return None
+        mask = backwardReachable(self.reverseIndex(), [endV])
+        start = (self.startCtxId<<32) | startV
+        end = (endCtxId<<32) | endV
+        pre = {start: None}     # 状态 => (前驱状态, 起点, 投影边的位置, 具体边)
+        que = [start]
+        head = 0
+        while head<len(que) and end not in pre:
+            state = que[head]
+            head+= 1
+            v, ctx = state & 0xffffffff, state>>32
+            for pos in range(self.offsets[v], self.offsets[v+1]):
+                w = self.adjTo[pos]
+                if not mask[w]:
+                    continue
+                e = self.adjEdge[pos]
+                for i in range(self.instOffsets[e], self.instOffsets[e+1]):
+                    if self.instFromCtx[i]!=ctx:
+                        continue
+                    nxt = (self.instToCtx[i]<<32) | w
+                    if nxt in pre:
+                        continue
+                    pre[nxt] = (state, v, pos, i)
+                    que.append(nxt)
+            if len(pre)>REFINE_MAX_STATES:
+                return None
+        if end not in pre:
+            return None
+        steps = []
+        state = end
+        while pre[state] is not None:
+            state, v, pos, i = pre[state]
+            steps.append((v, pos, i))
+        steps.reverse()
+        return steps
+
+    def edges(self, steps:list, res:list) -> list:
+        '''
+        把[(起点, 投影边在CSR中的位置, 具体边), ...]还原为Edge, 追加到res中
+        '''
+        for (v, pos, i) in steps:
+            res.append(Edge([
+                self.source,
+                self.instFromCtx[i], self.names.get(self.vName[v]),
+                self.instToCtx[i], self.names.get(self.vName[self.adjTo[pos]]),
+                self.reasons.get(self.instReason[i])
+            ]))
+        return res
+
+    def materialize(self, path:list, end:tuple):
+        '''
+        把投影图上的候选路径还原为Edge数组, path为None时返回None
+            先沿候选路径恢复上下文, 失败时在能到达终点的子图中搜索上下文一致的路径, 仍然失败时返回ContextFreePath
+        '''
+        if path is None:
+            return None
+        chosen = self.refine(path, self.startCtxId, end[0])
+        if chosen is not None:
+            return self.edges([(v, pos, i) for ((v, pos), i) in zip(path, chosen)], [])
+        startV = path[0][0] if len(path)>0 else self.findVertex(end)
+        steps = self.searchContexts(startV, self.findVertex(end), end[0])
+        if steps is not None:
+            return self.edges(steps, [])
+        # 每条投影边取第一条具体边
+        return self.edges([(v, pos, self.instOffsets[self.adjEdge[pos]]) for (v, pos) in path], ContextFreePath())
+
+    def resolvePath(self, start:tuple, end:tuple) -> list:
+        return self.resolvePaths(start, [end])[0]
+
+    def resolvePaths(self, start:tuple, ends:list, restrict:bool=False) -> list:
+        '''
+        在投影图上从start做一次BFS, 为每个终点取候选路径并恢复上下文
+            与FlowGraph.resolvePaths的接口一致, 不可达的终点对应None
+        '''
+        startV = self.findVertex(start)
+        if startV is None:
+            return [None]*len(ends)
+        endVs = []
+        for end in ends:
+            endV = self.findVertex(end)
+            endVs.append(-1 if endV is None else endV)
+        mask = None
+        if restrict:
+            mask = backwardReachable(self.reverseIndex(), endVs)
+            if not mask[startV]:
+                return [None]*len(ends)
+        paths = resolveTreePaths(self.offsets, self.adjTo, startV, endVs, mask)
+        return [self.materialize(path, end) for (path, end) in zip(paths, ends)]
+
+
+def iterEdgeRows(path:str, sources):
+    '''
+    流式读取TaintObjectPropagateEdge.csv, 只产出sources中的污点对象的边
+        sources: 需要的污点对象集合, None表示全部
+        产出 (污点对象, fromCtxId, from, toCtxId, to, reason)
+    '''
+    with open(path, 'r') as f:
+        for line in f:
+            # 先只切出污点对象, 不需要的行直接跳过
+            tab = line.find('\t')
+            if tab<0:
+                continue
+            source = line[0:tab]
+            if sources is not None and source not in sources:
+                continue
+
+            row = line.rstrip('\n').split('\t')
+            yield (source, int(row[1]), row[2], int(row[3]), row[4], row[5])
+
+def buildFlowGraphs(rows, projected:bool=False) -> dict:
+    '''
+    根据边 (污点对象, fromCtxId, from, toCtxId, to, reason) 为每个污点对象构造流向图
+        projected: 构造上下文投影后的ProjectedFlowGraph
+        返回 污点对象 => FlowGraph
+    '''
+    graphClass = ProjectedFlowGraph if projected else FlowGraph
+    names = StringPool()    # 所有图共享节点名
+    reasons = StringPool()  # 所有图共享边的原因
+    src_flowGraph = {}
+    for (source, fromCtxId, _from, toCtxId, _to, reason) in rows:
+        graph = src_flowGraph.get(source)
+        if graph is None:
+            graph = graphClass(source, names, reasons)
+            src_flowGraph[source] = graph
+        graph.addEdge(fromCtxId, _from, toCtxId, _to, reason)
+
+    # 转换为CSR邻接表
+    for graph in src_flowGraph.values():
+        graph.build()
+    return src_flowGraph
+
+def loadFlowGraphs(path:str, sources, projected:bool=False) -> dict:
+    '''
+    流式读取TaintObjectPropagateEdge.csv, 只为sources中的污点对象构造流向图
+        sources: 需要的污点对象集合, None表示全部
+        projected: 构造上下文投影后的ProjectedFlowGraph
+        返回 污点对象 => FlowGraph
+    '''
+    return buildFlowGraphs(iterEdgeRows(path, sources), projected)
+
+
+# worker进程中映射的图数据文件, 由initResolveWorker初始化
+workerGraphFile = None
+
+def dumpGraphs(graphs:list, f) -> list:
+    '''
+    把每个图的CSR数组(offsets, adjTo)依次写入文件f, 供worker进程通过mmap共享
+        返回每个图在文件中的布局 (offsets的字节偏移, offsets长度, adjTo的字节偏移, adjTo长度)
+    '''
+    layouts = []
+    pos = 0
+    for graph in graphs:
+        graph:FlowGraph
+        graph.offsets.tofile(f)
+        graph.adjTo.tofile(f)
+        n = len(graph.offsets)
+        m = len(graph.adjTo)
+        layouts.append((pos, n, pos+4*n, m))
+        pos+= 4*(n+m)
+    f.flush()
+    return layouts
+
+def initResolveWorker(path:str):
+    '''
+    worker进程初始化: 只读映射图数据文件
+    '''
+    global workerGraphFile
+    with open(path, 'rb') as f:
+        workerGraphFile = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def resolveWorker(task:tuple) -> tuple:
+    '''
+    worker进程中求解一个污点对象的所有路径, 图数据直接取自映射的文件, 不需要反序列化
+    '''
+    idx, (offPos, n, adjPos, m), start, ends = task
+    buf = memoryview(workerGraphFile)
+    offsets = buf[offPos:offPos+4*n].cast('i')
+    adjTo = buf[adjPos:adjPos+4*m].cast('i')
+    return idx, resolveTreePaths(offsets, adjTo, start, ends)
+
+def resolvePathsParallel(queries:list, jobs:int) -> list:
+    '''
+    按污点对象分片, 在jobs个进程中并行求解路径
+        queries: [(graph, start, ends)], start与ends为(ctxId, 节点名)
+        返回与queries一一对应的结果, 每个结果与graph.resolvePaths(start, ends)相同
+    '''
+    res = [None]*len(queries)
+    tasks = []
+    graphs = []
+    for (idx, (graph, start, ends)) in enumerate(queries):
+        graph:FlowGraph
+        startV = graph.findVertex(start)
+        if startV is None:
+            res[idx] = [None]*len(ends)
+            continue
+        endVs = []
+        for end in ends:
+            endV = graph.findVertex(end)
+            endVs.append(-1 if endV is None else endV)
+        tasks.append([idx, len(graphs), startV, endVs])
+        graphs.append(graph)
+    if len(tasks)==0:
+        return res
+
+    with tempfile.NamedTemporaryFile(prefix='taint-graph-', suffix='.bin') as f:
+        # 图数据写入中间文件, worker通过mmap读取
+        layouts = dumpGraphs(graphs, f)
+        for task in tasks:
+            task[1] = layouts[task[1]]
+
+        # 大图先派发, 平衡各进程的负载; 结果按idx放回, 与调度顺序无关
+        tasks.sort(key=lambda task: -task[1][3])
+        with multiprocessing.Pool(jobs, initializer=initResolveWorker, initargs=(f.name,)) as pool:
+            for (idx, paths) in pool.imap_unordered(resolveWorker, [tuple(task) for task in tasks]):
+                graph = queries[idx][0]
+                res[idx] = [graph.materialize(path) for path in paths]
+    return res
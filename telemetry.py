@@ -0,0 +1,192 @@
+# coding:utf8
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager, nullcontext
+
+from resultStore import countLines
+
+# 当前的记录器, None表示不记录
+recorder = None
+
+# 读取/proc时用到的页大小
+page_size = os.sysconf('SC_PAGE_SIZE')
+
+
+def processTree(root:int) -> list:
+    '''
+    返回root及其所有子孙进程的pid, 通过扫描/proc/*/stat中的父进程号得到
+    '''
+    children = {}
+    for fn in os.listdir('/proc'):
+        if not fn.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat'%(fn), 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名可能包含空格, 从最后一个')'之后开始解析
+        ppid = int(stat[stat.rindex(')')+2:].split(' ')[1])
+        children.setdefault(ppid, []).append(int(fn))
+    res = []
+    todo = [root]
+    while len(todo)>0:
+        pid = todo.pop()
+        res.append(pid)
+        todo+= children.get(pid, [])
+    return res
+
+def processRSS(pid:int) -> int:
+    '''
+    进程当前的常驻内存, 单位KB, 进程已退出时返回0
+    '''
+    try:
+        with open('/proc/%d/statm'%(pid), 'r') as f:
+            return int(f.read().split(' ')[1])*page_size//1024
+    except (OSError, IndexError):
+        return 0
+
+def relationStats(path:str, suffix:str) -> dict:
+    '''
+    统计目录中每个关系文件的行数与字节数
+    '''
+    res = {}
+    if not os.path.exists(path):
+        return res
+    for fn in sorted(os.listdir(path)):
+        if not fn.endswith(suffix):
+            continue
+        p = os.path.join(path, fn)
+        res[fn[0:-len(suffix)]] = {'rows': countLines(p), 'bytes': os.path.getsize(p)}
+    return res
+
+
+class Telemetry:
+    '''
+    记录每个阶段的耗时, 子进程的CPU时间与峰值内存, 输出指标JSON与Chrome trace
+    '''
+    def __init__(self, interval:float=0.5):
+        self.interval = interval    # 子进程内存采样间隔, 秒
+        self.t0 = time.time()
+        self.lock = threading.Lock()
+        self.local = threading.local()  # 当前线程正在执行的阶段
+        self.stages = []    # 每个阶段的耗时
+        self.processes = [] # 每个子进程的资源使用
+        self.samples = []   # (时间, 阶段名, 进程树的常驻内存KB)
+
+    @contextmanager
+    def stage(self, name:str):
+        '''
+        记录一个阶段的墙钟时间与本线程的CPU时间, 子进程的CPU时间记录在processes中
+        '''
+        parent = getattr(self.local, 'stage', None)
+        parentWorkerCpu = getattr(self.local, 'worker_cpu', 0.0)
+        self.local.stage = name
+        self.local.worker_cpu = 0.0
+        start, cpu = time.time(), time.thread_time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            with self.lock:
+                self.stages.append({
+                    'name': name,
+                    'start': start-self.t0,
+                    'wall': end-start,
+                    'cpu': time.thread_time()-cpu+self.local.worker_cpu,
+                    'thread': threading.get_ident(),
+                })
+            self.local.stage = parent
+            self.local.worker_cpu = parentWorkerCpu
+
+    def workerCpu(self, seconds:float):
+        '''
+        把进程池中的工作进程为当前阶段消耗的CPU时间计入该阶段
+        '''
+        self.local.worker_cpu = getattr(self.local, 'worker_cpu', 0.0)+seconds
+
+    def sample(self, name:str, rss_kb:int):
+        '''
+        记录阶段name中子进程树的一次常驻内存采样
+        '''
+        with self.lock:
+            self.samples.append((time.time()-self.t0, name, rss_kb))
+
+    def recordProcess(self, cmd:str, start:float, usage, peak_kb:int, returncode:int, **extra):
+        '''
+        记录一个已结束的子进程, usage为wait4返回的资源使用, peak_kb为采样得到的进程树峰值内存
+        '''
+        proc = {
+            'stage': getattr(self.local, 'stage', None),
+            'cmd': cmd,
+            'start': start-self.t0,
+            'wall': time.time()-start,
+            'user': usage.ru_utime,
+            'sys': usage.ru_stime,
+            'max_rss_kb': usage.ru_maxrss,     # 单个进程的峰值
+            'sampled_peak_rss_kb': peak_kb,    # 整个进程树的峰值
+            'returncode': returncode,
+        }
+        proc.update(extra)
+        with self.lock:
+            self.processes.append(proc)
+
+    def metrics(self, fact_db:str, res_db:str) -> dict:
+        return {
+            'wall': time.time()-self.t0,
+            'stages': self.stages,
+            'processes': self.processes,
+            'facts': relationStats(fact_db, '.facts'),
+            'results': relationStats(res_db, '.csv'),
+        }
+
+    def chromeTrace(self) -> dict:
+        '''
+        Chrome trace格式的时间线, 可以用chrome://tracing或Perfetto打开
+        '''
+        events = []
+        tids = {}   # 线程号 => 时间线中的行号
+        for s in self.stages:
+            tid = tids.setdefault(s['thread'], len(tids)+1)
+            events.append({'name': s['name'], 'cat': 'stage', 'ph': 'X', 'pid': 1, 'tid': tid,
+                           'ts': s['start']*1e6, 'dur': s['wall']*1e6, 'args': {'cpu': s['cpu']}})
+        for (i, proc) in enumerate(self.processes):
+            events.append({'name': proc['cmd'].split(' ')[0], 'cat': 'process', 'ph': 'X', 'pid': 2, 'tid': i+1,
+                           'ts': proc['start']*1e6, 'dur': proc['wall']*1e6,
+                           'args': dict([(k, proc[k]) for k in ['stage', 'user', 'sys', 'max_rss_kb', 'sampled_peak_rss_kb']])})
+        for (t, name, rss) in self.samples:
+            events.append({'name': 'rss_kb', 'ph': 'C', 'pid': 2, 'ts': t*1e6, 'args': {str(name): rss}})
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'stages'}})
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': 2, 'args': {'name': 'child processes'}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, out_dir:str, fact_db:str, res_db:str):
+        '''
+        把指标与时间线写入out_dir/metrics.json与out_dir/trace.json
+        '''
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, 'metrics.json'), 'w') as f:
+            json.dump(self.metrics(fact_db, res_db), f, indent=1)
+        with open(os.path.join(out_dir, 'trace.json'), 'w') as f:
+            json.dump(self.chromeTrace(), f)
+
+
+def enable(interval:float=0.5) -> Telemetry:
+    global recorder
+    recorder = Telemetry(interval)
+    return recorder
+
+def stage(name:str):
+    '''
+    记录一个阶段, 未启用时什么都不做
+    '''
+    return nullcontext() if recorder==None else recorder.stage(name)
+
+def workerCpu(seconds:float):
+    '''
+    把工作进程的CPU时间计入当前阶段, 未启用时什么都不做
+    '''
+    if recorder!=None:
+        recorder.workerCpu(seconds)
@@ -0,0 +1,6 @@
+# coding:utf8
+import os
+import sys
+
+# 被测的脚本都在仓库根目录下
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
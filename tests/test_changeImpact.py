@@ -0,0 +1,57 @@
+# coding:utf8
+import io
+import zipfile
+
+from changeImpact import className, loadChangedClasses, diffArchives
+
+
+def jarBytes(entries:dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for (name, data) in entries.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+def writeWar(path, entries:dict):
+    with zipfile.ZipFile(path, 'w') as zf:
+        for (name, data) in entries.items():
+            zf.writestr(name, data)
+
+
+def test_className():
+    assert className('com/x/Foo.class')=='com.x.Foo'
+    assert className('BOOT-INF/classes/com/x/Foo.class')=='com.x.Foo'
+    assert className('WEB-INF/classes/com/x/Foo$1.class')=='com.x.Foo$1'
+    assert className('web/src/main/java/com/x/Foo.java')=='com.x.Foo'
+    assert className('src\\main\\java\\com\\x\\Foo.java')=='com.x.Foo'
+    assert className(' com.x.Foo ')=='com.x.Foo'
+
+def test_loadChangedClasses(tmp_path):
+    assert loadChangedClasses('com/x/B.class,com.x.A, ,com.x.A')==['com.x.A', 'com.x.B']
+    spec = tmp_path/'changed.txt'
+    spec.write_text('# git diff --name-only\nsrc/main/java/com/x/A.java\n\nBOOT-INF/classes/com/x/C.class\n')
+    assert loadChangedClasses(str(spec))==['com.x.A', 'com.x.C']
+
+def test_diffArchives(tmp_path):
+    lib = jarBytes({'org/lib/Same.class': b'same'})
+    oldDep = jarBytes({'org/dep/Util.class': b'v1', 'org/dep/Keep.class': b'keep'})
+    # 依赖升级改了jar包名, 只有Util的内容变化
+    newDep = jarBytes({'org/dep/Util.class': b'v2', 'org/dep/Keep.class': b'keep'})
+    old = tmp_path/'old.war'
+    new = tmp_path/'new.war'
+    writeWar(old, {
+        'WEB-INF/classes/com/x/A.class': b'a1',
+        'WEB-INF/classes/com/x/B.class': b'b',
+        'WEB-INF/classes/com/x/Gone.class': b'gone',
+        'WEB-INF/lib/lib.jar': lib,
+        'WEB-INF/lib/dep-1.0.jar': oldDep,
+    })
+    writeWar(new, {
+        'WEB-INF/classes/com/x/A.class': b'a2',
+        'WEB-INF/classes/com/x/B.class': b'b',
+        'WEB-INF/classes/com/x/Added.class': b'added',
+        'WEB-INF/lib/lib.jar': lib,
+        'WEB-INF/lib/dep-2.0.jar': newDep,
+    })
+    assert diffArchives(str(old), str(new))==['com.x.A', 'com.x.Added', 'com.x.Gone', 'org.dep.Util']
+    assert diffArchives(str(old), str(old))==[]
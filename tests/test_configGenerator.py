@@ -0,0 +1,41 @@
+# coding:utf8
+import io
+import zipfile
+
+from fact_generators.config_generator.main import entryDigest, traverseJars
+
+
+def makeJar(files:dict) -> bytes:
+    b = io.BytesIO()
+    with zipfile.ZipFile(b, 'w') as z:
+        for (name, content) in files.items():
+            z.writestr(name, content)
+    return b.getvalue()
+
+def makeWar(path):
+    # 两个大小相同, 内容不同的嵌套jar包
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('WEB-INF/classes/app.properties', 'a=1\n')
+        z.writestr('WEB-INF/lib/a.jar', makeJar({'x.properties': 'k=1\n'}))
+        z.writestr('WEB-INF/lib/b.jar', makeJar({'x.properties': 'k=2\n'}))
+
+
+def test_entryDigest(tmp_path):
+    war = str(tmp_path/'app.war')
+    makeWar(war)
+    with zipfile.ZipFile(war) as z:
+        a, b = z.getinfo('WEB-INF/lib/a.jar'), z.getinfo('WEB-INF/lib/b.jar')
+        assert a.file_size==b.file_size
+        assert entryDigest(z, a)!=entryDigest(z, b)
+        assert entryDigest(z, a)==entryDigest(z, a)
+
+def test_cache_reuse(tmp_path):
+    war = str(tmp_path/'app.war')
+    makeWar(war)
+    cache = str(tmp_path/'cache')
+    first, _ = traverseJars([war], 1, cache)
+    second, _ = traverseJars([war], 1, cache)
+    assert first==second
+    assert first==traverseJars([war], 1)[0]
+    values = sorted([row[-1] for row in first['properties-Config']])
+    assert '1' in values and '2' in values
@@ -0,0 +1,80 @@
+# coding:utf8
+import json
+
+from factSlicer import methodPrefix, splitSig, loadHierarchy, sliceFactDb, report_name
+
+do_post = '<com.A: void doPost(javax.servlet.http.HttpServletRequest,javax.servlet.http.HttpServletResponse)>'
+helper_run = '<com.Helper: void run(java.lang.String)>'
+helper_clinit = '<com.Helper: void <clinit>()>'
+config_init = '<com.Config: void <init>()>'
+unused = '<com.Unused: void f()>'
+base_run = '<com.Base: void run(java.lang.String)>'
+exec_sig = '<java.lang.Runtime: java.lang.Process exec(java.lang.String)>'
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def makeFactDb(tmp_path):
+    '''
+    servlet com.A 通过com.Base.run调用到com.Helper.run, 后者调用Runtime.exec; com.Unused与sink无关
+    '''
+    fact_db = tmp_path/'database'
+    fact_db.mkdir()
+    writeRows(fact_db/'DirectSuperclass.facts', [
+        ['com.A', 'javax.servlet.http.HttpServlet'],
+        ['javax.servlet.http.HttpServlet', 'javax.servlet.GenericServlet'],
+        ['com.Helper', 'com.Base'],
+    ])
+    writeRows(fact_db/'DirectSuperinterface.facts', [['javax.servlet.GenericServlet', 'javax.servlet.Servlet']])
+    writeRows(fact_db/'Method.facts', [[sig] for sig in [do_post, helper_run, helper_clinit, config_init, unused, base_run]])
+    writeRows(fact_db/'VirtualMethodInvocation.facts', [
+        [do_post+'/com.Base.run/0', 0, base_run, do_post+'/$r0', do_post],
+        [helper_run+'/java.lang.Runtime.exec/0', 0, exec_sig, helper_run+'/$r1', helper_run],
+        [unused+'/com.Unused.f/0', 0, unused, unused+'/this', unused],
+    ])
+    writeRows(fact_db/'SpecialMethodInvocation.facts', [[helper_clinit+'/com.Config.<init>/0', 0, config_init, helper_clinit+'/$r0', helper_clinit]])
+    writeRows(fact_db/'ClassType.facts', [['com.A'], ['com.Helper']])
+    writeRows(fact_db/'LeakingSinkMethodArg.facts', [['cmdi', 0, exec_sig]])
+    return fact_db
+
+
+def test_methodPrefix():
+    assert methodPrefix(do_post)==do_post
+    assert methodPrefix(do_post+'/$r0')==do_post
+    assert methodPrefix(helper_clinit+'/com.Config.<init>/0')==helper_clinit
+    assert methodPrefix(config_init)==config_init
+    assert methodPrefix(do_post+'x')==None
+    assert methodPrefix('com.A')==None
+    assert splitSig(config_init)==('com.Config', 'void <init>()')
+
+def test_dispatch(tmp_path):
+    hierarchy = loadHierarchy(str(makeFactDb(tmp_path)))
+    # 调用父类型的方法可能执行子类型中的重写
+    assert hierarchy.dispatch(base_run)==[base_run, helper_run]
+    assert hierarchy.dispatch(exec_sig)==[exec_sig]
+    assert 'com.A' in hierarchy.subtypes('javax.servlet.Servlet')
+
+def test_sliceFactDb(tmp_path):
+    fact_db = makeFactDb(tmp_path)
+    out = tmp_path/'slice'
+    stats = sliceFactDb(str(fact_db), str(out))
+    methods = (out/'Method.facts').read_text().split('\n')
+    # 保留入口的前向闭包与被使用的类的<clinit>及其调用的方法
+    assert sorted([m for m in methods if len(m)>0])==sorted([do_post, base_run, helper_run, helper_clinit, config_init])
+    assert stats['VirtualMethodInvocation']==(3, 2)
+    assert stats['ClassType']==(2, 2)
+    assert (out/'LeakingSinkMethodArg.facts').read_text()==(fact_db/'LeakingSinkMethodArg.facts').read_text()
+    report = json.load(open(out/report_name, 'r'))
+    # 保留的方法还包括没有声明的sink方法本身
+    assert report['seeds']==1 and report['kept_methods']==6
+
+def test_slice_without_sink_keeps_all(tmp_path):
+    fact_db = makeFactDb(tmp_path)
+    writeRows(fact_db/'LeakingSinkMethodArg.facts', [])
+    out = tmp_path/'slice'
+    stats = sliceFactDb(str(fact_db), str(out))
+    assert all([b==a for (b, a) in stats.values()])
+    assert json.load(open(out/report_name, 'r'))['kept_methods']==None
@@ -0,0 +1,43 @@
+# coding:utf8
+import signal
+import subprocess
+
+import pytest
+
+import governor
+from governor import governedRun, killedBy, pickJobs, ResourceExhausted
+
+
+def test_killedBy():
+    assert killedBy(-signal.SIGKILL, signal.SIGKILL)
+    assert killedBy(128+signal.SIGABRT, signal.SIGABRT)
+    assert not killedBy(1, signal.SIGABRT)
+
+def test_pickJobs():
+    assert pickJobs(8, 4.0, lambda jobs: jobs*1.0)==4
+    assert pickJobs(8, 0.5, lambda jobs: jobs*1.0)==1
+
+def test_abort_without_bad_alloc_is_not_oom():
+    # 断言失败等abort不是内存不足, 不应当按内存不足重试
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        governedRun('echo assertion failed; kill -ABRT $$', 1.0, interval=0.05)
+    assert not isinstance(e.value, ResourceExhausted)
+
+def test_abort_with_bad_alloc_is_oom():
+    with pytest.raises(ResourceExhausted):
+        governedRun("echo \"terminate called after throwing an instance of 'std::bad_alloc'\"; kill -ABRT $$", 1.0, interval=0.05)
+
+def test_jvm_oom_marker():
+    with pytest.raises(ResourceExhausted):
+        governedRun('echo java.lang.OutOfMemoryError: Java heap space; exit 1', 1.0, address_limit=False, interval=0.05)
+
+def test_retry_halves_threads(monkeypatch):
+    picked = []
+    def run(cmd, limit_gb, address_limit=True):
+        picked.append(int(cmd))
+        if int(cmd)>2:
+            raise ResourceExhausted(137, cmd)
+        return 0
+    monkeypatch.setattr(governor, 'governedRun', run)
+    assert governor.governedCall('test', lambda jobs, limit_gb: str(jobs), 8, lambda jobs: 0.0, budget=16.0)==0
+    assert picked==[8, 4, 2]
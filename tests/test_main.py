@@ -0,0 +1,43 @@
+# coding:utf8
+import json
+
+from main import distinct_flows, FlowWriter, scope_json_path
+
+invo = '<com.A: void f()>/java.lang.Runtime.exec/0'
+source = '<com.A: void f()>/@parameter0'
+
+
+def test_distinct_flows():
+    rows = [
+        ['servlet_input', 'cmdi', invo, '1', '$r1', source],
+        # 只有ctxId不同的行是同一条污点流
+        ['servlet_input', 'cmdi', invo, '2', '$r1', source],
+        ['servlet_input', 'cmdi', invo, '3', '$r2', source],
+        ['servlet_input', 'sqli', invo, '1', '$r1', source],
+        ['servlet_input', 'cmdi', invo, '1', '$r1', source],
+    ]
+    assert list(distinct_flows(iter(rows)))==[
+        ('servlet_input', 'cmdi', invo, '$r1', source),
+        ('servlet_input', 'cmdi', invo, '$r2', source),
+        ('servlet_input', 'sqli', invo, '$r1', source),
+    ]
+
+def test_flow_writer(tmp_path):
+    flows = [{'sink': 'a'}, {'sink': 'b'}]
+    for (name, load) in [('res.json', json.load), ('res.jsonl', lambda f: [json.loads(line) for line in f])]:
+        path = str(tmp_path/name)
+        writer = FlowWriter(path)
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+        assert writer.count==2
+        with open(path, 'r') as f:
+            assert load(f)==flows
+    # 没有污点流时也是合法的json
+    path = str(tmp_path/'empty.json')
+    FlowWriter(path).close()
+    assert json.load(open(path, 'r'))==[]
+
+def test_scope_json_path():
+    assert scope_json_path('out/res.json')=='out/res.scope.json'
+    assert scope_json_path('res.ndjson')=='res.scope.json'
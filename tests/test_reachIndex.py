@@ -0,0 +1,89 @@
+# coding:utf8
+import random
+
+from reachIndex import buildReachIndex, openReachIndex, condense
+from resultStore import leaking_csv, edge_csv
+from taintGraph import loadFlowGraphs
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def randomResults(res_dir, seed):
+    '''
+    随机生成几个污点对象的流向图, 包含环与不可达的节点, 每个污点对象取几个节点作为sink参数
+    '''
+    rnd = random.Random(seed)
+    edges = []
+    leaks = []
+    for s in range(3):
+        source = '<com.A: void f%d()>/@parameter0'%(s)
+        nodes = [(rnd.randint(0, 2), '<com.A: void f%d()>/$r%d'%(s, i)) for i in range(12)]
+        edges.append([source, 0, source, nodes[0][0], nodes[0][1], 'Call source method'])
+        for _ in range(18):
+            a = rnd.choice(nodes)
+            b = rnd.choice(nodes)
+            edges.append([source, a[0], a[1], b[0], b[1], 'Assign'])
+        for node in rnd.sample(nodes, 4):
+            leaks.append(['servlet_input', 'sqli', '<com.A: void f%d()>/com.x.Db.query/0'%(s), node[0], node[1], source])
+    writeRows(res_dir/edge_csv, edges)
+    writeRows(res_dir/leaking_csv, leaks)
+    return leaks
+
+def bfsReaches(graph, a, b):
+    seen = set([a])
+    todo = [a]
+    while len(todo)>0:
+        v = todo.pop()
+        if v==b:
+            return True
+        for pos in range(graph.offsets[v], graph.offsets[v+1]):
+            w = graph.adjTo[pos]
+            if w not in seen:
+                seen.add(w)
+                todo.append(w)
+    return False
+
+
+def test_condense_cycle():
+    # 0->1->2->0 构成一个分量, 3只被2指向
+    offsets = [0, 1, 2, 4, 4]
+    adjTo = [1, 2, 0, 3]
+    comp, count = condense(offsets, adjTo)
+    assert count==2
+    assert comp[0]==comp[1]==comp[2]
+    # 逆拓扑序: 能到达的分量编号更小
+    assert comp[3]<comp[0]
+
+def test_index_matches_bfs(tmp_path):
+    for seed in range(5):
+        res_dir = tmp_path/('r%d'%(seed))
+        res_dir.mkdir()
+        leaks = randomResults(res_dir, seed)
+        buildReachIndex(str(res_dir))
+        index = openReachIndex(str(res_dir))
+        assert index!=None
+        graphs = loadFlowGraphs(str(res_dir/edge_csv), None)
+
+        for (source, graph) in graphs.items():
+            start = (graph.startCtxId, source)
+            vertices = [(graph.vCtx[v], graph.names.get(graph.vName[v])) for v in range(len(graph.vCtx))]
+            for a in range(len(vertices)):
+                for b in range(len(vertices)):
+                    assert index.reaches(source, vertices[a], vertices[b])==bfsReaches(graph, a, b)
+
+            sinks = [(int(row[3]), row[4]) for row in leaks if row[5]==source]
+            expected = [sink for sink in sinks if graph.resolvePath(start, sink)!=None]
+            for sink in sinks:
+                assert index.canReachSink(source, sink)==(sink in expected)
+            assert sorted(index.reachableSinks(source))==sorted(expected)
+
+def test_index_out_of_date(tmp_path):
+    randomResults(tmp_path, 0)
+    buildReachIndex(str(tmp_path))
+    assert openReachIndex(str(tmp_path))!=None
+    with open(tmp_path/leaking_csv, 'a') as f:
+        f.write('servlet_input\tsqli\tx\t0\ty\tz\n')
+    assert openReachIndex(str(tmp_path))==None
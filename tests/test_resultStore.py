@@ -0,0 +1,41 @@
+# coding:utf8
+from resultStore import invokedMethod, importResults, openStore, leaking_csv
+from showTaintFlow import FlowPath, matchSink
+
+# 一个构造函数sink与一个普通方法sink
+ctor_invo = '<com.A: void f()>/java.lang.ProcessBuilder.<init>/0'
+method_invo = '<com.A: void <init>()>/java.lang.Runtime.exec/0'
+leaks = [
+    ['web', 'cmdi', ctor_invo, '1', '$r1', 'source1'],
+    ['web', 'cmdi', method_invo, '2', '$r2', 'source2'],
+]
+
+
+def test_invokedMethod():
+    assert invokedMethod(ctor_invo)=='java.lang.ProcessBuilder.<init>'
+    assert invokedMethod(method_invo)=='java.lang.Runtime.exec'
+    assert invokedMethod('<com.A: void f()>/a.B.<clinit>/12')=='a.B.<clinit>'
+    # 只有方法名时不是调用语句
+    assert invokedMethod('java.lang.ProcessBuilder.<init>')==None
+    assert invokedMethod('java.lang.Runtime.exec')==None
+
+def test_matchSink():
+    ctor = FlowPath(leaks[0])
+    method = FlowPath(leaks[1])
+    assert matchSink(ctor, 'java.lang.ProcessBuilder.<init>', None)
+    assert not matchSink(method, 'java.lang.ProcessBuilder.<init>', None)
+    assert matchSink(method, 'java.lang.Runtime.exec', 'cmdi')
+    assert not matchSink(method, 'java.lang.Runtime.exec', 'sqli')
+    assert matchSink(ctor, ctor_invo, None)
+
+def test_store_sink_method(tmp_path):
+    with open(tmp_path/leaking_csv, 'w') as f:
+        for row in leaks:
+            f.write('\t'.join(row)+'\n')
+    importResults(str(tmp_path))
+    store = openStore(str(tmp_path))
+    assert store!=None
+    assert [row[2] for row in store.leaks(sink_method='java.lang.ProcessBuilder.<init>')]==[ctor_invo]
+    assert [row[2] for row in store.leaks(sink_method='java.lang.Runtime.exec')]==[method_invo]
+    assert store.leaks(sink_method='java.lang.ProcessBuilder')==[]
+    assert store.relationRows(leaking_csv)==2
@@ -0,0 +1,74 @@
+# coding:utf8
+import os
+
+from sharding import mergeShardResults, shardCtx
+from resultStore import leaking_csv, edge_csv
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def readRows(path):
+    with open(path, 'r') as f:
+        return [line.rstrip('\n').split('\t') for line in f if len(line.strip())>0]
+
+def makeShards(tmp_path):
+    '''
+    两个分片, 都从同一个污点源src出发, 各自的上下文ID互不相关
+    '''
+    shards = []
+    for i in range(2):
+        d = tmp_path/'shards'/str(i)
+        os.makedirs(d)
+        writeRows(d/edge_csv, [
+            ['src', 5, 'src', 7, 'v%d'%(i), 'Call source method'],
+            ['src', 7, 'v%d'%(i), 9, 'p%d'%(i), 'Assign'],
+        ])
+        # 两个分片都找到了同一条忽略上下文后相同的污点流
+        writeRows(d/leaking_csv, [
+            ['web', 'cmdi', 'invo', 9, 'p', 'src'],
+            ['web', 'cmdi', 'invo%d'%(i), 9, 'p%d'%(i), 'src'],
+        ])
+        writeRows(d/'VarPointsTo.csv', [[1, 'heap', 3, 'v%d'%(i)], ['<<immutable>>', 'heap', 'ctx-a', 'w']])
+        writeRows(d/'CallGraphEdge.csv', [[2, 'invo', 4, 'callee']])
+        # 其他关系, 恰好也是4列
+        writeRows(d/'SpringBeans.csv', [['bean', 'cls', 'a', 'b'], ['bean%d'%(i), 'cls', 'a', 'b']])
+        shards.append(str(d))
+    return shards
+
+
+def test_shardCtx():
+    assert shardCtx('3', 2, 1)=='7'
+    assert shardCtx('0', 4, 3)=='3'
+    assert shardCtx('<<immutable>>', 2, 1)=='1:<<immutable>>'
+
+def test_merge_renumber(tmp_path):
+    out = tmp_path/'merged'
+    counts = mergeShardResults(makeShards(tmp_path), str(out))
+
+    # 污点源节点的上下文统一为第一个分片中的编号 5*2+0, 其他节点按 ctx*2+i 重新编号
+    edges = readRows(out/edge_csv)
+    assert edges==[
+        ['src', '10', 'src', '14', 'v0', 'Call source method'],
+        ['src', '14', 'v0', '18', 'p0', 'Assign'],
+        ['src', '10', 'src', '15', 'v1', 'Call source method'],
+        ['src', '15', 'v1', '19', 'p1', 'Assign'],
+    ]
+
+    # 第二个分片中已经找到的污点流被去掉
+    leaks = readRows(out/leaking_csv)
+    assert [row[2] for row in leaks]==['invo', 'invo0', 'invo1']
+    assert [row[3] for row in leaks]==['18', '18', '19']
+
+    # 上下文列重新编号, 非整数的上下文加上分片序号前缀
+    assert readRows(out/'VarPointsTo.csv')==[
+        ['2', 'heap', '6', 'v0'], ['0:<<immutable>>', 'heap', '0:ctx-a', 'w'],
+        ['3', 'heap', '7', 'v1'], ['1:<<immutable>>', 'heap', '1:ctx-a', 'w'],
+    ]
+    assert readRows(out/'CallGraphEdge.csv')==[['4', 'invo', '8', 'callee'], ['5', 'invo', '9', 'callee']]
+
+    # 其他关系只去重, 不重新编号
+    assert readRows(out/'SpringBeans.csv')==[['bean', 'cls', 'a', 'b'], ['bean0', 'cls', 'a', 'b'], ['bean1', 'cls', 'a', 'b']]
+    assert counts[leaking_csv]==3 and counts['SpringBeans.csv']==3
@@ -0,0 +1,72 @@
+# coding:utf8
+from sinkRules import loadSinkRules, compileSinkRules
+
+exec_sig = '<java.lang.Runtime: java.lang.Process exec(java.lang.String)>'
+exec2_sig = '<java.lang.Runtime: java.lang.Process exec(java.lang.String,java.lang.String[])>'
+execute_sig = '<java.lang.Runtime: void execute()>'
+query_sig = '<com.x.Db: void query(java.lang.String)>'
+format_sig = '<java.lang.String: java.lang.String format(java.lang.String,java.lang.Object[])>'
+caller = '<com.A: void f()>'
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def writeRules(tmp_path, arg, nameArg, nameVarArg):
+    files = {}
+    for (relation, rows) in [('LeakingSinkMethodArg', arg), ('LeakingSinkMethodNameArg', nameArg), ('LeakingSinkMethodNameVarArg', nameVarArg)]:
+        path = tmp_path/(relation+'.tsv')
+        writeRows(path, rows)
+        files[relation] = str(path)
+    return loadSinkRules(files)
+
+
+def test_resolve_name_rules(tmp_path):
+    rules = writeRules(tmp_path, [], [
+        ['cmdi', 'java.lang.Runtime', 'exec', 1],
+        ['cmdi', 'java.lang.Runtime', 'exec.*', 0],
+    ], [])
+    assert rules.errors==[]
+    res = rules.resolve([exec_sig, exec2_sig, execute_sig, query_sig])
+    assert res=={'LeakingSinkMethodNameArg': [
+        # 参数序号1只匹配有两个参数的重载, 方法名必须完整匹配正则
+        ('cmdi', 1, exec2_sig),
+        # 同一条规则匹配的方法按签名排序
+        ('cmdi', 0, exec_sig),
+        ('cmdi', 0, exec2_sig),
+    ]}
+
+def test_invalid_rows(tmp_path):
+    rules = writeRules(tmp_path, [
+        ['cmdi', 1, exec_sig],      # 参数序号超出参数个数
+        ['cmdi', 0, exec_sig],
+    ], [
+        ['cmdi', 'java.lang.Runtime', '(', 0],  # 正则不合法
+    ], [])
+    assert [line_idx for (_, line_idx, _) in rules.errors]==[1, 1]
+    assert rules.rows['LeakingSinkMethodArg']==[['cmdi', '0', exec_sig]]
+
+def test_compile_sink_rules(tmp_path):
+    fact_db = tmp_path/'database'
+    fact_db.mkdir()
+    writeRows(fact_db/'Method.facts', [[query_sig, 'query', '(java.lang.String)', 'com.x.Db', 'void', 'x', 1, 0]])
+    writeRows(fact_db/'VirtualMethodInvocation.facts', [
+        [caller+'/java.lang.Runtime.exec/0', 0, exec_sig, caller+'/$rt', caller],
+        [caller+'/java.lang.String.format/0', 0, format_sig, caller+'/$r0', caller],
+    ])
+    rules = writeRules(tmp_path, [
+        ['cmdi', 0, exec_sig],
+    ], [
+        ['cmdi', 'java.lang.Runtime', 'exec', 0],   # 与按签名定义的规则重复
+        ['sqli', 'com.x.Db', 'query|update', 0],
+    ], [
+        ['fmt', 'java.lang.String', 'format', 1],
+        ['fmt', 'java.lang.Unused', 'f', 0],
+    ])
+    counts = compileSinkRules(rules, str(fact_db))
+    assert counts=={'LeakingSinkMethodArg': 2, 'LeakingSinkMethodNameArg': 0, 'LeakingSinkMethodNameVarArg': 1}
+    assert (fact_db/'LeakingSinkMethodArg.facts').read_text()=='cmdi\t0\t%s\nsqli\t0\t%s\n'%(exec_sig, query_sig)
+    assert (fact_db/'LeakingSinkMethodNameArg.facts').read_text()==''
+    assert (fact_db/'LeakingSinkMethodNameVarArg.facts').read_text()=='fmt\tjava.lang.String\tformat\t1\n'
@@ -0,0 +1,66 @@
+# coding:utf8
+import json
+
+from sinkWhatIf import WhatIfIndex, whatIf
+from resultStore import leaking_csv, edge_csv
+
+caller = '<com.A: void f()>'
+exec_sig = '<java.lang.Runtime: java.lang.Process exec(java.lang.String)>'
+query_sig = '<com.x.Db: void query(java.lang.String)>'
+exec_invo = caller+'/java.lang.Runtime.exec/0'
+query_invo = caller+'/com.x.Db.query/0'
+# 已有污点流的污点对象, 与一个还没有任何污点流的同种污点对象
+old_source = caller+'/@parameter0'
+new_source = '<com.B: void g()>/@parameter0'
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def makeWorkspace(tmp_path):
+    fact_db = tmp_path/'database'
+    res_dir = tmp_path/'result'
+    fact_db.mkdir()
+    res_dir.mkdir()
+    writeRows(fact_db/'VirtualMethodInvocation.facts', [
+        [exec_invo, 0, exec_sig, caller+'/$rt', caller],
+        [query_invo, 0, query_sig, caller+'/$db', caller],
+    ])
+    writeRows(fact_db/'ActualParam.facts', [[0, exec_invo, caller+'/$r1'], [0, query_invo, caller+'/$r2']])
+    writeRows(fact_db/'LeakingSinkMethodArg.facts', [['cmdi', 0, exec_sig]])
+    writeRows(res_dir/edge_csv, [
+        [old_source, 0, old_source, 1, caller+'/$r1', 'Call source method'],
+        [new_source, 0, new_source, 2, caller+'/$r2', 'Call source method'],
+    ])
+    writeRows(res_dir/leaking_csv, [['servlet_input', 'cmdi', exec_invo, 1, caller+'/$r1', old_source]])
+    rules = tmp_path/'LeakingSinkMethodArg.tsv'
+    writeRows(rules, [['cmdi', 0, exec_sig], ['sqli', 0, query_sig]])
+    return str(fact_db), str(res_dir), str(rules)
+
+
+def test_source_label_from_kind(tmp_path):
+    fact_db, res_dir, _ = makeWorkspace(tmp_path)
+    index = WhatIfIndex(fact_db, res_dir)
+    assert index.sourceLabel(old_source)=='servlet_input'
+    # 没有污点流的污点对象使用同一种类的污点对象的标签
+    assert index.sourceLabel(new_source)=='servlet_input'
+    assert index.sourceLabel('<com.C: void h()>/@parameter0')=='-'
+
+def test_whatIf_added(tmp_path, capsys):
+    fact_db, res_dir, rules = makeWorkspace(tmp_path)
+    out = str(tmp_path/'diff.json')
+    res = whatIf(fact_db, res_dir, {'LeakingSinkMethodArg': rules}, out)
+    assert res['reproduced']==1 and res['solver_flows']==1
+    assert res['added']==[{
+        'source_label': 'servlet_input',
+        'sink_label': 'sqli',
+        'sink_invo': query_invo,
+        'sink_param': caller+'/$r2',
+        'source': new_source,
+    }]
+    assert res['removed']==[]
+    assert 'upper bounds' in capsys.readouterr().out
+    with open(out, 'r') as f:
+        assert json.load(f)['context_insensitive']==True
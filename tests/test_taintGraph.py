@@ -0,0 +1,85 @@
+# coding:utf8
+import random
+
+from taintGraph import loadFlowGraphs, ContextFreePath
+
+source = '<com.A: void f()>/@parameter0'
+other = '<com.B: void g()>/@parameter0'
+
+
+def writeRows(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write('\t'.join([str(v) for v in row])+'\n')
+
+def edgeTuples(path):
+    if path is None:
+        return None
+    return [(e.fromCtxId, e._from, e.toCtxId, e._to, e.reason) for e in path]
+
+def isValidPath(path, start, end):
+    '''
+    路径的每条边首尾相接(包括上下文), 从start开始到end结束
+    '''
+    cur = start
+    for e in path:
+        if (e.fromCtxId, e._from)!=cur:
+            return False
+        cur = (e.toCtxId, e._to)
+    return cur==end
+
+
+def test_load_and_resolve(tmp_path):
+    p = tmp_path/'edges.csv'
+    writeRows(p, [
+        [source, 0, source, 1, '$r1', 'Call source method'],
+        [source, 1, '$r1', 1, '$r2', 'Assign'],
+        [source, 1, '$r2', 1, '$r3', 'Assign'],
+        [source, 1, '$r1', 1, '$r3', 'Assign'],
+        # 同名不同上下文的节点是不同的节点
+        [source, 2, '$r1', 2, '$r4', 'Assign'],
+        [other, 0, other, 3, '$r1', 'Call source method'],
+    ])
+    graphs = loadFlowGraphs(str(p), set([source]))
+    assert list(graphs.keys())==[source]
+    g = graphs[source]
+    assert g.startCtxId==0
+    assert g.findVertex((1, '$r1'))!=None and g.findVertex((3, '$r1'))==None
+    # BFS得到最短路径
+    assert edgeTuples(g.resolvePath((0, source), (1, '$r3')))==[
+        (0, source, 1, '$r1', 'Call source method'),
+        (1, '$r1', 1, '$r3', 'Assign'),
+    ]
+    assert g.resolvePath((0, source), (2, '$r4'))==None
+    assert g.resolvePath((0, source), (1, '$missing'))==None
+    assert len(loadFlowGraphs(str(p), None))==2
+
+def test_batch_and_projected_match(tmp_path):
+    rnd = random.Random(7)
+    p = tmp_path/'edges.csv'
+    rows = []
+    nodes = [(rnd.randint(1, 3), '$r%d'%(i)) for i in range(10)]
+    rows.append([source, 0, source, nodes[0][0], nodes[0][1], 'Call source method'])
+    for _ in range(25):
+        a = rnd.choice(nodes)
+        b = rnd.choice(nodes)
+        rows.append([source, a[0], a[1], b[0], b[1], 'Assign'])
+    writeRows(p, rows)
+    g = loadFlowGraphs(str(p), None)[source]
+    pg = loadFlowGraphs(str(p), None, projected=True)[source]
+    start = (0, source)
+    ends = [(ctx, '$r%d'%(i)) for i in range(10) for ctx in range(1, 4)]
+
+    single = [edgeTuples(g.resolvePath(start, end)) for end in ends]
+    # 批量查询与逐个查询的结果一致, 限制在能到达终点的子图中也一致
+    assert [edgeTuples(path) for path in g.resolvePaths(start, ends)]==single
+    assert [edgeTuples(path) for path in g.resolvePaths(start, ends, True)]==single
+    assert any([path!=None for path in single]) and any([path==None for path in single])
+
+    for (end, path, projected) in zip(ends, single, pg.resolvePaths(start, ends, True)):
+        if path==None:
+            # 节点名可达时只能得到上下文不一致的路径
+            assert projected==None or isinstance(projected, ContextFreePath)
+        else:
+            assert not isinstance(projected, ContextFreePath)
+            assert isValidPath(projected, start, end)